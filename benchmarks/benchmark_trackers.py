@@ -0,0 +1,593 @@
+import argparse
+import ast
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+# Benchmarks the core operations of every tracker variant against synthetic ledgers.
+#
+#   python benchmarks/benchmark_trackers.py run --rows 10000 100000 --output results.json
+#   python benchmarks/benchmark_trackers.py run --rows 100000 --compare results.json
+#   python benchmarks/benchmark_trackers.py compare old.json new.json
+#   python benchmarks/benchmark_trackers.py generate --rows 1000000 --output expenses.json
+#   python benchmarks/benchmark_trackers.py memory --rows 1000000
+#   python benchmarks/benchmark_trackers.py writers --writers 1 2 4 8 --adds 500
+#   python benchmarks/benchmark_trackers.py http --clients 10 100 500 --requests 200
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LV1_FILE = os.path.join(REPO_DIR, "expense tracker lv1", "Expense_Recorder.py")
+LV2_FILE = os.path.join(REPO_DIR, "enhanced expense tracker lv2", "enhanced_expense_tracker.py")
+LV3_DIR = os.path.join(REPO_DIR, "personal finance tracker lv3")
+LV3_CLI_FILE = os.path.join(LV3_DIR, "expense_tracker_advanced.py")
+LV3_GUI_FILE = os.path.join(LV3_DIR, "Personal_finance_tracker.py")
+# Every lv3 helper module, read from the directory so modules added later are re-imported (and timed) too
+LV3_MODULES = tuple(sorted(name[:-3] for name in os.listdir(LV3_DIR)
+                           if name.startswith("expense_") and name.endswith(".py")
+                           and os.path.join(LV3_DIR, name) != LV3_CLI_FILE))
+
+VARIANTS = ("lv1", "lv2", "lv3-cli", "lv3-gui")
+# Share of each request kind in the http load test
+HTTP_MIX = {"summary": 0.7, "list": 0.2, "add": 0.1}
+HTTP_PAGE_SIZE = 50
+OPERATIONS = ("load_expenses", "load_expenses_warm", "view_summary", "add_expense", "save_expenses",
+              "export_to_text", "export_to_excel", "export_to_database")
+# Single adds are too quick to time one at a time, so add_expense times this many, each persisted
+ADD_COUNT = 100
+# Files the trackers keep next to the ledger that make a later load faster
+CACHE_FILES = ("expenses.cache.pickle", "expenses.summary.json")
+
+# Category mix and typical amounts (median, spread) of a household ledger
+CATEGORY_WEIGHTS = {"food": 0.45, "transportation": 0.25, "entertainment": 0.18, "utilities": 0.12}
+CATEGORY_AMOUNTS = {"food": (12.0, 0.7), "transportation": (8.0, 0.6), "entertainment": (25.0, 0.8),
+                    "utilities": (80.0, 0.4)}
+CATEGORY_WORDS = {
+    "food": ["groceries", "milk", "bread", "coffee", "lunch", "dinner", "pizza", "sushi", "bakery", "market"],
+    "transportation": ["bus", "train", "taxi", "fuel", "parking", "metro", "ticket", "toll"],
+    "entertainment": ["movie", "concert", "book", "game", "streaming", "museum", "gym"],
+    "utilities": ["electricity", "water", "internet", "phone", "gas", "rent", "insurance"],
+}
+LEDGER_START = date(2019, 1, 1)
+LEDGER_DAYS = 6 * 365
+
+
+def generate_ledger(count, seed=0):
+    """Return count synthetic expenses in date order with realistic category, amount and date spread."""
+    generator = random.Random(seed)
+    categories = list(CATEGORY_WEIGHTS)
+    weights = list(CATEGORY_WEIGHTS.values())
+    merchants = [f"shop{number}" for number in range(2000)]
+    start = LEDGER_START.toordinal()
+    expenses = []
+    for category in generator.choices(categories, weights, k=count):
+        day = start + generator.randrange(LEDGER_DAYS)
+        if category == "utilities":
+            # Bills cluster at the start of the month
+            day = date.fromordinal(day).replace(day=generator.randint(1, 5)).toordinal()
+        elif generator.random() < 0.3:
+            # Spending leans towards weekends
+            day += 5 - date.fromordinal(day).weekday() if date.fromordinal(day).weekday() < 5 else 0
+        median, spread = CATEGORY_AMOUNTS[category]
+        expenses.append({
+            "date": date.fromordinal(min(day, start + LEDGER_DAYS - 1)).isoformat(),
+            "amount": round(generator.lognormvariate(0, spread) * median, 2),
+            "description": f"{generator.choice(CATEGORY_WORDS[category])} at {generator.choice(merchants)}",
+            "category": category,
+        })
+    expenses.sort(key=lambda expense: expense["date"])
+    return expenses
+
+
+def write_ledger(path, expenses):
+    """Write a ledger in the trackers' expenses.json format."""
+    with open(path, 'w') as file:
+        file.write(json.dumps(expenses))
+
+
+def load_module(name, path):
+    """Import a tracker script from its file path under a unique module name."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fresh_lv3_modules():
+    """Drop cached lv3 helper modules so each variant starts with clean module state."""
+    if LV3_DIR not in sys.path:
+        sys.path.insert(0, LV3_DIR)
+    for name in LV3_MODULES:
+        sys.modules.pop(name, None)
+
+
+def load_gui_functions(path):
+    """Load the GUI's imports, functions and constants without building its window.
+
+    Personal_finance_tracker.py creates the Tk window and enters mainloop()
+    at import time, so only the statements that define things are run.
+    """
+    with open(path, 'r') as file:
+        tree = ast.parse(file.read(), path)
+
+    def keep(node):
+        if isinstance(node, ast.Import):
+            return not any(alias.name.startswith("tkinter") for alias in node.names)
+        if isinstance(node, ast.ImportFrom):
+            return not (node.module or "").startswith("tkinter")
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            return True
+        return isinstance(node, ast.Assign) and all(
+            isinstance(target, ast.Name) and target.id.isupper() for target in node.targets)
+
+    module = ast.Module(body=[node for node in tree.body if keep(node)], type_ignores=[])
+    namespace = {"__name__": "benchmark_gui", "__file__": path, "expense_data": []}
+    exec(compile(module, path, "exec"), namespace)
+    # The GUI turns on write-behind persistence before loading
+    namespace["expense_storage"].WRITE_BEHIND = True
+    return namespace
+
+
+def benchmark_expense(number):
+    """An expense for the add_expense benchmark."""
+    return {"date": "2024-06-15", "amount": 9.99, "description": f"benchmark item {number}", "category": "food"}
+
+
+def lv1_operations():
+    module = load_module("benchmark_lv1", LV1_FILE)
+
+    def add_expense():
+        for number in range(ADD_COUNT):
+            expense = benchmark_expense(number)
+            module.append_expenses([module.new_expense(expense["amount"], expense["description"],
+                                                       expense["category"], expense["date"])])
+
+    return {
+        "load_expenses": module.load_expenses,
+        "load_expenses_warm": module.load_expenses,
+        "view_summary": module.view_summary,
+        "add_expense": add_expense,
+        "save_expenses": module.save_expenses,
+        "export_to_text": lambda: module.export_to_csv("expenses.csv"),
+    }
+
+
+def lv2_operations():
+    module = load_module("benchmark_lv2", LV2_FILE)
+
+    def load_expenses():
+        # load_expenses() appends to the date rollups, so start them empty like a fresh process
+        module.expense_data = []
+        module.expense_days, module.expense_months, module.daily_totals, module.monthly_totals = [], [], {}, {}
+        module.load_expenses()
+
+    def add_expense():
+        for number in range(ADD_COUNT):
+            expense = benchmark_expense(number)
+            module.append_expenses([module.new_expense(expense["amount"], expense["description"],
+                                                       expense["category"], expense["date"])])
+
+    return {
+        "load_expenses": load_expenses,
+        "load_expenses_warm": load_expenses,
+        "view_summary": module.view_summary,
+        "add_expense": add_expense,
+        "save_expenses": module.save_expenses,
+        "export_to_excel": lambda: module.export_to_excel(path="expenses.xlsx"),
+    }
+
+
+def lv3_cli_operations():
+    fresh_lv3_modules()
+    module = load_module("benchmark_lv3_cli", LV3_CLI_FILE)
+
+    def add_expense():
+        for number in range(ADD_COUNT):
+            module.expense_storage.store_add(module.expense_data, benchmark_expense(number))
+
+    def export(path):
+        return lambda: module.expense_export.export_expenses(module.expense_data, path, module.EXPORT_HEADERS,
+                                                             module.EXPORT_COLUMNS)
+
+    return {
+        "load_expenses": module.load_expenses,
+        "load_expenses_warm": module.load_expenses,
+        "view_summary": module.view_summary,
+        "add_expense": add_expense,
+        "save_expenses": module.save_expenses,
+        "export_to_text": export("expenses.csv"),
+        "export_to_excel": export("expenses.xlsx"),
+    }
+
+
+def lv3_gui_operations():
+    fresh_lv3_modules()
+    gui = load_gui_functions(LV3_GUI_FILE)
+    storage = gui["expense_storage"]
+
+    def add_expense():
+        # Write-behind: the adds are flushed together, as the GUI does after a burst of entry
+        for number in range(ADD_COUNT):
+            storage.store_add(gui["expense_data"], benchmark_expense(number))
+        storage.flush_pending(gui["expense_data"])
+
+    def export(job):
+        return lambda: job(list(gui["expense_data"]), lambda done: None)
+
+    return {
+        "load_expenses": gui["load_expenses"],
+        "load_expenses_warm": gui["load_expenses"],
+        "view_summary": lambda: storage.summarize(gui["expense_data"]),
+        "add_expense": add_expense,
+        "save_expenses": gui["save_expenses"],
+        "export_to_text": export(gui["text_export_job"]),
+        "export_to_excel": export(gui["excel_export_job"]),
+        "export_to_database": export(gui["database_export_job"]),
+    }
+
+
+VARIANT_OPERATIONS = {
+    "lv1": lv1_operations,
+    "lv2": lv2_operations,
+    "lv3-cli": lv3_cli_operations,
+    "lv3-gui": lv3_gui_operations,
+}
+
+
+def remove_cache_files():
+    """Delete the files that let a tracker skip work on its next load."""
+    for path in CACHE_FILES:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def time_operation(function, repeat, before=None):
+    """Run function repeat times with its output silenced and return the wall time of each run."""
+    runs = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - start)
+    return runs
+
+
+def benchmark_variant(variant, ledger_file, operations, repeat):
+    """Benchmark one tracker variant in a scratch directory holding a copy of the ledger."""
+    results = []
+    previous_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix=f"benchmark-{variant}-")
+    try:
+        shutil.copy(ledger_file, os.path.join(work_dir, "expenses.json"))
+        # The trackers keep their files relative to the working directory
+        os.chdir(work_dir)
+        try:
+            available = VARIANT_OPERATIONS[variant]()
+        except ImportError as error:
+            print(f"{variant}: skipped ({error})", file=sys.stderr)
+            return results
+
+        for operation in operations:
+            if operation not in available:
+                continue
+            # Every operation after the cold load works on a loaded ledger
+            if operation != "load_expenses" and results == []:
+                available["load_expenses"]()
+            before = remove_cache_files if operation == "load_expenses" else None
+            try:
+                runs = time_operation(available[operation], repeat, before)
+            except ImportError as error:
+                print(f"{variant} {operation}: skipped ({error})", file=sys.stderr)
+                continue
+            result = {
+                "variant": variant,
+                "operation": operation,
+                "min_seconds": min(runs),
+                "median_seconds": statistics.median(runs),
+                "runs": runs,
+            }
+            if operation == "add_expense":
+                result["count"] = ADD_COUNT
+            results.append(result)
+            print(f"{variant:8} {operation:20} {result['min_seconds'] * 1000:10.1f} ms", file=sys.stderr)
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def git_revision():
+    """Return the current commit of the repository, or None outside a git checkout."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+                                check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip()
+
+
+def run_benchmarks(sizes, variants, operations, repeat, seed):
+    """Benchmark every variant at every ledger size and return the results document."""
+    document = {
+        "revision": git_revision(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": [],
+    }
+    ledger_dir = tempfile.mkdtemp(prefix="benchmark-ledgers-")
+    try:
+        for size in sizes:
+            ledger_file = os.path.join(ledger_dir, f"expenses-{size}.json")
+            write_ledger(ledger_file, generate_ledger(size, seed))
+            for variant in variants:
+                for result in benchmark_variant(variant, ledger_file, operations, repeat):
+                    result["rows"] = size
+                    document["results"].append(result)
+    finally:
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+    return document
+
+
+def measure_memory(rows, seed, repeat):
+    """Print bytes per expense and load time of the lv3 ledger held as dicts and as expense_record records.
+
+    Memory is what tracemalloc still sees allocated once the load returns;
+    load time is the best of repeat untraced loads with the snapshot cache off.
+    """
+    ledger_dir = tempfile.mkdtemp(prefix="benchmark-memory-")
+    ledger_file = os.path.join(ledger_dir, "expenses.json")
+    write_ledger(ledger_file, generate_ledger(rows, seed))
+    try:
+        for records in (False, True):
+            fresh_lv3_modules()
+            import expense_storage
+            expense_storage.RECORDS = records
+            expense_storage.SNAPSHOT_CACHE = False
+            expense_storage.DATA_FILE = ledger_file
+            expense_storage.JOURNAL_FILE = os.path.join(ledger_dir, "expenses.journal.jsonl")
+            expense_storage.SUMMARY_FILE = os.path.join(ledger_dir, "expenses.summary.json")
+            seconds = min(time_operation(expense_storage.load_expenses, repeat))
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            expense_data = expense_storage.load_expenses()
+            held = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            print(f"{'records' if records else 'dicts':8} {len(expense_data):>9} rows "
+                  f"{held / len(expense_data):8.1f} bytes/row {seconds * 1000:10.1f} ms load")
+            del expense_data
+    finally:
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+
+def writer_process(ledger_dir, concurrent, adds, start_barrier):
+    """One process of the writers benchmark: add expenses to the shared lv3 ledger, editing every tenth."""
+    os.chdir(ledger_dir)
+    fresh_lv3_modules()
+    import expense_storage
+    expense_storage.CONCURRENT = concurrent
+    expense_data = expense_storage.load_expenses()
+    start_barrier.wait()
+    for number in range(adds):
+        expense = benchmark_expense(number)
+        expense["description"] = f"writer {os.getpid()} item {number}"
+        expense_storage.store_add(expense_data, expense)
+        if number % 10 == 9:
+            edited = dict(expense, amount=expense["amount"] + 1)
+            expense_storage.store_edit(expense_data, expense["id"], edited, dict(expense))
+    expense_storage.close_storage(expense_data)
+
+
+def measure_writers(writer_counts, adds, rows, seed):
+    """Print the change throughput of N processes writing one lv3 ledger, without and with CONCURRENT mode.
+
+    Each writer adds adds expenses and edits every tenth one. Afterwards the
+    ledger is loaded again to count how many of the added expenses survived.
+    """
+    ledger = generate_ledger(rows, seed)
+    context = multiprocessing.get_context("spawn")
+    working_dir = os.getcwd()
+    for concurrent in (False, True):
+        for writers in writer_counts:
+            ledger_dir = tempfile.mkdtemp(prefix="benchmark-writers-")
+            try:
+                write_ledger(os.path.join(ledger_dir, "expenses.json"), ledger)
+                start_barrier = context.Barrier(writers + 1)
+                processes = [context.Process(target=writer_process, args=(ledger_dir, concurrent, adds, start_barrier))
+                             for _ in range(writers)]
+                for process in processes:
+                    process.start()
+                start_barrier.wait()
+                start = time.perf_counter()
+                for process in processes:
+                    process.join()
+                elapsed = time.perf_counter() - start
+                failed = sum(1 for process in processes if process.exitcode != 0)
+
+                os.chdir(ledger_dir)
+                fresh_lv3_modules()
+                import expense_storage
+                kept = len(expense_storage.load_expenses()) - rows
+                changes = writers * (adds + adds // 10)
+                print(f"{'locked' if concurrent else 'unlocked':8} {writers:>3} writers {changes / elapsed:10.0f} changes/s "
+                      f"{kept:>7}/{writers * adds} adds kept" + (f", {failed} writers failed" if failed else ""))
+            finally:
+                os.chdir(working_dir)
+                shutil.rmtree(ledger_dir, ignore_errors=True)
+
+
+def percentile(values, fraction):
+    """The value below which fraction of the sorted values fall."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def http_load(expense_server, port, clients, requests, rows, seed):
+    """Run clients keep-alive clients sending requests requests each; return (latencies by kind, errors, seconds)."""
+    import asyncio
+    latencies = {kind: [] for kind in HTTP_MIX}
+    errors = 0
+
+    async def run_client(number):
+        nonlocal errors
+        generator = random.Random(seed * 100000 + number)
+        client = expense_server.ExpenseClient("127.0.0.1", port)
+        try:
+            for request in range(requests):
+                kind = generator.choices(list(HTTP_MIX), weights=list(HTTP_MIX.values()))[0]
+                start = time.perf_counter()
+                if kind == "summary":
+                    status, _ = await client.request("GET", "/summary")
+                elif kind == "list":
+                    offset = generator.randrange(max(1, rows - HTTP_PAGE_SIZE))
+                    status, _ = await client.request("GET", f"/expenses?offset={offset}&limit={HTTP_PAGE_SIZE}")
+                else:
+                    status, _ = await client.request("POST", "/expenses", benchmark_expense(request))
+                latencies[kind].append(time.perf_counter() - start)
+                if status >= 400:
+                    errors += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(number) for number in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def measure_http(client_counts, requests, rows, pool, seed):
+    """Print the throughput and latency of the lv3 HTTP service under concurrent keep-alive clients.
+
+    The service runs in its own process (expense_tracker_advanced.py serve)
+    on a synthetic ledger. Each client sends requests requests in the
+    HTTP_MIX proportions, one at a time; the clients themselves share this
+    process's event loop, so latencies include some client-side queueing.
+    """
+    import asyncio
+    fresh_lv3_modules()
+    import expense_server
+    ledger_dir = tempfile.mkdtemp(prefix="benchmark-http-")
+    write_ledger(os.path.join(ledger_dir, "expenses.json"), generate_ledger(rows, seed))
+    server = subprocess.Popen([sys.executable, LV3_CLI_FILE, "serve", "--port", "0", "--pool", str(pool)],
+                              cwd=ledger_dir, stdout=subprocess.PIPE, text=True)
+    try:
+        # "Serving N expenses on http://127.0.0.1:PORT/"
+        port = int(server.stdout.readline().rstrip().rstrip("/").rsplit(":", 1)[1])
+        for clients in client_counts:
+            latencies, errors, elapsed = asyncio.run(http_load(expense_server, port, clients, requests, rows, seed))
+            total = sum(len(values) for values in latencies.values())
+            line = f"{clients:>4} clients {total / elapsed:8.0f} req/s"
+            for kind, values in latencies.items():
+                if values:
+                    values.sort()
+                    line += (f"  {kind} p50 {percentile(values, 0.5) * 1000:6.1f} ms"
+                             f" p99 {percentile(values, 0.99) * 1000:6.1f} ms")
+            print(line + (f"  {errors} errors" if errors else ""))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(ledger_dir, ignore_errors=True)
+
+
+def compare_results(baseline, current):
+    """Print the change in min time of every measurement present in both result documents."""
+    def keyed(document):
+        return {(result["variant"], result["rows"], result["operation"]): result["min_seconds"]
+                for result in document["results"]}
+
+    before = keyed(baseline)
+    after = keyed(current)
+    print(f"baseline {baseline.get('revision')} -> current {current.get('revision')}")
+    for key in sorted(set(before) & set(after)):
+        variant, rows, operation = key
+        ratio = after[key] / before[key] if before[key] > 0 else float("inf")
+        print(f"{variant:8} {rows:>9} {operation:20} {before[key] * 1000:10.1f} ms -> "
+              f"{after[key] * 1000:10.1f} ms  x{ratio:.2f}")
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(description="Benchmark the expense trackers on synthetic ledgers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                            help="ledger sizes to benchmark (10k to 10M)")
+    run_parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    run_parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.add_argument("--compare", help="earlier results file to compare against")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    generate_parser = subparsers.add_parser("generate", help="write a synthetic ledger")
+    generate_parser.add_argument("--rows", type=int, default=100000)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--output", default="expenses.json")
+
+    memory_parser = subparsers.add_parser("memory", help="compare lv3 memory per row and load time, dicts vs records")
+    memory_parser.add_argument("--rows", type=int, default=1000000)
+    memory_parser.add_argument("--seed", type=int, default=0)
+    memory_parser.add_argument("--repeat", type=int, default=3)
+
+    writers_parser = subparsers.add_parser("writers", help="measure lv3 write throughput with concurrent processes")
+    writers_parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    writers_parser.add_argument("--adds", type=int, default=500, help="expenses each writer adds")
+    writers_parser.add_argument("--rows", type=int, default=10000, help="size of the starting ledger")
+    writers_parser.add_argument("--seed", type=int, default=0)
+
+    http_parser = subparsers.add_parser("http", help="load test the lv3 HTTP service with concurrent clients")
+    http_parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500])
+    http_parser.add_argument("--requests", type=int, default=200, help="requests each client sends")
+    http_parser.add_argument("--rows", type=int, default=100000, help="size of the served ledger")
+    http_parser.add_argument("--pool", type=int, default=4, help="read connections in the service's storage pool")
+    http_parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main():
+    options = build_parser().parse_args()
+    if options.command == "generate":
+        write_ledger(options.output, generate_ledger(options.rows, options.seed))
+    elif options.command == "compare":
+        with open(options.baseline, 'r') as file:
+            baseline = json.load(file)
+        with open(options.current, 'r') as file:
+            current = json.load(file)
+        compare_results(baseline, current)
+    elif options.command == "memory":
+        measure_memory(options.rows, options.seed, options.repeat)
+    elif options.command == "writers":
+        measure_writers(options.writers, options.adds, options.rows, options.seed)
+    elif options.command == "http":
+        measure_http(options.clients, options.requests, options.rows, options.pool, options.seed)
+    else:
+        operations = [operation for operation in OPERATIONS if operation in options.operations]
+        document = run_benchmarks(options.rows, options.variants, operations, options.repeat, options.seed)
+        with open(options.output, 'w') as file:
+            json.dump(document, file, indent=2)
+        print(f"Results written to {options.output}", file=sys.stderr)
+        if options.compare:
+            with open(options.compare, 'r') as file:
+                compare_results(json.load(file), document)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
+import time
+# Taken before the other imports so --timing can report what they cost
+startup_start = time.perf_counter()
+import argparse
+import atexit
+import bisect
+import codecs
+import cProfile
+import csv
 import json
 import os
-from datetime import datetime
-import openpyxl
+import pickle
+import re
+import sys
+from datetime import date, datetime, timedelta
 
 # Global variables for storing expense data and categories
 expense_data = []
@@ -11,31 +22,437 @@ categories = {"food", "transportation", "utilities", "entertainment"}
 DATA_FILE = "expenses.json"
 EXCEL_FILE = "expenses.xlsx"
 
+# Excel's hard limit on rows per worksheet, header row included
+EXCEL_MAX_ROWS = 1048576
+
+
+# "journal" appends each added expense to JOURNAL_FILE, "json" rewrites DATA_FILE on every change
+STORAGE_MODE = "journal"
+JOURNAL_FILE = "expenses.journal.jsonl"
+JOURNAL_COMPACT_THRESHOLD = 1000
+journal_length = 0
+
+# Bytes read at a time when streaming DATA_FILE instead of loading it whole
+STREAM_CHUNK_SIZE = 1 << 20
+# Whitespace and the commas between array elements, skipped by the streaming reader
+STREAM_SEPARATOR = re.compile(r"[\s,]*")
+# Characters that may follow a complete array element
+STREAM_ELEMENT_END = " \t\r\n,]"
+
+# Running totals kept next to the data; VERIFY_SUMMARY re-checks them against a full recompute
+SUMMARY_FILE = "expenses.summary.json"
+VERIFY_SUMMARY = False
+summary = None
+
+# Parsed expenses pickled next to DATA_FILE so a warm start skips JSON parsing
+SNAPSHOT_CACHE = True
+SNAPSHOT_CACHE_FILE = "expenses.cache.pickle"
+SNAPSHOT_CACHE_VERSION = 1
+snapshot_cache_hit = False
+cache_data_signature = None
+
+# Opt-in metrics: EXPENSE_METRICS=1 or --metrics merges latency histograms, rows and bytes per operation into
+# METRICS_FILE on exit; EXPENSE_PROFILE=<command> or --profile <command> writes a cProfile of that one command
+METRICS_ENABLED = os.environ.get("EXPENSE_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("EXPENSE_METRICS_FILE", "expenses.metrics.json")
+PROFILE_COMMAND = os.environ.get("EXPENSE_PROFILE") or None
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is open ended
+METRIC_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+metrics = {}
+
+# Sorted expense days and months with daily and monthly [total, count] rollups for range totals
+expense_days = []
+expense_months = []
+daily_totals = {}
+monthly_totals = {}
 
-def load_expenses():
-    """Load expense data from file if it exists."""
-    global expense_data
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as file:
-            expense_data = json.load(file)
 
+def load_expenses():
+    """Load expense data from the snapshot cache or the data file, then replay the journal."""
+    global expense_data, journal_length, snapshot_cache_hit
+    global expense_days, expense_months, daily_totals, monthly_totals
+    cached = load_snapshot_cache()
+    snapshot_cache_hit = cached is not None
+    # With a cache hit the date rollups come from the cache and only replayed adds are indexed
+    rebuild_index = not snapshot_cache_hit
+    if snapshot_cache_hit:
+        expense_data, journal_length, journal_offset, rollups = cached
+        expense_days, expense_months, daily_totals, monthly_totals = rollups
+    else:
+        if os.path.exists(DATA_FILE):
+            start = time.perf_counter()
+            with open(DATA_FILE, 'r') as file:
+                expense_data = json.load(file)
+            record_metric("json.parse", start, len(expense_data), bytes_read=os.path.getsize(DATA_FILE))
+        journal_length = 0
+        journal_offset = 0
+
+    if os.path.exists(JOURNAL_FILE):
+        start = time.perf_counter()
+        replayed = 0
+        with open(JOURNAL_FILE, 'rb') as file:
+            file.seek(journal_offset)
+            for line in file:
+                if line.strip():
+                    expense = json.loads(line)["expense"]
+                    expense_data.append(expense)
+                    index_expense(expense)
+                    journal_length += 1
+                    replayed += 1
+            record_metric("journal.replay", start, replayed, bytes_read=file.tell() - journal_offset)
+    load_summary()
+    if rebuild_index:
+        expense_days, expense_months, daily_totals, monthly_totals = [], [], {}, {}
+        for expense in expense_data:
+            index_expense(expense)
+    if not snapshot_cache_hit and SNAPSHOT_CACHE:
+        save_snapshot_cache()
+
+
+def load_snapshot_cache():
+    """Return (expenses, journal length, journal offset, date rollups) from the snapshot cache, or None if it is stale."""
+    global cache_data_signature
+    if not SNAPSHOT_CACHE or not os.path.exists(SNAPSHOT_CACHE_FILE):
+        return None
+    start = time.perf_counter()
+    try:
+        with open(SNAPSHOT_CACHE_FILE, 'rb') as file:
+            header = pickle.load(file)
+            if header.get("version") != SNAPSHOT_CACHE_VERSION or header.get("data") != file_signature(DATA_FILE):
+                return None
+            # The journal only grows between compactions; a shorter one means it was replaced
+            journal_size = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+            if journal_size < header["journal_offset"]:
+                return None
+            cached_expenses, rollups = pickle.load(file)
+            record_metric("cache.read", start, len(cached_expenses), bytes_read=file.tell())
+    except Exception:
+        # A truncated or unreadable cache is only a miss
+        return None
+    cache_data_signature = header["data"]
+    return cached_expenses, header["journal_length"], header["journal_offset"], rollups
+
+
+def save_snapshot_cache():
+    """Pickle the expenses and date rollups with the data file signature and journal position they reflect."""
+    global cache_data_signature
+    header = {
+        "version": SNAPSHOT_CACHE_VERSION,
+        "data": file_signature(DATA_FILE),
+        "journal_offset": os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0,
+        "journal_length": journal_length,
+    }
+    temp_file = SNAPSHOT_CACHE_FILE + ".tmp"
+    start = time.perf_counter()
+    with open(temp_file, 'wb') as file:
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        rollups = (expense_days, expense_months, daily_totals, monthly_totals)
+        pickle.dump((expense_data, rollups), file, protocol=pickle.HIGHEST_PROTOCOL)
+        written = file.tell()
+    os.replace(temp_file, SNAPSHOT_CACHE_FILE)
+    record_metric("cache.write", start, len(expense_data), bytes_written=written)
+    cache_data_signature = header["data"]
 
-def save_expenses():
-    """Save expense data to file."""
-    with open(DATA_FILE, 'w') as file:
-        json.dump(expense_data, file)
 
+def refresh_snapshot_cache():
+    """Rebuild the snapshot cache if the data file has been rewritten since it was made."""
+    if SNAPSHOT_CACHE and cache_data_signature != file_signature(DATA_FILE):
+        save_snapshot_cache()
 
-def export_to_excel():
-    """Export expenses to an Excel spreadsheet."""
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    sheet.append(["Date", "Description", "Amount", "Category"])
 
-    for expense in expense_data:
-        sheet.append([expense["date"], expense["description"], expense["amount"], expense["category"]])
+def save_expenses():
+    """Save expense data to file."""
+    temp_file = DATA_FILE + ".tmp"
+    start = time.perf_counter()
+    with open(temp_file, 'w') as file:
+        # json.dumps uses the C encoder; json.dump to a file falls back to the pure Python one
+        text = json.dumps(expense_data)
+        file.write(text)
+    os.replace(temp_file, DATA_FILE)
+    record_metric("json.write", start, len(expense_data), bytes_written=len(text))
+
+
+def persist_changes(records):
+    """Persist a batch of changes with one journal write or one full save."""
+    global journal_length
+    if STORAGE_MODE != "journal":
+        compact_expenses()
+        return
+
+    start = time.perf_counter()
+    text = "".join(json.dumps(record) + "\n" for record in records)
+    with open(JOURNAL_FILE, 'a') as file:
+        file.write(text)
+    record_metric("journal.append", start, len(records), bytes_written=len(text))
+    journal_length += len(records)
+    # Compacting only once the journal is a fair fraction of the ledger keeps bulk adds amortized O(1)
+    if journal_length >= max(JOURNAL_COMPACT_THRESHOLD, len(expense_data) // 4):
+        compact_expenses()
+
+
+def compact_expenses():
+    """Fold the journal back into the snapshot file."""
+    global journal_length
+    save_expenses()
+    if os.path.exists(JOURNAL_FILE):
+        os.remove(JOURNAL_FILE)
+    journal_length = 0
+    save_summary()
+
+
+# Copy of iter_json_array in personal finance tracker lv3/expense_storage.py, the canonical version, as is the
+# one in Expense_Recorder.py (lv1); this script stays a single file, so change all three together
+def iter_json_array(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the elements of the JSON array stored in path (or an open binary file) one at a time.
+
+    The file is decoded chunk by chunk and each element is parsed with
+    JSONDecoder.raw_decode as soon as it is complete, so memory use is
+    bounded by the chunk size and the largest element, not the file size.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    at_end = False
+    with open(path, 'rb') if isinstance(path, str) else path as file:
+        while True:
+            position = STREAM_SEPARATOR.match(buffer, position).end()
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path} does not hold a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Usually an element cut off by the end of the chunk; only an error once the file is exhausted
+                    if at_end:
+                        raise
+                else:
+                    # A number cut off by the end of the chunk ("12" or "12.") parses short, so an element only
+                    # counts once what follows it can follow an element
+                    if at_end or (end < len(buffer) and buffer[end] in STREAM_ELEMENT_END):
+                        position = end
+                        yield value
+                        continue
+            if at_end:
+                raise ValueError(f"{path} ends before its JSON array is closed")
+            chunk = file.read(chunk_size)
+            at_end = not chunk
+            buffer = buffer[position:] + text_decoder.decode(chunk, final=at_end)
+            position = 0
+
+
+def iter_expenses():
+    """Yield every stored expense without loading the ledger: the data file, then the journal's additions."""
+    if os.path.exists(DATA_FILE):
+        yield from iter_json_array(DATA_FILE)
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, 'rb') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)["expense"]
+
+
+def compute_summary(expenses):
+    """Recompute the summary with a full scan of the expenses."""
+    result = {"total": 0.0, "count": 0, "categories": {}}
+    for expense in expenses:
+        result["total"] += expense["amount"]
+        result["count"] += 1
+        category_total = result["categories"].setdefault(expense["category"], [0.0, 0])
+        category_total[0] += expense["amount"]
+        category_total[1] += 1
+    return result
+
+
+def update_summary(expense, sign):
+    """Add (sign=1) or subtract (sign=-1) a single expense from the running summary."""
+    summary["total"] += sign * expense["amount"]
+    summary["count"] += sign
+    category_total = summary["categories"].setdefault(expense["category"], [0.0, 0])
+    category_total[0] += sign * expense["amount"]
+    category_total[1] += sign
+    if category_total[1] == 0:
+        del summary["categories"][expense["category"]]
+
+
+def file_signature(path):
+    """Return [size, mtime_ns] of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def storage_signature():
+    """Identify the current on-disk state of the data file and journal."""
+    return [file_signature(DATA_FILE), file_signature(JOURNAL_FILE)]
+
+
+def load_summary():
+    """Use the persisted summary if it matches the files on disk, otherwise rebuild it."""
+    global summary
+    if os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            summary = stored["summary"]
+            return
+    summary = compute_summary(expense_data)
+
+
+def stream_summary():
+    """Set the summary without loading the ledger, streaming it only if the persisted summary is stale."""
+    global summary
+    if not VERIFY_SUMMARY and os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            summary = stored["summary"]
+            return
+    start = time.perf_counter()
+    summary = compute_summary(iter_expenses())
+    record_metric("summary.stream", start, summary["count"])
+    save_summary()
+
+
+def save_summary():
+    """Persist the running summary together with the signature of the data it describes."""
+    with open(SUMMARY_FILE, 'w') as file:
+        json.dump({"signature": storage_signature(), "summary": summary}, file)
+
+
+def verify_summary():
+    """Check the running summary against a full recompute and repair it if they differ."""
+    global summary
+    expected = compute_summary(expense_data)
+    pairs = [(expected["total"], summary["total"])]
+    matches = expected["count"] == summary["count"] and expected["categories"].keys() == summary["categories"].keys()
+    if matches:
+        for category, (total, count) in expected["categories"].items():
+            matches = matches and summary["categories"][category][1] == count
+            pairs.append((total, summary["categories"][category][0]))
+    if not matches or any(abs(a - b) > 1e-6 * max(1.0, abs(a)) for a, b in pairs):
+        print("Summary verification failed, rebuilding it from the expenses.")
+        summary = expected
+
+
+def is_iso_date(value):
+    """Return True if value is a YYYY-MM-DD date string."""
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+
+def index_expense(expense):
+    """Add an expense to the daily and monthly rollups, keeping the day and month lists sorted."""
+    day = expense["date"]
+    if not is_iso_date(day):
+        return
+    for key, buckets, keys in ((day, daily_totals, expense_days), (day[:7], monthly_totals, expense_months)):
+        if key not in buckets:
+            buckets[key] = [0.0, 0]
+            bisect.insort(keys, key)
+        buckets[key][0] += expense["amount"]
+        buckets[key][1] += 1
+
+
+def sum_days(start, end):
+    """Total of the daily rollups from start to end inclusive."""
+    first = bisect.bisect_left(expense_days, start)
+    last = bisect.bisect_right(expense_days, end)
+    return sum(daily_totals[day][0] for day in expense_days[first:last])
+
+
+def range_total(start, end):
+    """Total spent from start to end inclusive, using monthly rollups for whole months."""
+    if start > end:
+        return 0.0
+    start_month, end_month = start[:7], end[:7]
+    if start_month == end_month:
+        return sum_days(start, end)
+
+    total = sum_days(start, start_month + "-31") + sum_days(end_month + "-01", end)
+    first = bisect.bisect_right(expense_months, start_month)
+    last = bisect.bisect_left(expense_months, end_month)
+    total += sum(monthly_totals[month][0] for month in expense_months[first:last])
+    return total
+
+
+def view_spending_between_dates():
+    """View the amount spent between two dates."""
+    today = datetime.now().date()
+    start = input("Enter the start date (YYYY-MM-DD) [Leave blank for 90 days ago]: ")
+    if start == "":
+        start = (today - timedelta(days=89)).isoformat()
+    end = input("Enter the end date (YYYY-MM-DD) [Leave blank for today]: ")
+    if end == "":
+        end = today.isoformat()
+    if not is_iso_date(start) or not is_iso_date(end):
+        print("Invalid date!")
+        return
+
+    print(f"\nSpent from {start} to {end}: ${range_total(start, end):.2f}")
+    print(f"Month to Date: ${range_total(today.replace(day=1).isoformat(), today.isoformat()):.2f}")
+    print(f"Last 90 Days: ${range_total((today - timedelta(days=89)).isoformat(), today.isoformat()):.2f}")
+
+
+def excel_rows(expenses):
+    """Yield one spreadsheet row per expense."""
+    for expense in expenses:
+        yield [expense["date"], expense["description"], expense["amount"], expense["category"]]
+
+
+def write_sheets(workbook, title, rows):
+    """Stream rows into worksheets, starting a new one whenever the row limit is reached."""
+    headers = ["Date", "Description", "Amount", "Category"]
+    sheet = workbook.create_sheet(title)
+    sheet.append(headers)
+    written = 1
+    part = 1
+    total = 0
+    for row in rows:
+        if written >= EXCEL_MAX_ROWS:
+            part += 1
+            sheet = workbook.create_sheet(f"{title} ({part})")
+            sheet.append(headers)
+            written = 1
+        sheet.append(row)
+        written += 1
+        total += 1
+    return total
+
+
+def export_to_excel(split_by_month=True, path=EXCEL_FILE, expenses=None):
+    """Export expenses to an Excel spreadsheet, streaming rows through a write-only workbook.
+
+    expenses defaults to the loaded ledger; any other iterable is streamed
+    as it is read, overflowing into numbered sheets instead of one per month.
+    """
+    # openpyxl takes a few hundred milliseconds to import, so only exports pay for it
+    import openpyxl
+
+    start = time.perf_counter()
+    workbook = openpyxl.Workbook(write_only=True)
+    rows = 0
+    if expenses is None and split_by_month and len(expense_data) >= EXCEL_MAX_ROWS:
+        months = {}
+        for expense in expense_data:
+            months.setdefault(expense["date"][:7], []).append(expense)
+        for month in sorted(months):
+            rows += write_sheets(workbook, month.replace("/", "-"), excel_rows(months[month]))
+    else:
+        rows = write_sheets(workbook, "Expenses", excel_rows(expense_data if expenses is None else expenses))
 
-    workbook.save(EXCEL_FILE)
+    workbook.save(path)
+    record_metric("export.excel", start, rows, bytes_written=os.path.getsize(path))
     print("Expenses exported to Excel successfully!")
 
 
@@ -50,18 +467,44 @@ def add_expense():
         category = input("Enter the category of the expense: ").lower()
 
     date_str = input("Enter the date (YYYY-MM-DD) of the expense [Leave blank for current date]: ")
+    while date_str != "" and not is_iso_date(date_str):
+        print("Invalid date. Use the format YYYY-MM-DD.")
+        date_str = input("Enter the date (YYYY-MM-DD) of the expense [Leave blank for current date]: ")
+    if date_str == "":
+        date_str = datetime.now().strftime('%Y-%m-%d')
+
+    append_expenses([new_expense(amount, description, category, date_str)])
+    print("Expense added successfully!")
+
+
+def new_expense(amount, description, category, date_str=""):
+    """Validate the fields of an expense and build its record, raising ValueError if invalid."""
+    amount = float(amount)
+    if not isinstance(description, str) or not isinstance(category, str) or not isinstance(date_str, str):
+        raise ValueError("description, category and date must be text")
+    category = category.lower()
+    if category not in categories:
+        raise ValueError(f"Invalid category {category!r}. Available categories: {sorted(categories)}")
     if date_str == "":
         date_str = datetime.now().strftime('%Y-%m-%d')
+    elif not is_iso_date(date_str):
+        raise ValueError(f"Invalid date {date_str!r}, expected YYYY-MM-DD")
 
-    expense = {
+    return {
         "date": date_str,
         "amount": amount,
         "description": description,
         "category": category
     }
-    expense_data.append(expense)
-    save_expenses()
-    print("Expense added successfully!")
+
+
+def append_expenses(expenses):
+    """Add expenses to the ledger and persist them with a single write."""
+    for expense in expenses:
+        expense_data.append(expense)
+        update_summary(expense, 1)
+        index_expense(expense)
+    persist_changes([{"op": "add", "expense": expense} for expense in expenses])
 
 
 def edit_expense():
@@ -81,13 +524,10 @@ def display_expenses():
 
 def view_summary():
     """View summary of expenses."""
-    total_spent = 0
-    category_totals = {}
-
-    for expense in expense_data:
-        total_spent += expense["amount"]
-        category = expense["category"]
-        category_totals[category] = category_totals.get(category, 0) + expense["amount"]
+    if VERIFY_SUMMARY:
+        verify_summary()
+    total_spent = summary["total"]
+    category_totals = {category: total for category, (total, count) in summary["categories"].items()}
 
     print("\nExpense Summary:")
     print(f"Total Amount Spent: ${total_spent:.2f}")
@@ -100,8 +540,8 @@ def view_summary():
         print("\nNo expenses recorded.")
 
     # Calculate and display average spending
-    if len(expense_data) > 0:
-        average_spending = total_spent / len(expense_data)
+    if summary["count"] > 0:
+        average_spending = total_spent / summary["count"]
         print(f"\nAverage Spending per Expense: ${average_spending:.2f}")
 
     # Implement any additional summary statistics as needed
@@ -114,27 +554,288 @@ def main_menu():
     print("3. Delete Expense")
     print("4. View Summary")
     print("5. Export to Excel")
-    print("6. Exit")
+    print("6. Spending Between Dates")
+    print("7. Exit")
 
 
-def main():
+def read_import_rows(path):
+    """Yield (line number, row dict) from a CSV file with a header row or a JSON Lines file."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, {key.strip().lower(): value for key, value in row.items() if key}
+        else:
+            yield from json_lines(file)
+
+
+def import_rows(rows, batch_size=10000):
+    """Validate rows and append them in batches. Returns (imported, rejected [(line, reason)])."""
+    imported = 0
+    rejected = []
+    batch = []
+    for line_number, row in rows:
+        if not isinstance(row, dict):
+            rejected.append((line_number, "row is not a JSON object"))
+            continue
+        try:
+            batch.append(new_expense(row["amount"], row["description"], row["category"], row.get("date") or ""))
+        except (KeyError, TypeError, ValueError) as error:
+            rejected.append((line_number, str(error)))
+            continue
+        if len(batch) >= batch_size:
+            append_expenses(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        append_expenses(batch)
+        imported += len(batch)
+    return imported, rejected
+
+
+def summary_report():
+    """Return the expense summary as a JSON-serializable dict."""
+    return {
+        "total": summary["total"],
+        "count": summary["count"],
+        "average": summary["total"] / summary["count"] if summary["count"] > 0 else 0.0,
+        "categories": {category: total for category, (total, count) in summary["categories"].items()}
+    }
+
+
+def json_lines(lines):
+    """Yield (line number, row) from JSON Lines, with None for lines that are not valid JSON."""
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+def timed_import(rows):
+    """Import rows and return a JSON-serializable report of the outcome."""
+    start = time.perf_counter()
+    imported, rejected = import_rows(rows)
+    seconds = time.perf_counter() - start
+    record_metric("import", start, imported + len(rejected))
+    return {
+        "imported": imported,
+        "rejected": [{"line": line_number, "reason": reason} for line_number, reason in rejected],
+        "rows_per_sec": round(imported / seconds) if seconds > 0 else imported
+    }
+
+
+def build_parser():
+    """Build the parser for the non-interactive subcommands."""
+    parser = argparse.ArgumentParser(description="Expense Tracker. Run without arguments for the interactive menu.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="add an expense, or many with --batch")
+    add_parser.add_argument("--amount", type=float)
+    add_parser.add_argument("--description", default="")
+    add_parser.add_argument("--category")
+    add_parser.add_argument("--date", default="", help="YYYY-MM-DD, defaults to today")
+    add_parser.add_argument("--batch", action="store_true",
+                            help="read expenses as JSON Lines from stdin and save them in one write")
+
+    subparsers.add_parser("summary", help="print the summary as JSON")
+
+    export_parser = subparsers.add_parser("export", help="export expenses to Excel")
+    export_parser.add_argument("--output", default=EXCEL_FILE)
+
+    import_parser = subparsers.add_parser("import", help="import expenses from a .csv or .jsonl file")
+    import_parser.add_argument("file")
+    return parser
+
+
+def run_command(args, on_loaded=None):
+    """Run a single non-interactive command and return the process exit code.
+
+    on_loaded, if given, is called with time.perf_counter() once the expenses are loaded, or with
+    streamed=True once a command that streams the ledger instead has finished.
+    """
+    parser = build_parser()
+    options = parser.parse_args(args)
+    # Summary and export stream the ledger instead of loading it, so they run in bounded memory
+    if options.command in ("summary", "export"):
+        try:
+            if options.command == "summary":
+                stream_summary()
+                print(json.dumps(summary_report()))
+            else:
+                export_to_excel(path=options.output, expenses=iter_expenses())
+            return 0
+        finally:
+            if on_loaded:
+                on_loaded(time.perf_counter(), streamed=True)
     load_expenses()
+    if on_loaded:
+        on_loaded(time.perf_counter())
+
+    if options.command == "add":
+        if options.batch:
+            print(json.dumps(timed_import(json_lines(sys.stdin))))
+        else:
+            if options.amount is None or options.category is None:
+                parser.error("add needs --amount and --category unless --batch is given")
+            try:
+                expense = new_expense(options.amount, options.description, options.category, options.date)
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                return 1
+            append_expenses([expense])
+            print(json.dumps({"imported": 1, "expense": expense}))
+        save_summary()
+    elif options.command == "import":
+        print(json.dumps(timed_import(read_import_rows(options.file))))
+        save_summary()
+    refresh_snapshot_cache()
+    return 0
+
+
+# Copy of the metrics helpers, record_metric through parse_metrics_options, in Expense_Recorder.py (lv1),
+# the canonical version; this script stays a single file, so change both together
+def record_metric(name, start, rows=0, bytes_read=0, bytes_written=0):
+    """Add an operation that began at time.perf_counter() value start to the named metric."""
+    if not METRICS_ENABLED:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metric = metrics.setdefault(name, new_metric())
+    metric["count"] += 1
+    metric["total_ms"] += elapsed_ms
+    metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+    metric["buckets"][bisect.bisect_left(METRIC_BUCKETS_MS, elapsed_ms)] += 1
+    metric["rows"] += rows
+    metric["bytes_read"] += bytes_read
+    metric["bytes_written"] += bytes_written
+
+
+def new_metric():
+    """Return an empty metric record."""
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(METRIC_BUCKETS_MS) + 1),
+            "rows": 0, "bytes_read": 0, "bytes_written": 0}
+
+
+def run_measured(name, function, *args):
+    """Run one command, timing it and capturing a cProfile if it is the command named by PROFILE_COMMAND."""
+    start = time.perf_counter()
+    try:
+        if name != PROFILE_COMMAND:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            profile_file = f"expenses.{name}.prof"
+            profile.dump_stats(profile_file)
+            print(f"Profile of {name} written to {profile_file} (view it with: python -m pstats {profile_file})",
+                  file=sys.stderr)
+    finally:
+        record_metric("command." + name, start)
+
+
+def dump_metrics():
+    """Merge this run's metrics into METRICS_FILE."""
+    if not metrics:
+        return
+    stored = {"buckets_ms": list(METRIC_BUCKETS_MS), "runs": 0, "metrics": {}}
+    if os.path.exists(METRICS_FILE):
+        try:
+            with open(METRICS_FILE, 'r') as file:
+                stored = json.load(file)
+        except ValueError:
+            pass
+    stored["runs"] = stored.get("runs", 0) + 1
+    for name, metric in metrics.items():
+        total = stored["metrics"].setdefault(name, new_metric())
+        for key in ("count", "total_ms", "rows", "bytes_read", "bytes_written"):
+            total[key] += metric[key]
+        total["max_ms"] = max(total["max_ms"], metric["max_ms"])
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], metric["buckets"])]
+        total["mean_ms"] = total["total_ms"] / total["count"]
+    temp_file = METRICS_FILE + ".tmp"
+    with open(temp_file, 'w') as file:
+        json.dump(stored, file, indent=2, sort_keys=True)
+    os.replace(temp_file, METRICS_FILE)
+    metrics.clear()
+
+
+def parse_metrics_options(argv):
+    """Apply --metrics and --profile <command>, returning the remaining arguments."""
+    global METRICS_ENABLED, PROFILE_COMMAND
+    remaining = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--metrics":
+            METRICS_ENABLED = True
+        elif argument == "--profile":
+            PROFILE_COMMAND = next(arguments, None)
+        elif argument.startswith("--profile="):
+            PROFILE_COMMAND = argument.split("=", 1)[1]
+        else:
+            remaining.append(argument)
+    if METRICS_ENABLED:
+        atexit.register(dump_metrics)
+    return remaining
+
+
+def report_startup_timing(imports_done, load_done, streamed=False):
+    """Print how long imports and loading the expenses took.
+
+    For a command that streams the ledger, load_done is when the command finished and the
+    load line reports the whole streamed run.
+    """
+    print(f"imports: {(imports_done - startup_start) * 1000:.1f} ms", file=sys.stderr)
+    if streamed:
+        print(f"load: {(load_done - imports_done) * 1000:.1f} ms (streamed, not loaded into memory)",
+              file=sys.stderr)
+    else:
+        source = "warm, snapshot cache" if snapshot_cache_hit else "cold, parsed JSON"
+        print(f"load: {(load_done - imports_done) * 1000:.1f} ms ({source}, {len(expense_data)} expenses)",
+              file=sys.stderr)
+    print(f"total: {(load_done - startup_start) * 1000:.1f} ms", file=sys.stderr)
+
+
+def main():
+    # --timing may be combined with the interactive menu or any subcommand
+    timing = "--timing" in sys.argv
+    args = [arg for arg in parse_metrics_options(sys.argv[1:]) if arg != "--timing"]
+    imports_done = time.perf_counter()
+    if args:
+        on_loaded = None
+        if timing:
+            on_loaded = lambda load_done, streamed=False: report_startup_timing(imports_done, load_done,
+                                                                                 streamed)
+        # Subcommands are measured and profiled under their own name, e.g. --profile summary
+        sys.exit(run_measured(args[0], run_command, args, on_loaded))
+
+    run_measured("load_expenses", load_expenses)
+    if timing:
+        report_startup_timing(imports_done, time.perf_counter())
 
     while True:
         main_menu()
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            add_expense()
+            run_measured("add_expense", add_expense)
         elif choice == '2':
-            edit_expense()
+            run_measured("edit_expense", edit_expense)
         elif choice == '3':
-            delete_expense()
+            run_measured("delete_expense", delete_expense)
         elif choice == '4':
-            view_summary()
+            run_measured("view_summary", view_summary)
         elif choice == '5':
-            export_to_excel()
+            run_measured("export_to_excel", export_to_excel)
         elif choice == '6':
+            run_measured("view_spending_between_dates", view_spending_between_dates)
+        elif choice == '7':
+            if journal_length > 0:
+                compact_expenses()
+            else:
+                save_summary()
+            refresh_snapshot_cache()
             print("Exiting...")
             break
         else:
@@ -171,9 +872,27 @@ if __name__ == "__main__":
 # 
 # To export your recorded expenses to an Excel spreadsheet, select option 5 from the main menu.
 # This will create an Excel file named expenses.xlsx in the same directory as the script, containing all your recorded expenses in a tabular format.
+# Spending Between Dates:
+# 
+# Select option 6 and enter a start and end date to see the amount spent in that window, along with month-to-date and last-90-days totals.
 # Exiting the Application:
 # 
-# To exit the application, select option 6 from the main menu.
+# To exit the application, select option 7 from the main menu.
+# Command Line Usage:
+# 
+# The script also runs without the menu, e.g. for cron jobs and pipelines:
+#   python enhanced_expense_tracker.py add --amount 12.5 --description "milk" --category food [--date YYYY-MM-DD]
+#   python enhanced_expense_tracker.py add --batch < expenses.jsonl   (one JSON object per line, saved in a single write)
+#   python enhanced_expense_tracker.py summary                       (prints the summary as JSON)
+#   python enhanced_expense_tracker.py export --output expenses.xlsx
+#   python enhanced_expense_tracker.py import bank.csv
+# summary and export stream expenses.json rather than loading it, so they also work on ledgers larger than memory.
+# Add --timing to the other commands, or to the plain interactive start, to print import and load times to stderr.
+# Startup reads expenses.cache.pickle instead of re-parsing expenses.json when the data file is unchanged.
+# Add --metrics (or set EXPENSE_METRICS=1) to merge latency histograms, rows and bytes for loading, saving, the journal,
+# exports and each command into expenses.metrics.json (EXPENSE_METRICS_FILE picks another file).
+# --profile <command> (or EXPENSE_PROFILE=<command>) writes a cProfile capture of one subcommand or menu action,
+# e.g. "summary --profile summary" or "--profile view_summary", to expenses.<command>.prof.
 # Data Structures and Algorithms:
 # 
 # Data Structures:
@@ -1,5 +1,14 @@
+import argparse
+import atexit
+import bisect
+import cProfile
+import codecs
+import csv
 import json
 import os
+import re
+import sys
+import time
 from datetime import datetime
 
 # Global variable for storing expense data
@@ -7,20 +16,245 @@ expense_data = []
 
 # File to store expense data persistently
 DATA_FILE = "expenses.json"
+EXPORT_FILE = "expenses.csv"
+
+# "journal" appends each change to JOURNAL_FILE, "json" rewrites DATA_FILE on every change
+STORAGE_MODE = "journal"
+JOURNAL_FILE = "expenses.journal.jsonl"
+JOURNAL_COMPACT_THRESHOLD = 1000
+journal_length = 0
+
+# Bytes read at a time when streaming DATA_FILE instead of loading it whole
+STREAM_CHUNK_SIZE = 1 << 20
+# Whitespace and the commas between array elements, skipped by the streaming reader
+STREAM_SEPARATOR = re.compile(r"[\s,]*")
+# Characters that may follow a complete array element
+STREAM_ELEMENT_END = " \t\r\n,]"
+
+# Running totals kept next to the data; VERIFY_SUMMARY re-checks them against a full recompute
+SUMMARY_FILE = "expenses.summary.json"
+VERIFY_SUMMARY = False
+summary = None
+
+# Opt-in metrics: EXPENSE_METRICS=1 or --metrics merges latency histograms, rows and bytes per operation into
+# METRICS_FILE on exit; EXPENSE_PROFILE=<command> or --profile <command> writes a cProfile of that one command
+METRICS_ENABLED = os.environ.get("EXPENSE_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("EXPENSE_METRICS_FILE", "expenses.metrics.json")
+PROFILE_COMMAND = os.environ.get("EXPENSE_PROFILE") or None
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is open ended
+METRIC_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+metrics = {}
 
 
 def load_expenses():
-    """Load expense data from file if it exists."""
-    global expense_data
+    """Load expense data from file if it exists and replay the journal."""
+    global expense_data, journal_length
     if os.path.exists(DATA_FILE):
+        start = time.perf_counter()
         with open(DATA_FILE, 'r') as file:
             expense_data = json.load(file)
+        record_metric("json.parse", start, len(expense_data), bytes_read=os.path.getsize(DATA_FILE))
+
+    journal_length = 0
+    if os.path.exists(JOURNAL_FILE):
+        start = time.perf_counter()
+        with open(JOURNAL_FILE, 'r') as file:
+            for line in file:
+                if line.strip():
+                    apply_journal_record(json.loads(line))
+                    journal_length += 1
+        record_metric("journal.replay", start, journal_length, bytes_read=os.path.getsize(JOURNAL_FILE))
+    load_summary()
 
 
 def save_expenses():
     """Save expense data to file."""
-    with open(DATA_FILE, 'w') as file:
-        json.dump(expense_data, file)
+    temp_file = DATA_FILE + ".tmp"
+    start = time.perf_counter()
+    with open(temp_file, 'w') as file:
+        # json.dumps uses the C encoder; json.dump to a file falls back to the pure Python one
+        text = json.dumps(expense_data)
+        file.write(text)
+    os.replace(temp_file, DATA_FILE)
+    record_metric("json.write", start, len(expense_data), bytes_written=len(text))
+
+
+def apply_journal_record(record):
+    """Apply a single journal record to the in-memory expense data."""
+    if record["op"] == "add":
+        expense_data.append(record["expense"])
+
+
+def persist_changes(records):
+    """Persist a batch of changes with one journal write or one full save."""
+    global journal_length
+    if STORAGE_MODE != "journal":
+        compact_expenses()
+        return
+
+    start = time.perf_counter()
+    text = "".join(json.dumps(record) + "\n" for record in records)
+    with open(JOURNAL_FILE, 'a') as file:
+        file.write(text)
+    record_metric("journal.append", start, len(records), bytes_written=len(text))
+    journal_length += len(records)
+    # Compacting only once the journal is a fair fraction of the ledger keeps bulk adds amortized O(1)
+    if journal_length >= max(JOURNAL_COMPACT_THRESHOLD, len(expense_data) // 4):
+        compact_expenses()
+
+
+def compact_expenses():
+    """Fold the journal back into the snapshot file."""
+    global journal_length
+    save_expenses()
+    if os.path.exists(JOURNAL_FILE):
+        os.remove(JOURNAL_FILE)
+    journal_length = 0
+    save_summary()
+
+
+# Copy of iter_json_array in personal finance tracker lv3/expense_storage.py, the canonical version, as is the
+# one in enhanced_expense_tracker.py (lv2); this script stays a single file, so change all three together
+def iter_json_array(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the elements of the JSON array stored in path (or an open binary file) one at a time.
+
+    The file is decoded chunk by chunk and each element is parsed with
+    JSONDecoder.raw_decode as soon as it is complete, so memory use is
+    bounded by the chunk size and the largest element, not the file size.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    at_end = False
+    with open(path, 'rb') if isinstance(path, str) else path as file:
+        while True:
+            position = STREAM_SEPARATOR.match(buffer, position).end()
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path} does not hold a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Usually an element cut off by the end of the chunk; only an error once the file is exhausted
+                    if at_end:
+                        raise
+                else:
+                    # A number cut off by the end of the chunk ("12" or "12.") parses short, so an element only
+                    # counts once what follows it can follow an element
+                    if at_end or (end < len(buffer) and buffer[end] in STREAM_ELEMENT_END):
+                        position = end
+                        yield value
+                        continue
+            if at_end:
+                raise ValueError(f"{path} ends before its JSON array is closed")
+            chunk = file.read(chunk_size)
+            at_end = not chunk
+            buffer = buffer[position:] + text_decoder.decode(chunk, final=at_end)
+            position = 0
+
+
+def iter_expenses():
+    """Yield every stored expense without loading the ledger: the data file, then the journal's additions."""
+    if os.path.exists(DATA_FILE):
+        yield from iter_json_array(DATA_FILE)
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, 'r') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    if record["op"] == "add":
+                        yield record["expense"]
+
+
+def compute_summary(expenses):
+    """Recompute the summary with a full scan of the expenses."""
+    result = {"total": 0.0, "count": 0, "categories": {}}
+    for expense in expenses:
+        result["total"] += expense["amount"]
+        result["count"] += 1
+        category_total = result["categories"].setdefault(expense["category"], [0.0, 0])
+        category_total[0] += expense["amount"]
+        category_total[1] += 1
+    return result
+
+
+def update_summary(expense, sign):
+    """Add (sign=1) or subtract (sign=-1) a single expense from the running summary."""
+    summary["total"] += sign * expense["amount"]
+    summary["count"] += sign
+    category_total = summary["categories"].setdefault(expense["category"], [0.0, 0])
+    category_total[0] += sign * expense["amount"]
+    category_total[1] += sign
+    if category_total[1] == 0:
+        del summary["categories"][expense["category"]]
+
+
+def storage_signature():
+    """Identify the current on-disk state of the data file and journal."""
+    signature = []
+    for path in (DATA_FILE, JOURNAL_FILE):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        else:
+            signature.append(None)
+    return signature
+
+
+def load_summary():
+    """Use the persisted summary if it matches the files on disk, otherwise rebuild it."""
+    global summary
+    if os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            summary = stored["summary"]
+            return
+    summary = compute_summary(expense_data)
+
+
+def stream_summary():
+    """Set the summary without loading the ledger, streaming it only if the persisted summary is stale."""
+    global summary
+    if not VERIFY_SUMMARY and os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            summary = stored["summary"]
+            return
+    start = time.perf_counter()
+    summary = compute_summary(iter_expenses())
+    record_metric("summary.stream", start, summary["count"])
+    save_summary()
+
+
+def save_summary():
+    """Persist the running summary together with the signature of the data it describes."""
+    with open(SUMMARY_FILE, 'w') as file:
+        json.dump({"signature": storage_signature(), "summary": summary}, file)
+
+
+def verify_summary():
+    """Check the running summary against a full recompute and repair it if they differ."""
+    global summary
+    expected = compute_summary(expense_data)
+    pairs = [(expected["total"], summary["total"])]
+    matches = expected["count"] == summary["count"] and expected["categories"].keys() == summary["categories"].keys()
+    if matches:
+        for category, (total, count) in expected["categories"].items():
+            matches = matches and summary["categories"][category][1] == count
+            pairs.append((total, summary["categories"][category][0]))
+    if not matches or any(abs(a - b) > 1e-6 * max(1.0, abs(a)) for a, b in pairs):
+        print("Summary verification failed, rebuilding it from the expenses.")
+        summary = expected
 
 
 def get_current_date():
@@ -34,26 +268,45 @@ def add_expense():
     description = input("Enter a brief description: ")
     category = input("Enter the category of the expense: ").lower()
 
-    expense = {
-        "date": get_current_date(),
+    append_expenses([new_expense(amount, description, category)])
+    print("Expense added successfully!")
+
+
+def new_expense(amount, description, category, date_str=""):
+    """Validate the fields of an expense and build its record, raising ValueError if invalid."""
+    amount = float(amount)
+    if not isinstance(description, str) or not isinstance(category, str) or not isinstance(date_str, str):
+        raise ValueError("description, category and date must be text")
+    if date_str == "":
+        date_str = get_current_date()
+    else:
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Invalid date {date_str!r}, expected YYYY-MM-DD")
+
+    return {
+        "date": date_str,
         "amount": amount,
         "description": description,
-        "category": category
+        "category": category.lower()
     }
-    expense_data.append(expense)
-    save_expenses()
-    print("Expense added successfully!")
+
+
+def append_expenses(expenses):
+    """Add expenses to the ledger and persist them with a single write."""
+    for expense in expenses:
+        expense_data.append(expense)
+        update_summary(expense, 1)
+    persist_changes([{"op": "add", "expense": expense} for expense in expenses])
 
 
 def view_summary():
     """View summary of expenses."""
-    total_spent = 0
-    category_totals = {}
-
-    for expense in expense_data:
-        total_spent += expense["amount"]
-        category = expense["category"]
-        category_totals[category] = category_totals.get(category, 0) + expense["amount"]
+    if VERIFY_SUMMARY:
+        verify_summary()
+    total_spent = summary["total"]
+    category_totals = {category: total for category, (total, count) in summary["categories"].items()}
 
     print("\nExpense Summary:")
     print(f"Total Amount Spent: ${total_spent:.2f}")
@@ -71,18 +324,255 @@ def display_menu():
     print("3. Exit")
 
 
-def main():
+def export_to_csv(path=EXPORT_FILE, expenses=None):
+    """Export expenses (the loaded ledger unless an iterable is given) to a CSV file."""
+    if expenses is None:
+        expenses = expense_data
+    start = time.perf_counter()
+    rows = 0
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Date", "Amount", "Description", "Category"])
+        for expense in expenses:
+            writer.writerow([expense["date"], expense["amount"], expense["description"], expense["category"]])
+            rows += 1
+    record_metric("export.csv", start, rows, bytes_written=os.path.getsize(path))
+    print(f"Expenses exported to {path} successfully!")
+
+
+def json_lines(lines):
+    """Yield (line number, row) from JSON Lines, with None for lines that are not valid JSON."""
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+def read_import_rows(path):
+    """Yield (line number, row dict) from a CSV file with a header row or a JSON Lines file."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, {key.strip().lower(): value for key, value in row.items() if key}
+        else:
+            yield from json_lines(file)
+
+
+def import_rows(rows, batch_size=10000):
+    """Validate rows and append them in batches. Returns (imported, rejected [(line, reason)])."""
+    imported = 0
+    rejected = []
+    batch = []
+    for line_number, row in rows:
+        if not isinstance(row, dict):
+            rejected.append((line_number, "row is not a JSON object"))
+            continue
+        try:
+            batch.append(new_expense(row["amount"], row["description"], row["category"], row.get("date") or ""))
+        except (KeyError, TypeError, ValueError) as error:
+            rejected.append((line_number, str(error)))
+            continue
+        if len(batch) >= batch_size:
+            append_expenses(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        append_expenses(batch)
+        imported += len(batch)
+    return imported, rejected
+
+
+def timed_import(rows):
+    """Import rows and return a JSON-serializable report of the outcome."""
+    start = time.perf_counter()
+    imported, rejected = import_rows(rows)
+    seconds = time.perf_counter() - start
+    record_metric("import", start, imported + len(rejected))
+    return {
+        "imported": imported,
+        "rejected": [{"line": line_number, "reason": reason} for line_number, reason in rejected],
+        "rows_per_sec": round(imported / seconds) if seconds > 0 else imported
+    }
+
+
+def summary_report():
+    """Return the expense summary as a JSON-serializable dict."""
+    return {
+        "total": summary["total"],
+        "count": summary["count"],
+        "average": summary["total"] / summary["count"] if summary["count"] > 0 else 0.0,
+        "categories": {category: total for category, (total, count) in summary["categories"].items()}
+    }
+
+
+def build_parser():
+    """Build the parser for the non-interactive subcommands."""
+    parser = argparse.ArgumentParser(description="Expense Recording System. Run without arguments for the interactive menu.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="add an expense, or many with --batch")
+    add_parser.add_argument("--amount", type=float)
+    add_parser.add_argument("--description", default="")
+    add_parser.add_argument("--category")
+    add_parser.add_argument("--date", default="", help="YYYY-MM-DD, defaults to today")
+    add_parser.add_argument("--batch", action="store_true",
+                            help="read expenses as JSON Lines from stdin and save them in one write")
+
+    subparsers.add_parser("summary", help="print the summary as JSON")
+
+    export_parser = subparsers.add_parser("export", help="export expenses to CSV")
+    export_parser.add_argument("--output", default=EXPORT_FILE)
+
+    import_parser = subparsers.add_parser("import", help="import expenses from a .csv or .jsonl file")
+    import_parser.add_argument("file")
+    return parser
+
+
+def run_command(args):
+    """Run a single non-interactive command and return the process exit code."""
+    parser = build_parser()
+    options = parser.parse_args(args)
+    # Summary and export stream the ledger instead of loading it, so they run in bounded memory
+    if options.command == "summary":
+        stream_summary()
+        print(json.dumps(summary_report()))
+        return 0
+    if options.command == "export":
+        export_to_csv(options.output, iter_expenses())
+        return 0
     load_expenses()
 
+    if options.command == "add":
+        if options.batch:
+            print(json.dumps(timed_import(json_lines(sys.stdin))))
+        else:
+            if options.amount is None or options.category is None:
+                parser.error("add needs --amount and --category unless --batch is given")
+            try:
+                expense = new_expense(options.amount, options.description, options.category, options.date)
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                return 1
+            append_expenses([expense])
+            print(json.dumps({"imported": 1, "expense": expense}))
+        save_summary()
+    elif options.command == "import":
+        print(json.dumps(timed_import(read_import_rows(options.file))))
+        save_summary()
+    return 0
+
+
+# The canonical copy of the metrics helpers, record_metric through parse_metrics_options:
+# enhanced_expense_tracker.py (lv2) carries an identical copy, so a change here is made there too.
+# lv3 has the fuller expense_metrics module instead
+def record_metric(name, start, rows=0, bytes_read=0, bytes_written=0):
+    """Add an operation that began at time.perf_counter() value start to the named metric."""
+    if not METRICS_ENABLED:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metric = metrics.setdefault(name, new_metric())
+    metric["count"] += 1
+    metric["total_ms"] += elapsed_ms
+    metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+    metric["buckets"][bisect.bisect_left(METRIC_BUCKETS_MS, elapsed_ms)] += 1
+    metric["rows"] += rows
+    metric["bytes_read"] += bytes_read
+    metric["bytes_written"] += bytes_written
+
+
+def new_metric():
+    """Return an empty metric record."""
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(METRIC_BUCKETS_MS) + 1),
+            "rows": 0, "bytes_read": 0, "bytes_written": 0}
+
+
+def run_measured(name, function, *args):
+    """Run one command, timing it and capturing a cProfile if it is the command named by PROFILE_COMMAND."""
+    start = time.perf_counter()
+    try:
+        if name != PROFILE_COMMAND:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            profile_file = f"expenses.{name}.prof"
+            profile.dump_stats(profile_file)
+            print(f"Profile of {name} written to {profile_file} (view it with: python -m pstats {profile_file})",
+                  file=sys.stderr)
+    finally:
+        record_metric("command." + name, start)
+
+
+def dump_metrics():
+    """Merge this run's metrics into METRICS_FILE."""
+    if not metrics:
+        return
+    stored = {"buckets_ms": list(METRIC_BUCKETS_MS), "runs": 0, "metrics": {}}
+    if os.path.exists(METRICS_FILE):
+        try:
+            with open(METRICS_FILE, 'r') as file:
+                stored = json.load(file)
+        except ValueError:
+            pass
+    stored["runs"] = stored.get("runs", 0) + 1
+    for name, metric in metrics.items():
+        total = stored["metrics"].setdefault(name, new_metric())
+        for key in ("count", "total_ms", "rows", "bytes_read", "bytes_written"):
+            total[key] += metric[key]
+        total["max_ms"] = max(total["max_ms"], metric["max_ms"])
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], metric["buckets"])]
+        total["mean_ms"] = total["total_ms"] / total["count"]
+    temp_file = METRICS_FILE + ".tmp"
+    with open(temp_file, 'w') as file:
+        json.dump(stored, file, indent=2, sort_keys=True)
+    os.replace(temp_file, METRICS_FILE)
+    metrics.clear()
+
+
+def parse_metrics_options(argv):
+    """Apply --metrics and --profile <command>, returning the remaining arguments."""
+    global METRICS_ENABLED, PROFILE_COMMAND
+    remaining = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--metrics":
+            METRICS_ENABLED = True
+        elif argument == "--profile":
+            PROFILE_COMMAND = next(arguments, None)
+        elif argument.startswith("--profile="):
+            PROFILE_COMMAND = argument.split("=", 1)[1]
+        else:
+            remaining.append(argument)
+    if METRICS_ENABLED:
+        atexit.register(dump_metrics)
+    return remaining
+
+
+def main():
+    args = parse_metrics_options(sys.argv[1:])
+    if args:
+        # Subcommands are measured and profiled under their own name, e.g. --profile summary
+        sys.exit(run_measured(args[0], run_command, args))
+
+    run_measured("load_expenses", load_expenses)
+
     while True:
         display_menu()
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            add_expense()
+            run_measured("add_expense", add_expense)
         elif choice == '2':
-            view_summary()
+            run_measured("view_summary", view_summary)
         elif choice == '3':
+            if journal_length > 0:
+                compact_expenses()
+            else:
+                save_summary()
             print("Exiting...")
             break
         else:
@@ -125,6 +615,19 @@ if __name__ == "__main__":
 # 
 # To exit the application, choose option 3 from the main menu.
 # Your expense data will be saved automatically before the application exits.
+# Command Line Usage:
+# 
+# The script also runs without the menu, e.g. for cron jobs and pipelines:
+#   python Expense_Recorder.py add --amount 12.5 --description "milk" --category food [--date YYYY-MM-DD]
+#   python Expense_Recorder.py add --batch < expenses.jsonl   (one JSON object per line, saved in a single write)
+#   python Expense_Recorder.py summary                       (prints the summary as JSON)
+#   python Expense_Recorder.py export --output expenses.csv
+#   python Expense_Recorder.py import bank.csv
+# summary and export stream expenses.json rather than loading it, so they also work on ledgers larger than memory.
+# Add --metrics (or set EXPENSE_METRICS=1) to merge latency histograms, rows and bytes for loading, saving, the journal,
+# exports and each command into expenses.metrics.json (EXPENSE_METRICS_FILE picks another file).
+# --profile <command> (or EXPENSE_PROFILE=<command>) writes a cProfile capture of one subcommand or menu action,
+# e.g. "summary --profile summary" or "--profile view_summary", to expenses.<command>.prof.
 # 
 # 
 # 
@@ -1,28 +1,268 @@
+import time
+# Taken before the other imports so --timing can report what they cost
+startup_start = time.perf_counter()
 import tkinter as tk
 from tkinter import messagebox
-import json
+import hashlib
 import os
-import openpyxl
-import sqlite3
+import queue
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import expense_currency
+import expense_dates
+import expense_export
+import expense_metrics
+import expense_search
+import expense_storage
 
 # Global variables
 expense_data = []
-DATA_FILE = "expenses.json"
 EXCEL_FILE = "expenses.xlsx"
 TEXT_FILE = "expenses.txt"
 DB_FILE = "expenses.db"
+EXPORT_HEADERS = ["Amount", "Currency", f"Amount ({expense_currency.BASE_CURRENCY})", "Description", "Date",
+                  "Category"]
+EXPORT_COLUMNS = ["amount", "currency", "base_amount", "description", "date", "category"]
+
+# --timing prints how long each startup phase took
+TIMING = "--timing" in sys.argv
+startup_marks = [("imports", time.perf_counter())]
+# --metrics and --profile <command> turn on expense_metrics (see the notes at the end of this file)
+expense_metrics.configure(sys.argv[1:])
+
+# The expense list is virtual: only VISIBLE_ROWS rows starting at list_offset exist as Listbox items
+VISIBLE_ROWS = 15
+list_offset = 0
+
+# Exports run on worker threads and report back through export_events, which the Tk loop polls
+EXPORT_WORKERS = 3
+EXPORT_POLL_MS = 100
+export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS)
+export_events = queue.Queue()
+# Running exports by name: {name: cancel event} and {name: (rows done, total rows)}
+export_jobs = {}
+export_progress = {}
+# Token the last SQLite export stored in DB_FILE, or None when the next one has to compare every expense
+database_sync_token = None
+
+# Every change is synced to the journal before it is confirmed; folding the journal into the snapshot is written
+# behind: once entry pauses for PERSIST_DELAY_MS, at the latest PERSIST_MAX_DELAY_MS after the first change, or
+# straight away once PERSIST_BATCH_SIZE changes are waiting
+PERSIST_DELAY_MS = 1500
+PERSIST_MAX_DELAY_MS = 10000
+PERSIST_BATCH_SIZE = 25
+expense_storage.WRITE_BEHIND = True
+# With a ledger shared between processes (expense_storage.CONCURRENT), how often to pick up their changes
+SHARED_POLL_MS = 2000
+merged_changes_shown = 0
+flush_job = None
+first_pending_time = None
+
+# Raised inside a worker when its export has been cancelled
+class ExportCancelled(Exception):
+    pass
 
 # Load expense data from file if it exists
 def load_expenses():
     global expense_data
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as file:
-            expense_data = json.load(file)
+    expense_data = expense_storage.load_expenses()
 
 # Save expense data to file
 def save_expenses():
-    with open(DATA_FILE, 'w') as file:
-        json.dump(expense_data, file)
+    expense_storage.save_expenses(expense_data)
+
+# Remember when a startup phase finished
+def mark_startup(phase):
+    startup_marks.append((phase, time.perf_counter()))
+
+# Print the duration of each startup phase, called once the window is ready
+def report_startup_timing():
+    mark_startup("window ready")
+    cache = "warm, snapshot cache" if expense_storage.snapshot_cache_hit else "cold, parsed JSON"
+    if expense_storage.STORAGE_MODE == "sqlite":
+        cache = "sqlite"
+    previous = startup_start
+    for phase, moment in startup_marks:
+        detail = f" ({cache}, {len(expense_data)} expenses)" if phase == "load" else ""
+        print(f"{phase}: {(moment - previous) * 1000:.1f} ms{detail}")
+        previous = moment
+    print(f"total: {(previous - startup_start) * 1000:.1f} ms")
+
+# Queue a flush after a change, or flush right away once enough have piled up; returns True if the change is on
+# disk, retrying a failed journal append straight away (which reports the error) if it is not
+def schedule_flush():
+    global flush_job, first_pending_time
+    if expense_storage.pending_count():
+        return flush_changes()
+    if first_pending_time is None:
+        first_pending_time = time.perf_counter()
+    if flush_job is not None:
+        main_window.after_cancel(flush_job)
+        flush_job = None
+    waited_ms = (time.perf_counter() - first_pending_time) * 1000
+    if expense_storage.deferred_count() >= PERSIST_BATCH_SIZE or waited_ms >= PERSIST_MAX_DELAY_MS:
+        flush_changes()
+    else:
+        flush_job = main_window.after(PERSIST_DELAY_MS, flush_changes)
+        update_save_status()
+    return True
+
+# Retry failed journal appends and fold the journal into the snapshot; if that fails it is retried later
+def flush_changes():
+    global flush_job, first_pending_time
+    if flush_job is not None:
+        main_window.after_cancel(flush_job)
+        flush_job = None
+    try:
+        expense_storage.flush_pending(expense_data)
+    except Exception as error:
+        flush_job = main_window.after(PERSIST_MAX_DELAY_MS, flush_changes)
+        update_save_status()
+        messagebox.showerror("Error", f"Could not save changes, they will be retried: {error}")
+        return False
+    first_pending_time = None
+    update_save_status()
+    return True
+
+# Pick up changes other processes have written to a shared ledger and redraw the list if there were any
+def poll_shared_ledger():
+    global merged_changes_shown
+    try:
+        expense_storage.refresh_expenses(expense_data)
+    except TimeoutError:
+        # Another process is holding the lock; try again on the next poll
+        pass
+    if expense_storage.merged_changes != merged_changes_shown:
+        merged_changes_shown = expense_storage.merged_changes
+        render_expense_list()
+    main_window.after(SHARED_POLL_MS, poll_shared_ledger)
+
+# Show whether every change has reached the disk
+def update_save_status():
+    pending = expense_storage.pending_count()
+    if pending:
+        save_status_label.config(text=f"{pending} unsaved change{'' if pending == 1 else 's'}")
+    else:
+        save_status_label.config(text="All changes saved")
+
+# Flush pending changes and release storage before closing
+def on_close():
+    # Keep the window open if the changes cannot be written, so nothing is lost
+    if not flush_changes():
+        return
+    cancel_exports()
+    export_executor.shutdown(wait=True)
+    expense_storage.close_storage(expense_data)
+    main_window.destroy()
+
+# Text shown for an expense in the expense list; amounts in another currency carry its code
+def expense_label(expense):
+    currency = expense_currency.currency_field(expense)
+    if currency is None:
+        return f"{expense['description']} - {expense['amount']}"
+    return f"{expense['description']} - {expense['amount']} {currency}"
+
+# Absolute index of the expense selected in the expense list, or None
+def selected_expense_index():
+    selection = expense_listbox.curselection()
+    if not selection:
+        return None
+    return list_offset + selection[0]
+
+# Id of the expense selected in the expense list, or None
+def selected_expense_id():
+    index = selected_expense_index()
+    if index is None:
+        return None
+    return expense_data[index]["id"]
+
+# Move the scrollbar to reflect which part of the ledger is visible
+def update_scrollbar():
+    total = len(expense_data)
+    if total <= VISIBLE_ROWS:
+        expense_scrollbar.set(0, 1)
+    else:
+        expense_scrollbar.set(list_offset / total, (list_offset + VISIBLE_ROWS) / total)
+
+# Render the visible window of the expense list, keeping the selection if it is still on screen
+def render_expense_list():
+    global list_offset
+    selected = selected_expense_index()
+    list_offset = max(0, min(list_offset, len(expense_data) - VISIBLE_ROWS))
+    expense_listbox.delete(0, tk.END)
+    for index in range(list_offset, min(list_offset + VISIBLE_ROWS, len(expense_data))):
+        expense_listbox.insert(tk.END, expense_label(expense_data[index]))
+    if selected is not None and list_offset <= selected < list_offset + VISIBLE_ROWS:
+        expense_listbox.selection_set(selected - list_offset)
+    update_scrollbar()
+
+# Scroll the expense list; called by the scrollbar with ("moveto", fraction) or ("scroll", n, "units"/"pages")
+def scroll_expense_list(action, amount, unit="units"):
+    global list_offset
+    if action == "moveto":
+        list_offset = int(float(amount) * len(expense_data))
+    elif action == "scroll":
+        list_offset += int(amount) * (VISIBLE_ROWS if unit == "pages" else 1)
+    render_expense_list()
+
+# Scroll the expense list with the mouse wheel
+def on_expense_list_wheel(event):
+    direction = -1 if event.num == 4 or event.delta > 0 else 1
+    scroll_expense_list("scroll", direction * 3)
+    return "break"
+
+# Scroll past the edges of the visible window with the arrow keys
+def on_expense_list_key(event):
+    selection = expense_listbox.curselection()
+    position = selection[0] if selection else 0
+    if event.keysym == "Up" and position == 0 and list_offset > 0:
+        scroll_expense_list("scroll", -1)
+        expense_listbox.selection_clear(0, tk.END)
+        expense_listbox.selection_set(0)
+        return "break"
+    if event.keysym == "Down" and position == VISIBLE_ROWS - 1:
+        scroll_expense_list("scroll", 1)
+        expense_listbox.selection_clear(0, tk.END)
+        expense_listbox.selection_set(VISIBLE_ROWS - 1)
+        return "break"
+
+# Show a newly appended expense without redrawing the list, following the tail if it was on screen
+def on_expense_added(expense_id):
+    global list_offset
+    index = len(expense_data) - 1
+    # In monthly storage an expense is added to the end of its own month, which need not be the last one
+    if expense_data.position_of(expense_id) != index:
+        render_expense_list()
+        return
+    if index == 0 or list_offset <= index - 1 < list_offset + VISIBLE_ROWS:
+        if expense_listbox.size() >= VISIBLE_ROWS:
+            expense_listbox.delete(0)
+            list_offset += 1
+        expense_listbox.insert(tk.END, expense_label(expense_data[index]))
+    update_scrollbar()
+
+# Redraw a single edited row if it is on screen
+def on_expense_edited(expense_id, old_index):
+    index = expense_data.position_of(expense_id)
+    # An edit that moved the expense to another month in monthly storage shifts the rows in between
+    if index != old_index:
+        render_expense_list()
+        return
+    if index is not None and list_offset <= index < list_offset + VISIBLE_ROWS:
+        position = index - list_offset
+        selected = expense_listbox.curselection()
+        expense_listbox.delete(position)
+        expense_listbox.insert(position, expense_label(expense_data[index]))
+        if selected:
+            expense_listbox.selection_set(selected[0])
+
+# Warn about the budgets an add or edit took past their warning level or limit (see expense_budgets)
+def show_budget_alerts(old_expense, new_expense):
+    messages = expense_storage.check_budgets(expense_data, old_expense, new_expense)
+    if messages:
+        messagebox.showwarning("Budget", "\n".join(messages))
 
 # Get current date
 def get_current_date():
@@ -51,18 +291,25 @@ def add_expense():
         "date": date,
         "category": category
     }
-    expense_data.append(expense)
-    save_expenses()
-    messagebox.showinfo("Success", "Expense added successfully.")
-
-# Edit an existing expense entry
+    currency = expense_currency.parse_currency(currency_var.get())
+    if currency is not None:
+        expense["currency"] = currency
+    expense = expense_storage.store_add(expense_data, expense)
+    saved = schedule_flush()
+    on_expense_added(expense["id"])
+    if saved:
+        messagebox.showinfo("Success", "Expense added successfully.")
+    show_budget_alerts(None, expense)
+
+# Edit the expense selected in the expense list
 def edit_expense():
+    expense_id = selected_expense_id()
+    if expense_id is None:
+        messagebox.showerror("Error", "No expense selected.")
+        return
+
     def submit_edit():
-        selected_index = expense_listbox.curselection()
-        if not selected_index:
-            messagebox.showerror("Error", "No expense selected.")
-            return
-        selected_expense = expense_data[selected_index[0]]
+        selected_expense = dict(original)
 
         amount = amount_entry.get()
         description = description_entry.get()
@@ -83,119 +330,433 @@ def edit_expense():
         selected_expense["description"] = description
         selected_expense["date"] = date
         selected_expense["category"] = category
+        currency = expense_currency.parse_currency(currency_var.get())
+        if currency is None:
+            selected_expense.pop("currency", None)
+        else:
+            selected_expense["currency"] = currency
 
-        save_expenses()
-        messagebox.showinfo("Success", "Expense edited successfully.")
+        old_index = expense_data.position_of(expense_id)
+        try:
+            old_expense = expense_storage.store_edit(expense_data, expense_id, selected_expense, original)
+        except KeyError:
+            messagebox.showerror("Error", "The expense no longer exists.")
+            edit_window.destroy()
+            render_expense_list()
+            return
+        except expense_storage.EditConflict as conflict:
+            # Edit on top of the other change from now on, so submitting again applies these values over it
+            original.update(conflict.current)
+            messagebox.showerror("Error", f"{conflict}. Check the values and submit again.")
+            return
+        saved = schedule_flush()
+        on_expense_edited(expense_id, old_index)
+        if saved:
+            messagebox.showinfo("Success", "Expense edited successfully.")
         edit_window.destroy()
+        show_budget_alerts(old_expense, expense_data.get(expense_id))
 
     edit_window = tk.Toplevel()
     edit_window.title("Edit Expense")
 
-    expense_label = tk.Label(edit_window, text="Select Expense to Edit:")
-    expense_label.grid(row=0, column=0, padx=10, pady=5)
-    expense_listbox = tk.Listbox(edit_window, selectmode=tk.SINGLE)
-    expense_listbox.grid(row=1, column=0, columnspan=2, padx=10, pady=5)
-    for expense in expense_data:
-        expense_listbox.insert(tk.END, f"{expense['description']} - {expense['amount']}")
+    # The expense as the edit started from, so changes other processes make meanwhile can be merged
+    original = dict(expense_data.get(expense_id))
+    expense = original
+    editing_label = tk.Label(edit_window, text=f"Editing: {expense_label(expense)}")
+    editing_label.grid(row=0, column=0, columnspan=2, padx=10, pady=5)
 
     amount_label = tk.Label(edit_window, text="Amount:")
     amount_label.grid(row=2, column=0, padx=10, pady=5)
     amount_entry = tk.Entry(edit_window)
+    amount_entry.insert(0, str(expense["amount"]))
     amount_entry.grid(row=2, column=1, padx=10, pady=5)
 
     description_label = tk.Label(edit_window, text="Description:")
     description_label.grid(row=3, column=0, padx=10, pady=5)
     description_entry = tk.Entry(edit_window)
+    description_entry.insert(0, expense["description"])
     description_entry.grid(row=3, column=1, padx=10, pady=5)
 
     date_label = tk.Label(edit_window, text="Date (YYYY-MM-DD):")
     date_label.grid(row=4, column=0, padx=10, pady=5)
     date_entry = tk.Entry(edit_window)
+    date_entry.insert(0, expense["date"])
     date_entry.grid(row=4, column=1, padx=10, pady=5)
 
     category_label = tk.Label(edit_window, text="Category:")
     category_label.grid(row=5, column=0, padx=10, pady=5)
     category_var = tk.StringVar()
-    category_var.set(list(categories)[0])
+    category_var.set(expense["category"] if expense["category"] in categories else list(categories)[0])
     category_option = tk.OptionMenu(edit_window, category_var, *categories)
     category_option.grid(row=5, column=1, padx=10, pady=5)
 
+    currency_label = tk.Label(edit_window, text="Currency:")
+    currency_label.grid(row=6, column=0, padx=10, pady=5)
+    currency_var = tk.StringVar()
+    currency_var.set(expense_currency.currency_of(expense))
+    currency_option = tk.OptionMenu(edit_window, currency_var, *currencies)
+    currency_option.grid(row=6, column=1, padx=10, pady=5)
+
     submit_button = tk.Button(edit_window, text="Submit", command=submit_edit)
-    submit_button.grid(row=6, column=0, columnspan=2, padx=10, pady=10, sticky="we")
+    submit_button.grid(row=7, column=0, columnspan=2, padx=10, pady=10, sticky="we")
 
 # Delete an existing expense entry
 def delete_expense():
-    selected_index = expense_listbox.curselection()
-    if not selected_index:
+    expense_id = selected_expense_id()
+    if expense_id is None:
         messagebox.showerror("Error", "No expense selected.")
         return
-    expense_data.pop(selected_index[0])
-    save_expenses()
-    messagebox.showinfo("Success", "Expense deleted successfully.")
+    try:
+        expense_storage.store_delete(expense_data, expense_id)
+    except KeyError:
+        messagebox.showerror("Error", "The expense no longer exists.")
+        render_expense_list()
+        return
+    saved = schedule_flush()
+    expense_listbox.selection_clear(0, tk.END)
+    render_expense_list()
+    if saved:
+        messagebox.showinfo("Success", "Expense deleted successfully.")
 
 # View summary of expenses
 def view_summary():
-    total_spent = 0
-    category_totals = {}
-
-    for expense in expense_data:
-        total_spent += expense["amount"]
-        category = expense["category"]
-        category_totals[category] = category_totals.get(category, 0) + expense["amount"]
+    total_spent, count, category_totals = expense_metrics.run_command("summarize", expense_storage.summarize,
+                                                                      expense_data)
 
-    summary_text = f"Total Amount Spent: ${total_spent:.2f}\n\nCategory Breakdown:\n"
+    summary_text = f"Total Amount Spent ({expense_currency.BASE_CURRENCY}): ${total_spent:.2f}\n\nCategory Breakdown:\n"
     for category, amount in category_totals.items():
         summary_text += f"{category.capitalize()}: ${amount:.2f}\n"
+    if count > 0:
+        summary_text += f"\nAverage Spending per Expense: ${total_spent / count:.2f}\n"
+    warning = expense_currency.missing_rates_warning()
+    if warning is not None:
+        summary_text += f"\n{warning}\n"
 
     summary_window = tk.Toplevel()
     summary_window.title("Expense Summary")
     summary_label = tk.Label(summary_window, text=summary_text, justify=tk.LEFT)
     summary_label.pack(padx=10, pady=10)
 
+# Run an export job on a worker thread over a snapshot of the expenses, or over what snapshot() returns
+def start_export(name, job, snapshot=None):
+    if name in export_jobs:
+        messagebox.showerror("Error", f"The {name} export is already running.")
+        return
+    expenses = snapshot() if snapshot is not None else list(expense_data)
+    cancelled = threading.Event()
+    export_jobs[name] = cancelled
+    export_progress[name] = (0, len(expenses))
+
+    # Called by the job as rows are written; raising here is how a cancelled job stops
+    def progress(done):
+        if cancelled.is_set():
+            raise ExportCancelled()
+        export_events.put(("progress", name, (done, len(expenses))))
+
+    def run():
+        try:
+            message = expense_metrics.run_command(job.__name__, job, expenses, progress)
+        except ExportCancelled:
+            export_events.put(("cancelled", name, f"The {name} export was cancelled."))
+        except Exception as error:
+            export_events.put(("error", name, f"The {name} export failed: {error}"))
+        else:
+            warning = expense_currency.missing_rates_warning()
+            if warning is not None:
+                message += f"\n{warning}"
+            export_events.put(("done", name, message))
+
+    export_executor.submit(run)
+    update_export_status()
+
+# Ask every running export to stop at its next progress check
+def cancel_exports():
+    for cancelled in export_jobs.values():
+        cancelled.set()
+
+# Show the progress of running exports under the export buttons
+def update_export_status():
+    parts = []
+    for name, (done, total) in export_progress.items():
+        percent = 100 * done // total if total else 100
+        parts.append(f"{name}: {percent}%")
+    export_status_label.config(text=", ".join(parts))
+    cancel_exports_button.config(state=tk.NORMAL if export_jobs else tk.DISABLED)
+
+# Drain events posted by export workers; runs on the Tk thread so it may touch widgets
+def poll_export_events():
+    finished = []
+    while True:
+        try:
+            kind, name, value = export_events.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "progress":
+            export_progress[name] = value
+        else:
+            export_jobs.pop(name, None)
+            export_progress.pop(name, None)
+            finished.append((kind, value))
+    update_export_status()
+    for kind, message in finished:
+        if kind == "done":
+            messagebox.showinfo("Success", message)
+        elif kind == "cancelled":
+            messagebox.showwarning("Cancelled", message)
+        else:
+            messagebox.showerror("Error", message)
+    main_window.after(EXPORT_POLL_MS, poll_export_events)
+
+# Search expense descriptions, optionally filtered by category and date range
+def search_expenses():
+    def run_search(event=None):
+        start = from_entry.get().strip() or None
+        end = to_entry.get().strip() or None
+        for value in (start, end):
+            if value is not None and not expense_dates.is_iso_date(value):
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+                return
+        category = search_category_var.get()
+        category = None if category == "Any" else category
+
+        results = expense_metrics.run_command("search_expenses", expense_storage.search_expenses, expense_data,
+                                              query_entry.get(), category, start, end)
+        results_listbox.delete(0, tk.END)
+        for expense in results:
+            results_listbox.insert(tk.END, f"{expense['date']}  {expense_label(expense)}  ({expense['category']})")
+        if len(results) == expense_search.SEARCH_LIMIT:
+            results_label.config(text=f"First {len(results)} matches, refine the search to see others:")
+        else:
+            results_label.config(text=f"{len(results)} matching expense{'' if len(results) == 1 else 's'}:")
+
+    search_window = tk.Toplevel()
+    search_window.title("Search Expenses")
+
+    query_label = tk.Label(search_window, text="Words (prefixes match):")
+    query_label.grid(row=0, column=0, padx=10, pady=5)
+    query_entry = tk.Entry(search_window)
+    query_entry.grid(row=0, column=1, padx=10, pady=5)
+    query_entry.bind("<Return>", run_search)
+
+    search_category_label = tk.Label(search_window, text="Category:")
+    search_category_label.grid(row=1, column=0, padx=10, pady=5)
+    search_category_var = tk.StringVar()
+    search_category_var.set("Any")
+    search_category_option = tk.OptionMenu(search_window, search_category_var, "Any", *categories)
+    search_category_option.grid(row=1, column=1, padx=10, pady=5)
+
+    from_label = tk.Label(search_window, text="From (YYYY-MM-DD):")
+    from_label.grid(row=2, column=0, padx=10, pady=5)
+    from_entry = tk.Entry(search_window)
+    from_entry.grid(row=2, column=1, padx=10, pady=5)
+
+    to_label = tk.Label(search_window, text="To (YYYY-MM-DD):")
+    to_label.grid(row=3, column=0, padx=10, pady=5)
+    to_entry = tk.Entry(search_window)
+    to_entry.grid(row=3, column=1, padx=10, pady=5)
+
+    search_button = tk.Button(search_window, text="Search", command=run_search)
+    search_button.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="we")
+
+    results_label = tk.Label(search_window, text="")
+    results_label.grid(row=5, column=0, columnspan=2, padx=10, pady=5)
+    results_listbox = tk.Listbox(search_window, height=VISIBLE_ROWS, width=60)
+    results_listbox.grid(row=6, column=0, columnspan=2, padx=10, pady=5)
+
 # Export expenses to Excel
 def export_to_excel():
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    sheet.title = "Expenses"
-    headers = ["Amount", "Description", "Date", "Category"]
-    sheet.append(headers)
-    for expense in expense_data:
-        row = [expense["amount"], expense["description"], expense["date"], expense["category"]]
-        sheet.append(row)
-    workbook.save(EXCEL_FILE)
-    messagebox.showinfo("Success", f"Expenses exported to {EXCEL_FILE}.")
-
-# Export expenses to text file
-def export_to_text():
-    with open(TEXT_FILE, "w") as file:
-        for expense in expense_data:
-            line = ",".join([str(expense[key]) for key in ["amount", "description", "date", "category"]])
-            file.write(line + "\n")
-    messagebox.showinfo("Success", f"Expenses exported to {TEXT_FILE}.")
+    start_export("Excel", excel_export_job)
 
-# Export expenses to SQLite database
+def excel_export_job(expenses, progress):
+    expense_export.export_expenses(expenses, EXCEL_FILE, EXPORT_HEADERS, EXPORT_COLUMNS, progress=progress)
+    return f"Expenses exported to {EXCEL_FILE}."
+
+# Export expenses to text file, as CSV so descriptions containing commas or quotes survive
+def export_to_text():
+    start_export("Text", text_export_job)
+
+def text_export_job(expenses, progress):
+    expense_export.export_expenses(expenses, TEXT_FILE, EXPORT_HEADERS, EXPORT_COLUMNS, progress=progress)
+    return f"Expenses exported to {TEXT_FILE}."
+
+# Export to a chosen file, format and compression from its extension, optionally filtered by category and dates
+def export_as():
+    def submit_export():
+        path = file_entry.get().strip()
+        start = from_entry.get().strip() or None
+        end = to_entry.get().strip() or None
+        for value in (start, end):
+            if value is not None and not expense_dates.is_iso_date(value):
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+                return
+        try:
+            expense_export.output_format(path)
+        except ValueError as error:
+            messagebox.showerror("Error", str(error))
+            return
+        category = export_category_var.get()
+        category = None if category == "Any" else category
+
+        def export_job(expenses, progress):
+            exported = expense_export.export_expenses(expenses, path, EXPORT_HEADERS, EXPORT_COLUMNS,
+                                                      category, start, end, progress)
+            return f"Exported {exported} expenses to {path}."
+
+        start_export(os.path.basename(path), export_job)
+        export_window.destroy()
+
+    export_window = tk.Toplevel()
+    export_window.title("Export Expenses")
+
+    file_label = tk.Label(export_window, text="File (.csv, .jsonl, .xlsx, .db; .gz/.bz2/.xz compresses):")
+    file_label.grid(row=0, column=0, padx=10, pady=5)
+    file_entry = tk.Entry(export_window)
+    file_entry.insert(0, "expenses.csv")
+    file_entry.grid(row=0, column=1, padx=10, pady=5)
+
+    export_category_label = tk.Label(export_window, text="Category:")
+    export_category_label.grid(row=1, column=0, padx=10, pady=5)
+    export_category_var = tk.StringVar()
+    export_category_var.set("Any")
+    export_category_option = tk.OptionMenu(export_window, export_category_var, "Any", *categories)
+    export_category_option.grid(row=1, column=1, padx=10, pady=5)
+
+    from_label = tk.Label(export_window, text="From (YYYY-MM-DD):")
+    from_label.grid(row=2, column=0, padx=10, pady=5)
+    from_entry = tk.Entry(export_window)
+    from_entry.grid(row=2, column=1, padx=10, pady=5)
+
+    to_label = tk.Label(export_window, text="To (YYYY-MM-DD):")
+    to_label.grid(row=3, column=0, padx=10, pady=5)
+    to_entry = tk.Entry(export_window)
+    to_entry.grid(row=3, column=1, padx=10, pady=5)
+
+    submit_button = tk.Button(export_window, text="Export", command=submit_export)
+    submit_button.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="we")
+
+# Rows for the SQLite export, keyed by expense id and carrying a hash of their contents
+def export_rows(expenses):
+    for expense, base_amount in expense_currency.converted(expenses):
+        if not base_amount and not expense_currency.has_rates(expense):
+            base_amount = None
+        values = (expense["amount"], expense["description"], expense["date"], expense["category"],
+                  expense_currency.currency_of(expense), base_amount)
+        row_hash = hashlib.sha1("\x1f".join(map(repr, values)).encode("utf-8")).hexdigest()
+        yield (str(expense["id"]),) + values + (row_hash,)
+
+# Export expenses to SQLite database, writing only rows changed since the last export. The first export of a
+# session compares every expense with the database; later ones write just the expenses changed in between, as
+# long as the database still holds the token the previous export left in it
 def export_to_database():
+    if database_sync_token is None or expense_storage.changed_ids is None:
+        start_export("SQLite", database_export_job, database_full_snapshot)
+    else:
+        start_export("SQLite", database_changes_job, database_changes_snapshot)
+
+def database_full_snapshot():
+    # Changes made from here on are picked up by the next export
+    expense_storage.take_changed_ids()
+    return list(expense_data)
+
+def database_changes_snapshot():
+    return [(expense_id, expense_data.get(expense_id)) for expense_id in sorted(expense_storage.take_changed_ids())]
+
+# Open DB_FILE, creating or upgrading its tables
+def open_export_database():
+    import sqlite3
+
     conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS expenses (
-                        id INTEGER PRIMARY KEY,
-                        amount REAL,
-                        description TEXT,
-                        date TEXT,
-                        category TEXT)''')
-    for expense in expense_data:
-        cursor.execute('''INSERT INTO expenses (amount, description, date, category)
-                          VALUES (?, ?, ?, ?)''',
-                       (expense["amount"], expense["description"], expense["date"], expense["category"]))
-    conn.commit()
-    conn.close()
-    messagebox.showinfo("Success", f"Expenses exported to {DB_FILE}.")
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS expenses (
+                            id INTEGER PRIMARY KEY,
+                            amount REAL,
+                            description TEXT,
+                            date TEXT,
+                            category TEXT)''')
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(expenses)")]
+        if "row_key" not in columns:
+            conn.execute("ALTER TABLE expenses ADD COLUMN row_key TEXT")
+        if "currency" not in columns:
+            conn.execute("ALTER TABLE expenses ADD COLUMN currency TEXT")
+            conn.execute("ALTER TABLE expenses ADD COLUMN base_amount REAL")
+        if "row_hash" not in columns:
+            # Rows exported before were keyed by their contents; the next full export replaces them all
+            conn.execute("ALTER TABLE expenses ADD COLUMN row_hash TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_row_key ON expenses (row_key)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+def stored_sync_token(conn):
+    row = conn.execute("SELECT value FROM sync_state WHERE name = 'token'").fetchone()
+    return None if row is None else row[0]
+
+# Delete and upsert rows in one transaction, recording a new sync token; returns the token
+def write_database_rows(conn, removed, written):
+    conn.executemany("DELETE FROM expenses WHERE row_key = ?", removed)
+    conn.executemany('''INSERT INTO expenses (row_key, amount, description, date, category, currency, base_amount,
+                                              row_hash)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT(row_key) DO UPDATE SET amount = excluded.amount,
+                              description = excluded.description, date = excluded.date,
+                              category = excluded.category, currency = excluded.currency,
+                              base_amount = excluded.base_amount, row_hash = excluded.row_hash''', written)
+    token = uuid.uuid4().hex
+    conn.execute('''INSERT INTO sync_state (name, value) VALUES ('token', ?)
+                    ON CONFLICT(name) DO UPDATE SET value = excluded.value''', (token,))
+    return token
+
+# Full sync: hash every expense and write the rows whose hash differs from the exported one
+def database_export_job(expenses, progress):
+    global database_sync_token
+    # A job that does not finish leaves the next export to compare everything again
+    database_sync_token = None
+    rows = {row[0]: row for row in export_rows(expense_export.RowCounter(expenses, progress))}
+
+    conn = open_export_database()
+    try:
+        with conn:
+            exported = dict(conn.execute("SELECT row_key, row_hash FROM expenses"))
+            written = [row for key, row in rows.items() if exported.get(key) != row[-1]]
+            removed = [(key,) for key in exported if key not in rows]
+            # Last chance to cancel: the transaction rolls back and the database is left as it was
+            progress(len(expenses))
+            token = write_database_rows(conn, removed, written)
+            # Rows without a key, written by the old full re-export, and the old watermark are dropped too
+            conn.execute("DELETE FROM expenses WHERE row_key IS NULL")
+            conn.execute("DELETE FROM sync_state WHERE name = 'watermark'")
+    finally:
+        conn.close()
+    database_sync_token = token
+    progress(len(expenses))
+    return f"Expenses exported to {DB_FILE} ({len(written)} written, {len(removed)} removed)."
+
+# Incremental sync: write only the expenses changed since the last export, given as (id, expense or None)
+def database_changes_job(changes, progress):
+    global database_sync_token
+    expected_token, database_sync_token = database_sync_token, None
+    removed = [(str(expense_id),) for expense_id, expense in changes if expense is None]
+    written = list(export_rows(expense_export.RowCounter(
+        (expense for expense_id, expense in changes if expense is not None), progress)))
+
+    conn = open_export_database()
+    try:
+        with conn:
+            if stored_sync_token(conn) != expected_token:
+                raise ValueError(f"{DB_FILE} was changed by another export; export again to bring it up to date")
+            progress(len(changes))
+            token = write_database_rows(conn, removed, written)
+    finally:
+        conn.close()
+    database_sync_token = token
+    progress(len(changes))
+    return f"Expenses exported to {DB_FILE} ({len(written)} written, {len(removed)} removed)."
 
 # Load categories
 categories = {"Food", "Transportation", "Utilities", "Entertainment", "Other"}
 
 # Load expense data from file
-load_expenses()
+expense_metrics.run_command("load_expenses", load_expenses)
+mark_startup("load")
 
 # Create main window
 main_window = tk.Tk()
@@ -227,8 +788,17 @@ category_var.set(list(categories)[0])
 category_option = tk.OptionMenu(add_frame, category_var, *categories)
 category_option.grid(row=3, column=1, padx=10, pady=5)
 
+# The base currency and every currency with rates in expense_currency.RATE_FILE
+currencies = expense_currency.get_rate_table().currencies()
+currency_label = tk.Label(add_frame, text="Currency:")
+currency_label.grid(row=4, column=0, padx=10, pady=5)
+currency_var = tk.StringVar()
+currency_var.set(expense_currency.BASE_CURRENCY)
+currency_option = tk.OptionMenu(add_frame, currency_var, *currencies)
+currency_option.grid(row=4, column=1, padx=10, pady=5)
+
 add_button = tk.Button(add_frame, text="Add Expense", command=add_expense)
-add_button.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="we")
+add_button.grid(row=5, column=0, columnspan=2, padx=10, pady=10, sticky="we")
 
 # Expense List Section
 expense_list_frame = tk.Frame(main_window)
@@ -237,10 +807,18 @@ expense_list_frame.pack(pady=10)
 expense_list_label = tk.Label(expense_list_frame, text="Expense List:")
 expense_list_label.grid(row=0, column=0, padx=10, pady=5)
 
-expense_listbox = tk.Listbox(expense_list_frame, selectmode=tk.SINGLE)
-expense_listbox.grid(row=1, column=0, padx=10, pady=5)
-for expense in expense_data:
-    expense_listbox.insert(tk.END, f"{expense['description']} - {expense['amount']}")
+expense_listbox = tk.Listbox(expense_list_frame, selectmode=tk.SINGLE, height=VISIBLE_ROWS, width=40)
+expense_listbox.grid(row=1, column=0, padx=(10, 0), pady=5)
+expense_scrollbar = tk.Scrollbar(expense_list_frame, orient=tk.VERTICAL, command=scroll_expense_list)
+expense_scrollbar.grid(row=1, column=1, padx=(0, 10), pady=5, sticky="ns")
+expense_listbox.bind("<MouseWheel>", on_expense_list_wheel)
+expense_listbox.bind("<Button-4>", on_expense_list_wheel)
+expense_listbox.bind("<Button-5>", on_expense_list_wheel)
+expense_listbox.bind("<Up>", on_expense_list_key)
+expense_listbox.bind("<Down>", on_expense_list_key)
+expense_listbox.bind("<Prior>", lambda event: scroll_expense_list("scroll", -1, "pages"))
+expense_listbox.bind("<Next>", lambda event: scroll_expense_list("scroll", 1, "pages"))
+render_expense_list()
 
 # Buttons Section
 button_frame = tk.Frame(main_window)
@@ -255,6 +833,9 @@ delete_button.grid(row=0, column=1, padx=10, pady=5)
 view_summary_button = tk.Button(button_frame, text="View Summary", command=view_summary)
 view_summary_button.grid(row=0, column=2, padx=10, pady=5)
 
+search_button = tk.Button(button_frame, text="Search Expenses", command=search_expenses)
+search_button.grid(row=0, column=3, padx=10, pady=5)
+
 export_excel_button = tk.Button(button_frame, text="Export to Excel", command=export_to_excel)
 export_excel_button.grid(row=1, column=0, padx=10, pady=5)
 
@@ -264,6 +845,24 @@ export_text_button.grid(row=1, column=1, padx=10, pady=5)
 export_db_button = tk.Button(button_frame, text="Export to SQLite", command=export_to_database)
 export_db_button.grid(row=1, column=2, padx=10, pady=5)
 
+export_as_button = tk.Button(button_frame, text="Export As...", command=export_as)
+export_as_button.grid(row=1, column=3, padx=10, pady=5)
+
+cancel_exports_button = tk.Button(button_frame, text="Cancel Exports", command=cancel_exports, state=tk.DISABLED)
+cancel_exports_button.grid(row=2, column=0, padx=10, pady=5)
+
+export_status_label = tk.Label(button_frame, text="", anchor="w")
+export_status_label.grid(row=2, column=1, columnspan=2, padx=10, pady=5, sticky="we")
+
+save_status_label = tk.Label(button_frame, text="All changes saved", anchor="w")
+save_status_label.grid(row=3, column=0, columnspan=3, padx=10, pady=5, sticky="we")
+
+main_window.protocol("WM_DELETE_WINDOW", on_close)
+main_window.after(EXPORT_POLL_MS, poll_export_events)
+if expense_storage.CONCURRENT:
+    main_window.after(SHARED_POLL_MS, poll_shared_ledger)
+if TIMING:
+    main_window.after_idle(report_startup_timing)
 main_window.mainloop()
 
 
@@ -281,10 +880,14 @@ main_window.mainloop()
 # Launch the application by running the Python script.
 # In the input section, enter the amount spent, description of the expense, date (in the format YYYY-MM-DD), and select a #category from the dropdown menu.
 # Click the "Add Expense" button to add the expense to the list.
+# Browsing Expenses:
+# 
+# The expense list only draws the rows currently on screen, so it opens instantly on large ledgers.
+# Use the scrollbar, the mouse wheel, the arrow keys or Page Up/Page Down to move through it.
 # Editing Expenses:
 # 
 # To edit an existing expense, select it from the expense list.
-# Click the "Edit Expense" button to open a new window where you can edit the expense details.
+# Click the "Edit Expense" button to open a new window, pre-filled with the expense details, where you can edit them.
 # After editing, click the "Submit" button to save the changes.
 # Deleting Expenses:
 # 
@@ -299,7 +902,31 @@ main_window.mainloop()
 # To export expenses to Excel, click the "Export to Excel" button.
 # To export expenses to a text file, click the "Export to Text" button.
 # To export expenses to an SQLite database, click the "Export to SQLite" button.
+# To pick the file, click "Export As..." and enter a name ending in .csv, .jsonl, .xlsx or .db; add .gz, .bz2 or .xz to compress a CSV or JSON Lines export.
+# The same window can limit the export to one category and a date range.
 # After exporting, a message will appear confirming the successful export.
+# Measuring Performance:
+# 
+# Start the application with --metrics (or EXPENSE_METRICS=1) to record load, save, summary, search and export timings.
+# They are merged into expenses.metrics.json when the window closes; --profile <function> (e.g. --profile excel_export_job) also writes a cProfile capture to expenses.<function>.prof.
+# Sharing the Ledger:
+# 
+# Set EXPENSE_CONCURRENT=1 to run several copies of the application (or the command line tracker) on the same expenses.json.
+# Changes are then saved straight away under a lock on expenses.lock, and each window picks up the others' changes every few seconds.
+# If someone else changed the same field of an expense you are editing, you are told its new value and can submit again.
+# Budgets:
+# 
+# Budget rules in budgets.json (see the notes at the end of expense_tracker_advanced.py) are checked whenever an expense is added or edited.
+# A warning pops up when a budget passes its warning level, and again for each expense added to a budget that is already over.
+# Currencies:
+# 
+# Pick the currency an expense was paid in from the Currency menu, which lists USD and every currency in rates.csv
+# (see the notes at the end of expense_tracker_advanced.py). The summary, budgets and exports are in USD; exports
+# also show each expense's own amount and currency.
+# Monthly Storage:
+# 
+# With STORAGE_MODE = "monthly" in expense_storage.py each month is kept in its own file under expenses.months/.
+# Only the months shown in the expense list are read, and a new expense is placed at the end of its month.
 # Category Selection:
 # 
 # When inputting or editing expenses, select a category from the dropdown menu.
@@ -311,7 +938,8 @@ main_window.mainloop()
 # 
 # Data Structures:
 # 
-# The main data structure used is a list (expense_data) to store expense entries. Each entry is a dictionary containing the #amount, description, date, and category of the expense.
+# The main data structure used is a ledger (expense_data) to store expense entries. Each entry is a dictionary containing the #amount, description, date, and category of the expense, plus a persistent id.
+# Edits and deletes find the selected expense by its id through the ledger's id index, so they do not depend on list positions.
 # Categories are stored as a set (categories), allowing for easy addition, removal, and selection.
 # Algorithms:
 # 
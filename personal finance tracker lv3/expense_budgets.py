@@ -0,0 +1,145 @@
+import json
+import os
+from datetime import date
+
+import expense_currency
+import expense_dates
+
+# Budget rules read from BUDGET_FILE and checked against running per-period totals as expenses are added or edited
+#
+# BUDGET_FILE looks like
+#   {"budgets": [{"category": "food", "period": "month", "limit": 400},
+#                {"period": "week", "limit": 250, "warn_at": 0.9}]}
+# A rule without a category covers all spending. Limits are in expense_currency.BASE_CURRENCY, and warn_at is the
+# share of the limit at which a warning is given before the limit itself is passed.
+
+BUDGET_FILE = "budgets.json"
+PERIODS = ("day", "week", "month", "year")
+WARN_AT = 0.8
+# ISO week keys by day, since weeks are the only period that needs the date parsed
+week_keys = {}
+
+
+def load_rules(path=BUDGET_FILE):
+    """Read and check the budget rules in path; no file means no budgets. Raises ValueError for an invalid rule."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        config = json.load(file)
+    if not isinstance(config, dict) or not isinstance(config.get("budgets", []), list):
+        raise ValueError(f"{path} must hold an object with a \"budgets\" list")
+    rules = []
+    for number, rule in enumerate(config.get("budgets", []), 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f"budget {number} in {path} is not an object")
+        period = rule.get("period", "month")
+        if period not in PERIODS:
+            raise ValueError(f"budget {number} in {path} has period {period!r}, expected one of {', '.join(PERIODS)}")
+        category = rule.get("category")
+        if category is not None and (not isinstance(category, str) or not category):
+            raise ValueError(f"budget {number} in {path} has an invalid category")
+        limit = rule.get("limit")
+        if isinstance(limit, bool) or not isinstance(limit, (int, float)) or not limit > 0:
+            raise ValueError(f"budget {number} in {path} needs a positive limit")
+        warn_at = rule.get("warn_at", WARN_AT)
+        if isinstance(warn_at, bool) or not isinstance(warn_at, (int, float)) or not 0 < warn_at <= 1:
+            raise ValueError(f"budget {number} in {path} needs a warn_at between 0 and 1")
+        rules.append({"category": category, "period": period, "limit": float(limit), "warn_at": float(warn_at)})
+    return rules
+
+
+def period_key(period, day):
+    """Return the period a YYYY-MM-DD day falls in: the day itself, "YYYY-Www", "YYYY-MM" or "YYYY"."""
+    if period == "day":
+        return day
+    if period == "month":
+        return day[:7]
+    if period == "year":
+        return day[:4]
+    key = week_keys.get(day)
+    if key is None:
+        year, week, weekday = date.fromisoformat(day).isocalendar()
+        key = week_keys[day] = f"{year}-W{week:02d}"
+    return key
+
+
+def has_valid_date(expense):
+    """Return True if the expense's date is a YYYY-MM-DD date."""
+    # An expense_record.Expense with a day ordinal is already known to hold a valid date
+    return bool(getattr(expense, "day", 0)) or expense_dates.is_iso_date(expense["date"])
+
+
+def covers(rule, expense):
+    """Return True if the rule counts the expense's category."""
+    return rule["category"] is None or rule["category"] == expense["category"]
+
+
+class BudgetTracker:
+    """Running spending totals for the periods and categories the budget rules cover.
+
+    Totals are in the base currency and keyed by (period, period key,
+    category), with category None for rules covering all spending. An add,
+    edit or delete updates one total per distinct (period, category) the
+    rules use, and checking a rule after it is a dict lookup, so nothing is
+    rescanned per expense.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.tracked = list(dict.fromkeys((rule["period"], rule["category"]) for rule in rules))
+        self.totals = {}
+
+    @classmethod
+    def from_expenses(cls, rules, expenses):
+        """Build the totals with one pass over the expenses, or none if there are no rules."""
+        tracker = cls(rules)
+        if tracker.tracked:
+            for expense in expenses:
+                tracker.update(expense, 1)
+        return tracker
+
+    def update(self, expense, sign):
+        """Add (sign=1) or remove (sign=-1) an expense from the totals."""
+        if not self.tracked or not has_valid_date(expense):
+            return
+        day = expense["date"]
+        amount = expense_currency.base_amount(expense)
+        for period, category in self.tracked:
+            if category is None or category == expense["category"]:
+                key = (period, period_key(period, day), category)
+                self.totals[key] = self.totals.get(key, 0.0) + sign * amount
+
+    def spent(self, rule, key):
+        """Total the rule counts in the period with this key."""
+        return self.totals.get((rule["period"], key, rule["category"]), 0.0)
+
+    def alerts(self, old_expense, new_expense):
+        """Return messages for the rules that an add (old_expense None) or edit, already applied with
+        update(), took past their warning level or their limit."""
+        if new_expense is None or not self.rules or not has_valid_date(new_expense):
+            return []
+        messages = []
+        for rule in self.rules:
+            if not covers(rule, new_expense):
+                continue
+            key = period_key(rule["period"], new_expense["date"])
+            after = self.spent(rule, key)
+            before = after - expense_currency.base_amount(new_expense)
+            if old_expense is not None and covers(rule, old_expense) and has_valid_date(old_expense) and \
+                    period_key(rule["period"], old_expense["date"]) == key:
+                before += expense_currency.base_amount(old_expense)
+            if after <= before:
+                continue
+            name = f"{rule['category'].capitalize()} budget" if rule["category"] is not None else "Budget"
+            if after > rule["limit"]:
+                messages.append(f"{name} for {key} exceeded: ${after:.2f} spent of ${rule['limit']:.2f}.")
+            elif after >= rule["warn_at"] * rule["limit"] > before:
+                messages.append(f"{name} for {key} is {after / rule['limit']:.0%} used: "
+                                f"${after:.2f} spent of ${rule['limit']:.2f}.")
+        return messages
+
+    def status(self, today):
+        """Return (rule, period key, spent) for every rule, for the periods that include today (a date)."""
+        day = today.isoformat()
+        return [(rule, period_key(rule["period"], day), self.spent(rule, period_key(rule["period"], day)))
+                for rule in self.rules]
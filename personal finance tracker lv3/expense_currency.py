@@ -0,0 +1,211 @@
+import bisect
+import csv
+import itertools
+import os
+
+# Exchange rates for expenses booked in other currencies
+#
+# An expense may carry a "currency" (an ISO code such as "EUR"); one without it is in BASE_CURRENCY. RATE_FILE
+# is a CSV table of daily rates with a header row:
+#   date,currency,rate
+#   2024-05-02,EUR,1.0712
+# where rate is the number of BASE_CURRENCY units one unit of the currency was worth that day. Summaries, budgets
+# and exports are reported in BASE_CURRENCY.
+
+BASE_CURRENCY = "USD"
+RATE_FILE = "rates.csv"
+# Expenses converted at a time by base_amounts() when converting a stream
+CONVERT_CHUNK_SIZE = 4096
+# The rate table, read from RATE_FILE on first use
+rate_table = None
+
+
+def file_signature(path):
+    """Return [size, mtime_ns] of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class RateTable:
+    """Daily rates into BASE_CURRENCY by currency.
+
+    A day without a rate of its own (a weekend or holiday) uses the latest
+    earlier one, and days before a currency's first rate use that first
+    rate. Lookups are memoized by (currency, day), since a ledger holds the
+    same few pairs over and over. A currency with no rates at all converts
+    at 0, leaving its expenses out of the totals instead of failing them,
+    and is added to missing so that commands can warn about it.
+    """
+
+    def __init__(self, rates, signature=None):
+        # currency -> sorted days with a rate, and the rates on those days
+        self.days = {}
+        self.rates = {}
+        for currency, by_day in rates.items():
+            self.days[currency] = sorted(by_day)
+            self.rates[currency] = [by_day[day] for day in self.days[currency]]
+        # RATE_FILE signature the rates were read at, so totals converted with them can be told apart
+        self.signature = signature
+        self.memo = {}
+        # Currencies looked up without any rates
+        self.missing = set()
+
+    @classmethod
+    def load(cls, path=RATE_FILE):
+        """Read a rate file; no file means an empty table. Raises ValueError for an invalid row."""
+        signature = file_signature(path)
+        rates = {}
+        if signature is not None:
+            with open(path, 'r', newline='', encoding='utf-8') as file:
+                for line, row in enumerate(csv.DictReader(file), 2):
+                    try:
+                        day = row["date"].strip()
+                        currency = row["currency"].strip().upper()
+                        rate = float(row["rate"])
+                    except (AttributeError, KeyError, TypeError, ValueError):
+                        raise ValueError(f"{path} line {line}: expected date, currency and rate")
+                    if not currency or not rate > 0:
+                        raise ValueError(f"{path} line {line}: expected a currency and a positive rate")
+                    rates.setdefault(currency, {})[day] = rate
+        return cls(rates, signature)
+
+    def has_currency(self, currency):
+        """Return True if expenses in currency can be converted."""
+        return currency == BASE_CURRENCY or currency in self.days
+
+    def currencies(self):
+        """Return BASE_CURRENCY followed by the other currencies in the table."""
+        return [BASE_CURRENCY] + sorted(currency for currency in self.days if currency != BASE_CURRENCY)
+
+    def rate(self, currency, day):
+        """Return the rate of currency into BASE_CURRENCY on day, or 0 if there are no rates for it."""
+        key = (currency, day)
+        rate = self.memo.get(key)
+        if rate is None:
+            if currency == BASE_CURRENCY:
+                rate = 1.0
+            else:
+                days = self.days.get(currency)
+                if days is None:
+                    self.missing.add(currency)
+                    rate = 0.0
+                else:
+                    rate = self.rates[currency][max(bisect.bisect_right(days, day) - 1, 0)]
+            self.memo[key] = rate
+        return rate
+
+
+def get_rate_table():
+    """Return the rate table, reading RATE_FILE on first use."""
+    global rate_table
+    if rate_table is None:
+        rate_table = RateTable.load()
+    return rate_table
+
+
+def rates_signature():
+    """Identify the rates converted totals are based on, or None when there is no rate file.
+
+    The currencies found without rates so far are part of it, so totals saved
+    by a process that left some expenses out are recomputed, and warned about,
+    by the next one rather than reused.
+    """
+    if rate_table is None and not os.path.exists(RATE_FILE):
+        return None
+    table = get_rate_table()
+    if table.missing:
+        return [table.signature, sorted(table.missing)]
+    return table.signature
+
+
+def missing_rates_warning():
+    """Return a warning naming the currencies left out of converted totals for lack of rates, or None."""
+    if rate_table is None or not rate_table.missing:
+        return None
+    return (f"Expenses in {', '.join(sorted(rate_table.missing))} are left out of the {BASE_CURRENCY} totals: "
+            f"{RATE_FILE} has no rates for them.")
+
+
+def has_rates(expense):
+    """Return True if the expense can be converted to BASE_CURRENCY."""
+    return get_rate_table().has_currency(currency_of(expense))
+
+
+def parse_currency(value):
+    """Return the "currency" field for a currency code typed in or imported, or None for the base currency.
+
+    Raises ValueError if the rate table has no rates for the currency.
+    """
+    currency = str(value or "").strip().upper()
+    if currency in ("", BASE_CURRENCY):
+        return None
+    if not get_rate_table().has_currency(currency):
+        raise ValueError(f"unknown currency {currency!r}: {RATE_FILE} has no rates for it")
+    return currency
+
+
+def currency_field(expense):
+    """Return the "currency" field of an expense, or None if it has none."""
+    if type(expense) is dict:
+        return expense.get("currency")
+    # An expense_record.Expense keeps the field in its extras; reading it there skips Mapping.get's KeyError
+    extras = getattr(expense, "extras", False)
+    if extras is not False:
+        return extras.get("currency") if extras else None
+    return expense.get("currency")
+
+
+def currency_of(expense):
+    """Return the currency an expense is booked in."""
+    return currency_field(expense) or BASE_CURRENCY
+
+
+def base_amount(expense):
+    """Return the amount of one expense in BASE_CURRENCY."""
+    currency = currency_field(expense)
+    if currency is None or currency == BASE_CURRENCY:
+        return expense["amount"]
+    return expense["amount"] * get_rate_table().rate(currency, expense["date"])
+
+
+def base_amounts(expenses):
+    """Return the amounts of a list of expenses in BASE_CURRENCY.
+
+    Expenses in the base currency are taken as they are, and the others read
+    their rate straight from the table's memo, so a (currency, day) pair is
+    only looked up in the rates the first time it is seen.
+    """
+    table = None
+    amounts = []
+    for expense in expenses:
+        currency = currency_field(expense)
+        if currency is None or currency == BASE_CURRENCY:
+            amounts.append(expense["amount"])
+            continue
+        if table is None:
+            table = get_rate_table()
+            memo = table.memo
+        day = expense["date"]
+        rate = memo.get((currency, day))
+        if rate is None:
+            rate = table.rate(currency, day)
+        amounts.append(expense["amount"] * rate)
+    return amounts
+
+
+def chunks(expenses, size=CONVERT_CHUNK_SIZE):
+    """Split an iterable of expenses into lists of up to size, so a stream can be converted a chunk at a time."""
+    iterator = iter(expenses)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def converted(expenses):
+    """Yield (expense, amount in BASE_CURRENCY) for an iterable of expenses, converting a chunk at a time."""
+    for chunk in chunks(expenses):
+        yield from zip(chunk, base_amounts(chunk))
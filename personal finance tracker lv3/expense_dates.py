@@ -0,0 +1,82 @@
+import bisect
+from datetime import date
+
+import expense_currency
+
+# Date index with daily and monthly rollups for range totals without scanning every expense
+
+
+def is_iso_date(value):
+    """Return True if value is a YYYY-MM-DD date string."""
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+
+class DateIndex:
+    """Sorted index of expense days with cached daily and monthly [total, count] rollups, in the base currency."""
+
+    def __init__(self):
+        self.days = []
+        self.months = []
+        self.daily = {}
+        self.monthly = {}
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        """Build an index over a list of expense dicts."""
+        index = cls()
+        for expense in expenses:
+            index.update(expense, 1)
+        return index
+
+    def update(self, expense, sign):
+        """Add (sign=1) or remove (sign=-1) an expense from the rollups."""
+        day = expense["date"]
+        # An expense_record.Expense with a day ordinal is already known to hold a valid date
+        if not getattr(expense, "day", 0) and not is_iso_date(day):
+            return
+        amount = expense_currency.base_amount(expense)
+        for key, buckets, keys in ((day, self.daily, self.days), (day[:7], self.monthly, self.months)):
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0.0, 0]
+                bisect.insort(keys, key)
+            bucket[0] += sign * amount
+            bucket[1] += sign
+            if bucket[1] == 0:
+                del buckets[key]
+                del keys[bisect.bisect_left(keys, key)]
+
+    def sum_days(self, start, end):
+        """Total of the daily buckets from start to end inclusive."""
+        first = bisect.bisect_left(self.days, start)
+        last = bisect.bisect_right(self.days, end)
+        return sum(self.daily[day][0] for day in self.days[first:last])
+
+    def range_total(self, start, end):
+        """Total spent from start to end inclusive (YYYY-MM-DD strings).
+
+        Whole months inside the window come from the monthly rollups and only
+        the partial months at either edge are summed from daily buckets.
+        """
+        if start > end:
+            return 0.0
+        start_month, end_month = start[:7], end[:7]
+        if start_month == end_month:
+            return self.sum_days(start, end)
+
+        total = self.sum_days(start, start_month + "-31") + self.sum_days(end_month + "-01", end)
+        first = bisect.bisect_right(self.months, start_month)
+        last = bisect.bisect_left(self.months, end_month)
+        total += sum(self.monthly[month][0] for month in self.months[first:last])
+        return total
+
+    def month_to_date(self, today):
+        """Total spent from the first of today's month up to today."""
+        return self.range_total(today.replace(day=1).isoformat(), today.isoformat())
+
+    def last_days(self, today, days):
+        """Total spent in the given number of days ending today."""
+        return self.range_total(date.fromordinal(today.toordinal() - days + 1).isoformat(), today.isoformat())
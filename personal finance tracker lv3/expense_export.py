@@ -0,0 +1,254 @@
+# Shared export engine for expense_tracker_advanced.py and Personal_finance_tracker.py
+#
+# Expenses are filtered and turned into rows by generators, and a sink picked by the output file's
+# extension streams them to disk: CSV, JSON Lines, Excel or SQLite, with CSV and JSON Lines optionally
+# compressed. Only the row being written is built at a time, and every export goes to a temporary
+# file that replaces the target once it is complete.
+import csv
+import io
+import json
+import os
+import threading
+
+import expense_currency
+import expense_metrics
+
+# Excel's hard limit on rows per worksheet, header row included
+EXCEL_MAX_ROWS = 1048576
+# How often long exports report progress, in rows
+PROGRESS_EVERY = 10000
+# Rows per executemany call in the SQLite sink
+SQLITE_BATCH_SIZE = 10000
+# Text sinks write through a buffer of this many bytes instead of one system call per line
+WRITE_BUFFER_SIZE = 1 << 20
+# Columns computed for each expense rather than read from it: its currency (expense_currency.BASE_CURRENCY
+# when it has none) and its amount converted to the base currency
+COMPUTED_COLUMNS = ("currency", "base_amount")
+# Output formats and compressions recognised from the file name, e.g. expenses.csv.gz
+FORMATS = {".csv": "csv", ".txt": "csv", ".jsonl": "jsonl", ".xlsx": "xlsx", ".db": "sqlite", ".sqlite": "sqlite"}
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+class RowCounter:
+    """Iterate over rows, counting them and calling progress(rows so far) every PROGRESS_EVERY rows.
+
+    progress may raise to abort the export; done is where the count starts.
+    """
+
+    def __init__(self, rows, progress=None, done=0):
+        self.rows = rows
+        self.progress = progress
+        self.count = done
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            if self.progress is not None and self.count % PROGRESS_EVERY == 0:
+                self.progress(self.count)
+            yield row
+
+
+def filter_expenses(expenses, category=None, start=None, end=None):
+    """Yield the expenses in the given category (case-insensitive) and inclusive YYYY-MM-DD range."""
+    if category is not None:
+        category = category.lower()
+    for expense in expenses:
+        if category is not None and expense["category"].lower() != category:
+            continue
+        if start is not None and expense["date"] < start:
+            continue
+        if end is not None and expense["date"] > end:
+            continue
+        yield expense
+
+
+def expense_rows(expenses, columns):
+    """Yield one row per expense with the values of columns.
+
+    A base_amount column is converted a chunk of expenses at a time through
+    the rate table's memo, and left empty for expenses in a currency without
+    rates.
+    """
+    if not any(column in COMPUTED_COLUMNS for column in columns):
+        for expense in expenses:
+            yield [expense[column] for column in columns]
+        return
+    for chunk in expense_currency.chunks(expenses):
+        amounts = expense_currency.base_amounts(chunk) if "base_amount" in columns else [None] * len(chunk)
+        for expense, amount in zip(chunk, amounts):
+            row = []
+            for column in columns:
+                if column == "base_amount":
+                    row.append(amount if amount or expense_currency.has_rates(expense) else None)
+                elif column == "currency":
+                    row.append(expense_currency.currency_of(expense))
+                else:
+                    row.append(expense[column])
+            yield row
+
+
+def output_format(path):
+    """Return (format, compression or None) for an output file name, raising ValueError if unsupported."""
+    root, extension = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression is not None:
+        root, extension = os.path.splitext(root)
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot export to {path}: use one of {', '.join(FORMATS)}")
+    file_format = FORMATS[extension]
+    if compression is not None and file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Cannot export to {path}: only CSV and JSON Lines exports can be compressed")
+    return file_format, compression
+
+
+def open_text_output(path, compression):
+    """Open path for buffered UTF-8 text output, through a compressor if one is given."""
+    if compression is None:
+        return open(path, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+    # Compressors are imported on first use, at levels chosen for speed since exports are re-read rather than archived
+    if compression == "gzip":
+        import gzip
+        binary = gzip.open(path, 'wb', compresslevel=6)
+    elif compression == "bz2":
+        import bz2
+        binary = bz2.open(path, 'wb')
+    else:
+        import lzma
+        binary = lzma.open(path, 'wb', preset=1)
+    return io.TextIOWrapper(io.BufferedWriter(binary, WRITE_BUFFER_SIZE), encoding='utf-8', newline='')
+
+
+def write_csv(rows, path, headers, columns, compression=None):
+    """Write rows as CSV, quoting fields that contain commas, quotes or line breaks."""
+    with open_text_output(path, compression) as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def write_jsonl(rows, path, headers, columns, compression=None):
+    """Write one JSON object per row keyed by the expense field names, so the file can be imported again."""
+    with open_text_output(path, compression) as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(columns, row))) + "\n")
+
+
+def write_sqlite(rows, path, headers, columns, compression=None):
+    """Write rows into a new SQLite database with an expenses table, committing once."""
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(f"CREATE TABLE expenses (id INTEGER PRIMARY KEY, {', '.join(columns)})")
+            insert_sql = f"INSERT INTO expenses ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= SQLITE_BATCH_SIZE:
+                    conn.executemany(insert_sql, batch)
+                    batch = []
+            conn.executemany(insert_sql, batch)
+    finally:
+        conn.close()
+
+
+def sheet_title(title):
+    """Return a worksheet title Excel will accept."""
+    for char in "[]:*?/\\":
+        title = title.replace(char, "-")
+    return title[:31]
+
+
+def write_sheets(workbook, title, rows, headers):
+    """Stream rows into worksheets, starting a new one whenever the row limit is reached."""
+    sheet = workbook.create_sheet(sheet_title(title))
+    sheet.append(headers)
+    written = 1
+    part = 1
+    for row in rows:
+        if written >= EXCEL_MAX_ROWS:
+            part += 1
+            sheet = workbook.create_sheet(sheet_title(f"{title} ({part})"))
+            sheet.append(headers)
+            written = 1
+        sheet.append(row)
+        written += 1
+
+
+def write_excel(expenses, path, headers, columns, title="Expenses", split_by_month=True, progress=None):
+    """Export expenses through a write-only workbook so rows are streamed to disk.
+
+    When a list of expenses does not fit on one sheet and split_by_month is
+    set, each month gets its own sheet; otherwise, and for any other
+    iterable, the rows overflow into numbered sheets. progress, if given, is
+    called with the number of rows written so far and may raise to abort the
+    export. Returns the number of rows written.
+    """
+    # openpyxl takes a few hundred milliseconds to import, so only exports pay for it
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    if split_by_month and isinstance(expenses, list) and len(expenses) >= EXCEL_MAX_ROWS:
+        months = {}
+        for expense in expenses:
+            months.setdefault(expense["date"][:7], []).append(expense)
+        groups = [(month, months[month]) for month in sorted(months)]
+    else:
+        groups = [(title, expenses)]
+
+    done = 0
+    try:
+        for group_title, group in groups:
+            rows = RowCounter(expense_rows(group, columns), progress, done)
+            write_sheets(workbook, group_title, rows, headers)
+            done = rows.count
+    except BaseException:
+        # Finish the sheets streamed so far so their temp files close cleanly; path is left untouched
+        for sheet in workbook.worksheets:
+            sheet.close()
+        raise
+    workbook.save(path)
+    return done
+
+
+# Streaming sinks by format, called as sink(rows, path, headers, columns, compression)
+SINKS = {"csv": write_csv, "jsonl": write_jsonl, "sqlite": write_sqlite}
+
+
+def export_expenses(expenses, path, headers, columns, category=None, start=None, end=None, progress=None):
+    """Stream the expenses matching the optional filters to path and return how many were written.
+
+    The format and compression come from the file name (see output_format).
+    The export is written to a .part file next to path, named after the
+    process and thread so concurrent exports never share one, and moved over
+    path only once it is complete; a failed or cancelled export leaves any
+    previous file as it was. progress is called as rows are written and may
+    raise to abort.
+    """
+    file_format, compression = output_format(path)
+    selected = expenses
+    if category is not None or start is not None or end is not None:
+        selected = filter_expenses(expenses, category, start, end)
+
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with expense_metrics.timed("export." + file_format) as timer:
+            if file_format == "xlsx":
+                done = write_excel(selected, temp_file, headers, columns, progress=progress)
+            else:
+                # SQLite would open a leftover file instead of starting a new database
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                rows = RowCounter(expense_rows(selected, columns), progress)
+                SINKS[file_format](rows, temp_file, headers, columns, compression)
+                done = rows.count
+            os.replace(temp_file, path)
+            timer.rows = done
+            timer.bytes_written = expense_metrics.file_size(path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    if progress is not None:
+        progress(done)
+    return done
@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+import time
+from datetime import date, datetime
+import expense_currency
+import expense_dates
+import expense_metrics
+import expense_storage
+
+# Streaming bulk import of CSV, JSON Lines and the app's own xlsx exports
+
+IMPORT_BATCH_SIZE = 10000
+FIELDS = ("date", "amount", "description", "category")
+
+
+def read_csv_rows(path):
+    """Yield (line number, row dict) from a CSV file with a header row."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_jsonl_rows(path):
+    """Yield (line number, row dict) from a JSON Lines file."""
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {"error": line.rstrip("\n")}
+            yield line_number, row
+
+
+def read_xlsx_rows(path):
+    """Yield (row number, row dict) from every sheet of a workbook using openpyxl's read-only mode."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            headers = next(rows, None)
+            if headers is None:
+                continue
+            headers = [str(header) if header is not None else "" for header in headers]
+            for row_number, values in enumerate(rows, 2):
+                yield f"{sheet.title}:{row_number}", dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """Pick a row reader from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return read_csv_rows(path)
+    if extension in (".jsonl", ".ndjson"):
+        return read_jsonl_rows(path)
+    if extension == ".xlsx":
+        return read_xlsx_rows(path)
+    raise ValueError(f"Unsupported import file type: {extension}")
+
+
+def normalize_row(row, categories):
+    """Turn a raw row into an expense dict, raising ValueError with the reason if it is invalid."""
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    fields = {str(key).strip().lower(): value for key, value in row.items()}
+    missing = [field for field in FIELDS if fields.get(field) in (None, "")]
+    if missing:
+        raise ValueError("missing " + ", ".join(missing))
+
+    expense_date = fields["date"]
+    if isinstance(expense_date, (datetime, date)):
+        expense_date = expense_date.strftime('%Y-%m-%d')
+    expense_date = str(expense_date).strip()
+    if not expense_dates.is_iso_date(expense_date):
+        raise ValueError(f"invalid date {expense_date!r}")
+
+    amount = fields["amount"]
+    if isinstance(amount, str):
+        amount = amount.strip().replace("$", "").replace(",", "")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid amount {fields['amount']!r}")
+
+    category = str(fields["category"]).strip().lower()
+    if category not in categories:
+        raise ValueError(f"unknown category {category!r}")
+
+    expense = {
+        "date": expense_date,
+        "amount": amount,
+        "description": str(fields["description"]).strip(),
+        "category": category
+    }
+    # An optional currency column; blank or the base currency leaves the field out
+    currency = expense_currency.parse_currency(fields.get("currency"))
+    if currency is not None:
+        expense["currency"] = currency
+    return expense
+
+
+def import_expenses(path, expense_data, categories, batch_size=IMPORT_BATCH_SIZE):
+    """Stream rows from path into expense_data, committing once per batch.
+
+    Rejected rows are written to <path>.rejected.csv, replacing the one an
+    earlier import of path left; with no rejected rows there is none. Returns
+    (imported, rejected, seconds, rejected_file or None).
+    """
+    allowed = {category.lower() for category in categories}
+    rejected_file = path + ".rejected.csv"
+    # Removed up front, so a file left by an earlier import is never taken for this one's rejects
+    if os.path.exists(rejected_file):
+        os.remove(rejected_file)
+    rejected_writer = None
+    rejected_handle = None
+    imported = 0
+    rejected = 0
+    batch = []
+    start = time.perf_counter()
+    try:
+        for location, row in read_rows(path):
+            try:
+                batch.append(normalize_row(row, allowed))
+            except ValueError as error:
+                if rejected_writer is None:
+                    rejected_handle = open(rejected_file, 'w', newline='', encoding='utf-8')
+                    rejected_writer = csv.writer(rejected_handle)
+                    rejected_writer.writerow(["location", "reason", "row"])
+                rejected_writer.writerow([location, str(error), json.dumps(row, default=str)])
+                rejected += 1
+                continue
+            if len(batch) >= batch_size:
+                expense_storage.store_add_many(expense_data, batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            expense_storage.store_add_many(expense_data, batch)
+            imported += len(batch)
+    finally:
+        if rejected_handle is not None:
+            rejected_handle.close()
+        expense_metrics.record("import", (time.perf_counter() - start) * 1000, imported + rejected,
+                               expense_metrics.file_size(path))
+        expense_metrics.increment("import.rejected", rejected)
+    return imported, rejected, time.perf_counter() - start, rejected_file if rejected else None
@@ -0,0 +1,146 @@
+import bisect
+
+# In-memory ledger that addresses expenses by a persistent id instead of by list position
+
+# Tombstones are compacted away once there are more than this many and they outnumber a quarter of the live rows
+COMPACT_MIN_TOMBSTONES = 1024
+
+
+def has_usable_id(expense, taken=()):
+    """Return True if the expense has a positive integer id that is not in taken."""
+    expense_id = expense.get("id")
+    return type(expense_id) is int and expense_id > 0 and expense_id not in taken
+
+
+class ExpenseLedger:
+    """List-like ledger of expenses with an id -> row index.
+
+    Every expense carries an integer "id" that it keeps for as long as it
+    exists. Expenses loaded without one are numbered on from the highest id
+    seen so far, in ledger order, so the numbering comes out the same on
+    every load until the ledger is saved with the ids in it. Like SQLite
+    rowids, the highest id can be handed out again once it has been deleted
+    and the ledger compacted.
+
+    get, replace and remove by id are O(1): a removed expense only leaves a
+    tombstone in its row, and the rows are compacted once tombstones make up
+    a fair fraction of them. Iteration, len() and positional reads skip
+    tombstones, so the ledger still reads like the list of expenses it wraps.
+    rows is a list or an expense_table.ExpenseTable.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = [] if rows is None else rows
+        self.positions = {}
+        # Sorted row numbers of removed expenses
+        self.dead = []
+        self.next_id = 1
+        for row, expense in enumerate(self.rows):
+            if not has_usable_id(expense, self.positions):
+                expense["id"] = self.next_id
+                if self.rows[row] is not expense:
+                    # ExpenseTable rows are copies, so a newly assigned id has to be written back
+                    self.rows[row] = expense
+            self.positions[expense["id"]] = row
+            self.next_id = max(self.next_id, expense["id"] + 1)
+
+    def with_rows(self, rows):
+        """Return a ledger over another row store holding the same live expenses in the same order."""
+        self.compact()
+        ledger = ExpenseLedger.__new__(ExpenseLedger)
+        ledger.rows = rows
+        ledger.positions = self.positions
+        ledger.dead = []
+        ledger.next_id = self.next_id
+        return ledger
+
+    def adopt(self, other):
+        """Take over the rows and index of another ledger, so everything holding this one sees its expenses."""
+        self.rows = other.rows
+        self.positions = other.positions
+        self.dead = other.dead
+        # Never hand out an id this ledger already gave away, even if the other one has not seen it
+        self.next_id = max(self.next_id, other.next_id)
+
+    def append(self, expense):
+        """Add an expense at the end, giving it an id if it has none (or one already in use)."""
+        if not has_usable_id(expense, self.positions):
+            expense["id"] = self.next_id
+        self.next_id = max(self.next_id, expense["id"] + 1)
+        self.positions[expense["id"]] = len(self.rows)
+        self.rows.append(expense)
+
+    def __contains__(self, expense_id):
+        return expense_id in self.positions
+
+    def get(self, expense_id, default=None):
+        """Return the expense with this id, or default."""
+        row = self.positions.get(expense_id)
+        return default if row is None else self.rows[row]
+
+    def replace(self, expense_id, expense):
+        """Put expense in place of the one with this id, keeping the id and the position; return the old one."""
+        row = self.positions[expense_id]
+        old_expense = self.rows[row]
+        expense["id"] = expense_id
+        self.rows[row] = expense
+        return old_expense
+
+    def remove(self, expense_id):
+        """Remove the expense with this id, leaving a tombstone, and return it."""
+        row = self.positions.pop(expense_id)
+        expense = self.rows[row]
+        bisect.insort(self.dead, row)
+        if len(self.dead) > max(COMPACT_MIN_TOMBSTONES, len(self) // 4):
+            self.compact()
+        return expense
+
+    def compact(self):
+        """Drop the tombstoned rows and renumber the index."""
+        if not self.dead:
+            return
+        live = list(self)
+        if isinstance(self.rows, list):
+            self.rows = live
+        else:
+            self.rows = type(self.rows).from_expenses(live)
+        self.dead = []
+        self.positions = {expense["id"]: row for row, expense in enumerate(live)}
+
+    def live_rows(self):
+        """Return the row store after compacting it, for whole-ledger queries an ExpenseTable answers itself."""
+        self.compact()
+        return self.rows
+
+    def row_of(self, position):
+        """Row number of the live expense at position."""
+        # Row numbers of tombstones minus their rank never decrease, so the tombstones before the
+        # expense can be counted with a binary search
+        dead = self.dead
+        return position + bisect.bisect_right(range(len(dead)), position, key=lambda rank: dead[rank] - rank)
+
+    def position_of(self, expense_id):
+        """Live position of the expense with this id, or None."""
+        row = self.positions.get(expense_id)
+        if row is None:
+            return None
+        return row - bisect.bisect_left(self.dead, row)
+
+    def __len__(self):
+        return len(self.rows) - len(self.dead)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("expense position out of range")
+        return self.rows[self.row_of(position)]
+
+    def __iter__(self):
+        if not self.dead:
+            yield from self.rows
+            return
+        dead = set(self.dead)
+        for row, expense in enumerate(self.rows):
+            if row not in dead:
+                yield expense
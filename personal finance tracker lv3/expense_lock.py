@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; msvcrt locks a byte range instead
+    fcntl = None
+    import msvcrt
+
+import expense_metrics
+
+# Advisory lock file shared by every tracker process that writes the same ledger
+
+# How long a writer waits for another process to release the lock before giving up, in seconds
+LOCK_TIMEOUT = 10.0
+# First and longest pause between attempts to take a busy lock, in seconds
+RETRY_DELAY = 0.001
+MAX_RETRY_DELAY = 0.05
+locks = {}
+locks_guard = threading.Lock()
+
+
+def try_lock(file):
+    """Take an exclusive lock on an open file without waiting, raising OSError if it is held elsewhere."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def unlock(file):
+    """Release the lock taken by try_lock."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Exclusive lock on a file, held across processes and re-entrant within this one.
+
+    Nested acquires by the same thread only count, so a change that compacts
+    the journal can take the lock again without deadlocking. A busy lock is
+    retried with a growing pause for up to timeout seconds, then
+    TimeoutError is raised.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.file = None
+        self.depth = 0
+        # flock belongs to the open file, not the thread, so threads of this process queue here first
+        self.thread_lock = threading.RLock()
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        self.depth += 1
+        if self.depth > 1:
+            return
+        file = open(self.path, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        delay = RETRY_DELAY
+        with expense_metrics.timed("lock.acquire"):
+            while True:
+                try:
+                    try_lock(file)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        file.close()
+                        self.depth -= 1
+                        self.thread_lock.release()
+                        raise TimeoutError(f"{self.path} is still locked by another process after {self.timeout} s")
+                    expense_metrics.increment("lock.retries")
+                    time.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+        self.file = file
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            unlock(self.file)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+def file_lock(path):
+    """Return the FileLock for path, shared by every caller in this process."""
+    path = os.path.abspath(path)
+    with locks_guard:
+        lock = locks.get(path)
+        if lock is None:
+            lock = locks[path] = FileLock(path)
+        return lock
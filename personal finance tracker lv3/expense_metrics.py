@@ -0,0 +1,159 @@
+import atexit
+import bisect
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+# Opt-in instrumentation of the hot paths: latency histograms, counters, bytes and rows per operation.
+# Turn it on with EXPENSE_METRICS=1 or --metrics; totals are merged into METRICS_FILE when the process exits.
+# EXPENSE_PROFILE=<command> (or --profile <command>) also writes a cProfile capture of that one command.
+
+ENABLED = os.environ.get("EXPENSE_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("EXPENSE_METRICS_FILE", "expenses.metrics.json")
+PROFILE_COMMAND = os.environ.get("EXPENSE_PROFILE") or None
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is open ended
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+metrics = {}
+counters = {}
+# Export workers in the GUI record from their own threads
+metrics_lock = threading.Lock()
+dump_registered = False
+
+
+class Timer:
+    """Context manager that times one operation and adds what it touched to the named metric."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, (time.perf_counter() - self.start) * 1000, self.rows, self.bytes_read,
+               self.bytes_written)
+        return False
+
+
+def enable():
+    """Turn instrumentation on and dump the metrics when the process exits."""
+    global ENABLED, dump_registered
+    ENABLED = True
+    if not dump_registered:
+        atexit.register(dump)
+        dump_registered = True
+
+
+def configure(argv):
+    """Apply --metrics and --profile <command> from the command line, returning the remaining arguments."""
+    global PROFILE_COMMAND
+    remaining = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--metrics":
+            enable()
+        elif argument == "--profile":
+            PROFILE_COMMAND = next(arguments, None)
+        elif argument.startswith("--profile="):
+            PROFILE_COMMAND = argument.split("=", 1)[1]
+        else:
+            remaining.append(argument)
+    return remaining
+
+
+def timed(name):
+    """Return a Timer for the named operation; set rows and byte counts on it inside the block."""
+    return Timer(name)
+
+
+def new_metric():
+    """Return an empty metric record."""
+    return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1),
+            "rows": 0, "bytes_read": 0, "bytes_written": 0}
+
+
+def record(name, elapsed_ms, rows=0, bytes_read=0, bytes_written=0):
+    """Add one timed operation to the named metric."""
+    if not ENABLED:
+        return
+    with metrics_lock:
+        metric = metrics.get(name)
+        if metric is None:
+            metric = metrics[name] = new_metric()
+        metric["count"] += 1
+        metric["total_ms"] += elapsed_ms
+        metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+        metric["buckets"][bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        metric["rows"] += rows
+        metric["bytes_read"] += bytes_read
+        metric["bytes_written"] += bytes_written
+
+
+def increment(name, amount=1):
+    """Add to a plain counter."""
+    if ENABLED:
+        with metrics_lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+def file_size(path):
+    """Size of a file in bytes, 0 if it does not exist."""
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def run_command(name, function, *args):
+    """Run one command, timing it and capturing a cProfile if it is the command named by PROFILE_COMMAND."""
+    with timed("command." + name):
+        if name != PROFILE_COMMAND:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            profile_file = f"expenses.{name}.prof"
+            profile.dump_stats(profile_file)
+            # On stderr, so commands that print JSON keep stdout parseable
+            print(f"Profile of {name} written to {profile_file} (view it with: python -m pstats {profile_file})",
+                  file=sys.stderr)
+
+
+def dump():
+    """Merge this process's metrics into METRICS_FILE."""
+    if not metrics and not counters:
+        return
+    stored = {"buckets_ms": list(BUCKETS_MS), "runs": 0, "metrics": {}, "counters": {}}
+    if os.path.exists(METRICS_FILE):
+        try:
+            with open(METRICS_FILE, 'r') as file:
+                stored = json.load(file)
+        except ValueError:
+            pass
+    stored["runs"] = stored.get("runs", 0) + 1
+    stored_metrics = stored.setdefault("metrics", {})
+    stored_counters = stored.setdefault("counters", {})
+    for name, metric in metrics.items():
+        total = stored_metrics.setdefault(name, new_metric())
+        for key in ("count", "total_ms", "rows", "bytes_read", "bytes_written"):
+            total[key] += metric[key]
+        total["max_ms"] = max(total["max_ms"], metric["max_ms"])
+        total["buckets"] = [a + b for a, b in zip(total["buckets"], metric["buckets"])]
+        total["mean_ms"] = total["total_ms"] / total["count"]
+    for name, value in counters.items():
+        stored_counters[name] = stored_counters.get(name, 0) + value
+    temp_file = METRICS_FILE + ".tmp"
+    with open(temp_file, 'w') as file:
+        json.dump(stored, file, indent=2, sort_keys=True)
+    os.replace(temp_file, METRICS_FILE)
+    metrics.clear()
+    counters.clear()
+
+
+if ENABLED:
+    enable()
@@ -0,0 +1,447 @@
+import json
+import os
+
+import expense_currency
+import expense_dates
+import expense_ledger
+import expense_metrics
+import expense_record
+
+# Time-partitioned ledger for expense_storage's "monthly" mode
+#
+# The partition directory holds one JSON Lines shard per month (2024-05.jsonl, one expense per line) and
+# manifest.json with each month's count, totals by category in the base currency, id range and shard size,
+# plus how many of its expenses are in another currency. Adding an expense
+# appends a line to its month's shard; editing or deleting rewrites only the shards involved. Totals,
+# monthly reports and range summaries come from the manifest, so shards are only read when their
+# expenses are: the ledger loads them one at a time, on first use.
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+SHARD_SUFFIX = ".jsonl"
+# Shard for expenses whose date is not YYYY-MM-DD; it sorts after every month
+OTHER_PARTITION = "other"
+
+
+def partition_of(expense):
+    """Return the partition (YYYY-MM, or OTHER_PARTITION) an expense belongs in."""
+    day = expense["date"]
+    # An expense_record.Expense with a day ordinal is already known to hold a valid date
+    if getattr(expense, "day", 0) or expense_dates.is_iso_date(day):
+        return day[:7]
+    return OTHER_PARTITION
+
+
+def shard_path(directory, month):
+    """Path of a month's shard."""
+    return os.path.join(directory, month + SHARD_SUFFIX)
+
+
+def new_stats():
+    """Return the manifest entry of an empty partition."""
+    return {"count": 0, "total": 0.0, "categories": {}, "min_id": None, "max_id": None, "bytes": 0, "foreign": 0}
+
+
+def update_stats(stats, expense, sign):
+    """Add (sign=1) or subtract (sign=-1) an expense from a partition's manifest entry.
+
+    The id range only ever widens, so it may cover ids that have since moved
+    to another month, but never misses one that is in the shard.
+    """
+    amount = expense_currency.base_amount(expense)
+    stats["count"] += sign
+    stats["total"] += sign * amount
+    if expense_currency.currency_of(expense) != expense_currency.BASE_CURRENCY:
+        stats["foreign"] = stats.get("foreign", 0) + sign
+    category_total = stats["categories"].setdefault(expense["category"], [0.0, 0])
+    category_total[0] += sign * amount
+    category_total[1] += sign
+    if category_total[1] == 0:
+        del stats["categories"][expense["category"]]
+    if sign > 0:
+        expense_id = expense["id"]
+        stats["min_id"] = expense_id if stats["min_id"] is None else min(stats["min_id"], expense_id)
+        stats["max_id"] = expense_id if stats["max_id"] is None else max(stats["max_id"], expense_id)
+
+
+def add_totals(result, total, count, categories):
+    """Add totals to a summary in expense_storage.compute_summary's format."""
+    result["total"] += total
+    result["count"] += count
+    for category, (category_total, category_count) in categories.items():
+        summed = result["categories"].setdefault(category, [0.0, 0])
+        summed[0] += category_total
+        summed[1] += category_count
+
+
+def encode_lines(expenses):
+    """Encode expenses as JSON Lines."""
+    return "".join(json.dumps(expense, default=expense_record.json_default) + "\n" for expense in expenses)
+
+
+def write_atomic(path, text):
+    """Write text to a temporary file and move it over path."""
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, 'w') as file:
+        file.write(text)
+    os.replace(temp_file, path)
+
+
+def read_shard(path, records=False):
+    """Read the expenses of one shard, as expense_record records if records is set."""
+    with expense_metrics.timed("partition.load") as timer:
+        with open(path, 'r') as file:
+            lines = [line for line in file.read().split("\n") if line.strip()]
+        try:
+            # One parse of the joined lines is much faster than a json.loads per line
+            expenses = json.loads("[" + ",".join(lines) + "]")
+        except ValueError:
+            # A write cut short leaves a partial line; every other line still holds a whole expense
+            expenses = []
+            for line in lines:
+                try:
+                    expenses.append(json.loads(line))
+                except ValueError:
+                    expense_metrics.increment("partition.bad_lines")
+        if records:
+            expenses = expense_record.to_records(expenses)
+        timer.rows = len(expenses)
+        timer.bytes_read = expense_metrics.file_size(path)
+    return expenses
+
+
+def read_manifest(directory):
+    """Return the manifest of a partition directory, or an empty one."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            manifest = json.load(file)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    return {"version": MANIFEST_VERSION, "next_id": 1, "partitions": {}}
+
+
+def create(directory, expense_data):
+    """Write an ExpenseLedger out as a new partition directory.
+
+    The shards and manifest are written to a temporary directory that is
+    then renamed into place, so an interrupted migration leaves nothing
+    behind and is simply run again.
+    """
+    months = {}
+    for expense in expense_data:
+        months.setdefault(partition_of(expense), []).append(expense)
+    temp_dir = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(temp_dir)
+    partitions = {}
+    with expense_metrics.timed("partition.create") as timer:
+        for month, expenses in months.items():
+            path = shard_path(temp_dir, month)
+            with open(path, 'w') as file:
+                file.write(encode_lines(expenses))
+            stats = partitions[month] = new_stats()
+            for expense in expenses:
+                update_stats(stats, expense, 1)
+            stats["bytes"] = os.path.getsize(path)
+            timer.rows += len(expenses)
+        with open(os.path.join(temp_dir, MANIFEST_FILE), 'w') as file:
+            json.dump({"version": MANIFEST_VERSION, "next_id": expense_data.next_id, "partitions": partitions,
+                       "rates": expense_currency.rates_signature()}, file)
+    os.replace(temp_dir, directory)
+
+
+def load_ledger(directory, records=False):
+    """Open the partition directory as a PartitionedLedger, reading only its manifest."""
+    os.makedirs(directory, exist_ok=True)
+    ledger = PartitionedLedger(directory, read_manifest(directory), records)
+    if ledger.verify():
+        ledger.save_manifest()
+    return ledger
+
+
+class PartitionedLedger:
+    """Ledger over monthly shards that reads each shard on first use.
+
+    It behaves like expense_ledger.ExpenseLedger (get, replace and remove by
+    id, len(), positional reads and iteration), with the expenses in month
+    order and, within a month, in the order they were added. Each loaded
+    shard is an ExpenseLedger of its own. len(), summaries and monthly
+    totals come from the manifest entries in partitions, which are kept
+    up to date as expenses change; save() writes the changes out.
+    """
+
+    def __init__(self, directory, manifest, records=False):
+        self.directory = directory
+        self.partitions = manifest["partitions"]
+        self.months = sorted(self.partitions)
+        self.next_id = manifest["next_id"]
+        # Signature of the rate file the manifest's totals were converted with
+        self.rates = manifest.get("rates")
+        self.records = records
+        # Loaded shards by month
+        self.shards = {}
+        # Months whose shard has to be rewritten rather than appended to
+        self.dirty = set()
+        self.length = sum(stats["count"] for stats in self.partitions.values())
+
+    def verify(self):
+        """Recount partitions whose shard changed without the manifest (an interrupted write), and those with
+        expenses in another currency if the rates changed; return True if any were."""
+        on_disk = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SHARD_SUFFIX):
+                on_disk[entry.name[:-len(SHARD_SUFFIX)]] = entry.stat().st_size
+        rates = expense_currency.rates_signature()
+        rates_changed = rates != self.rates
+        self.rates = rates
+        changed = rates_changed
+        for month in list(self.partitions):
+            if month not in on_disk:
+                del self.partitions[month]
+                changed = True
+        for month, size in on_disk.items():
+            stats = self.partitions.get(month)
+            intact = stats is not None and stats["bytes"] == size
+            if intact and not (rates_changed and stats.get("foreign", 0)):
+                continue
+            stats = self.partitions[month] = new_stats()
+            shard = self.shards[month] = expense_ledger.ExpenseLedger(read_shard(shard_path(self.directory, month),
+                                                                                  self.records))
+            for expense in shard:
+                update_stats(stats, expense, 1)
+                self.next_id = max(self.next_id, expense["id"] + 1)
+            stats["bytes"] = size
+            if not intact:
+                # Rewritten on the next save, so nothing is appended after a partial line
+                self.dirty.add(month)
+            changed = True
+        if changed:
+            self.months = sorted(self.partitions)
+            self.length = sum(stats["count"] for stats in self.partitions.values())
+        return changed
+
+    def shard(self, month):
+        """Return the ExpenseLedger of a month, reading its shard if it has not been read yet."""
+        shard = self.shards.get(month)
+        if shard is None:
+            path = shard_path(self.directory, month)
+            rows = read_shard(path, self.records) if os.path.exists(path) else []
+            shard = self.shards[month] = expense_ledger.ExpenseLedger(rows)
+        return shard
+
+    def adopt(self, other):
+        """Take over the state of another ledger over the same directory."""
+        self.partitions = other.partitions
+        self.months = other.months
+        self.shards = other.shards
+        self.dirty = other.dirty
+        self.length = other.length
+        # Never hand out an id this ledger already gave away, even if the other one has not seen it
+        self.next_id = max(self.next_id, other.next_id)
+
+    def month_of(self, expense_id):
+        """Return the month holding the expense with this id, or None.
+
+        Loaded shards are checked first; otherwise only the shards whose id
+        range covers the id are read.
+        """
+        for month, shard in self.shards.items():
+            if expense_id in shard:
+                return month
+        if type(expense_id) is not int:
+            return None
+        for month in self.months:
+            stats = self.partitions[month]
+            if month not in self.shards and stats["min_id"] is not None and \
+                    stats["min_id"] <= expense_id <= stats["max_id"] and expense_id in self.shard(month):
+                return month
+        return None
+
+    def add_to_partition(self, month, expense):
+        """Append an expense (with its id) to a month's shard and manifest entry."""
+        if month not in self.partitions:
+            self.partitions[month] = new_stats()
+            self.months = sorted(self.partitions)
+        self.shard(month).append(expense)
+        update_stats(self.partitions[month], expense, 1)
+        self.length += 1
+
+    def append(self, expense):
+        """Add an expense to its month, giving it an id if it has none (or one already in use)."""
+        if not expense_ledger.has_usable_id(expense) or expense["id"] in self:
+            expense["id"] = self.next_id
+        self.next_id = max(self.next_id, expense["id"] + 1)
+        self.add_to_partition(partition_of(expense), expense)
+
+    def __contains__(self, expense_id):
+        return self.month_of(expense_id) is not None
+
+    def get(self, expense_id, default=None):
+        """Return the expense with this id, or default."""
+        month = self.month_of(expense_id)
+        return default if month is None else self.shards[month].get(expense_id)
+
+    def replace(self, expense_id, expense):
+        """Put expense in place of the one with this id and return the old one.
+
+        An expense whose date moves to another month moves to the end of
+        that month's shard.
+        """
+        month = self.month_of(expense_id)
+        if month is None:
+            raise KeyError(expense_id)
+        expense["id"] = expense_id
+        new_month = partition_of(expense)
+        if new_month == month:
+            old_expense = self.shards[month].replace(expense_id, expense)
+            update_stats(self.partitions[month], old_expense, -1)
+            update_stats(self.partitions[month], expense, 1)
+        else:
+            old_expense = self.remove(expense_id)
+            self.add_to_partition(new_month, expense)
+        self.dirty.add(month)
+        self.dirty.add(new_month)
+        return old_expense
+
+    def remove(self, expense_id):
+        """Remove the expense with this id and return it."""
+        month = self.month_of(expense_id)
+        if month is None:
+            raise KeyError(expense_id)
+        expense = self.shards[month].remove(expense_id)
+        update_stats(self.partitions[month], expense, -1)
+        self.length -= 1
+        self.dirty.add(month)
+        return expense
+
+    def save(self, records):
+        """Write a batch of change records: adds are appended to their month's shard, and every
+        shard an edit or delete touched is rewritten. The manifest is saved last."""
+        appends = {}
+        for record in records:
+            if record["op"] == "add":
+                month = partition_of(record["expense"])
+                if month not in self.dirty:
+                    appends.setdefault(month, []).append(record["expense"])
+        with expense_metrics.timed("partition.write") as timer:
+            for month, expenses in appends.items():
+                path = shard_path(self.directory, month)
+                text = encode_lines(expenses)
+                with open(path, 'a') as file:
+                    file.write(text)
+                self.partitions[month]["bytes"] = os.path.getsize(path)
+                timer.rows += len(expenses)
+                timer.bytes_written += len(text)
+            for month in sorted(self.dirty):
+                path = shard_path(self.directory, month)
+                if self.partitions[month]["count"] == 0:
+                    # A month with nothing left in it loses its shard and its manifest entry
+                    if os.path.exists(path):
+                        os.remove(path)
+                    del self.partitions[month]
+                    self.shards.pop(month, None)
+                    continue
+                text = encode_lines(self.shards[month])
+                write_atomic(path, text)
+                self.partitions[month]["bytes"] = os.path.getsize(path)
+                timer.rows += self.partitions[month]["count"]
+                timer.bytes_written += len(text)
+            self.dirty.clear()
+            self.months = sorted(self.partitions)
+            self.save_manifest()
+
+    def save_manifest(self):
+        """Write the manifest."""
+        # The rates this process converted with, including any currencies it found without rates
+        self.rates = expense_currency.rates_signature()
+        write_atomic(os.path.join(self.directory, MANIFEST_FILE),
+                     json.dumps({"version": MANIFEST_VERSION, "next_id": self.next_id, "partitions": self.partitions,
+                                 "rates": self.rates}))
+
+    def summary(self, start=None, end=None):
+        """Totals in expense_storage.compute_summary's format, of everything or of the days from start to end inclusive.
+
+        Months wholly inside the range are added up from the manifest; only
+        the shards of the months at either edge of it are read. Amounts are in
+        the base currency.
+        """
+        result = {"total": 0.0, "count": 0, "categories": {}}
+        for month in self.months:
+            stats = self.partitions[month]
+            if start is None and end is None:
+                add_totals(result, stats["total"], stats["count"], stats["categories"])
+                continue
+            if month == OTHER_PARTITION or (start is not None and month < start[:7]) or \
+                    (end is not None and month > end[:7]):
+                continue
+            starts_inside = start is None or start[:7] < month or start == month + "-01"
+            ends_inside = end is None or end[:7] > month or end >= month + "-31"
+            if starts_inside and ends_inside:
+                add_totals(result, stats["total"], stats["count"], stats["categories"])
+                continue
+            for expense, amount in expense_currency.converted(self.shard(month)):
+                if (start is None or expense["date"] >= start) and (end is None or expense["date"] <= end):
+                    add_totals(result, amount, 1, {expense["category"]: (amount, 1)})
+        return result
+
+    def totals_by_month(self):
+        """Return {"YYYY-MM": total}, from the manifest."""
+        totals = {month: stats["total"] for month, stats in self.partitions.items() if month != OTHER_PARTITION}
+        if OTHER_PARTITION in self.partitions:
+            for expense, amount in expense_currency.converted(self.shard(OTHER_PARTITION)):
+                month = expense["date"][:7]
+                totals[month] = totals.get(month, 0) + amount
+        return totals
+
+    def totals_by_month_and_category(self):
+        """Return {("YYYY-MM", category): total}, from the manifest."""
+        totals = {}
+        for month, stats in self.partitions.items():
+            if month != OTHER_PARTITION:
+                for category, (total, count) in stats["categories"].items():
+                    totals[(month, category)] = total
+        if OTHER_PARTITION in self.partitions:
+            for expense, amount in expense_currency.converted(self.shard(OTHER_PARTITION)):
+                key = (expense["date"][:7], expense["category"])
+                totals[key] = totals.get(key, 0) + amount
+        return totals
+
+    def stream(self):
+        """Yield every expense, reading shards that are not loaded without keeping them."""
+        for month in list(self.months):
+            if month in self.shards:
+                yield from self.shards[month]
+            else:
+                yield from read_shard(shard_path(self.directory, month), self.records)
+
+    def compact(self):
+        """Compact the loaded shards."""
+        for shard in self.shards.values():
+            shard.compact()
+
+    def position_of(self, expense_id):
+        """Live position of the expense with this id, or None."""
+        month = self.month_of(expense_id)
+        if month is None:
+            return None
+        before = sum(self.partitions[earlier]["count"] for earlier in self.months if earlier < month)
+        return before + self.shards[month].position_of(expense_id)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("expense position out of range")
+        for month in self.months:
+            count = self.partitions[month]["count"]
+            if position < count:
+                return self.shard(month)[position]
+            position -= count
+        raise IndexError("expense position out of range")
+
+    def __iter__(self):
+        for month in list(self.months):
+            yield from self.shard(month)
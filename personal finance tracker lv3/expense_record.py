@@ -0,0 +1,194 @@
+from collections.abc import MutableMapping
+from datetime import date
+
+# Compact expense records used when expense_storage.RECORDS is enabled
+
+BASE_FIELDS = ("date", "amount", "description", "category")
+# Shared tables so every category name and every day is held once, however many expenses use it
+category_table = {}
+day_ordinals = {}
+day_strings = {}
+
+
+def intern_category(category):
+    """Return the shared copy of a category name."""
+    shared = category_table.get(category)
+    if shared is None:
+        shared = category_table[category] = category
+    return shared
+
+
+def day_ordinal(value):
+    """Return the shared ordinal of a YYYY-MM-DD string, or 0 if value is not one."""
+    ordinal = day_ordinals.get(value) if isinstance(value, str) else 0
+    if ordinal is None:
+        try:
+            parsed = date.fromisoformat(value)
+        except ValueError:
+            return 0
+        if parsed.isoformat() != value:
+            return 0
+        ordinal = day_ordinals[value] = parsed.toordinal()
+        day_strings[ordinal] = value
+    return ordinal
+
+
+def day_string(ordinal):
+    """Return the YYYY-MM-DD string of a day ordinal."""
+    string = day_strings.get(ordinal)
+    if string is None:
+        string = date.fromordinal(ordinal).isoformat()
+        day_ordinals[string] = ordinal
+        day_strings[ordinal] = string
+    return string
+
+
+def restore_expense(day, amount, description, category, expense_id, extras):
+    """Rebuild a pickled Expense, sharing its day and category with the other records."""
+    if day:
+        day = day_ordinal(day_string(day))
+    return Expense(day, amount, description, intern_category(category), expense_id, extras)
+
+
+class Expense(MutableMapping):
+    """One expense in a fixed set of slots instead of a dict.
+
+    The date is held as a day ordinal, so date logic compares integers, and
+    the category is the shared copy from category_table. The record still
+    reads and writes like the expense dicts it replaces (expense["date"] is
+    the YYYY-MM-DD string), and to_dict() gives back exactly the dict it was
+    built from. Fields other than the four base ones and "id", and dates that
+    are not YYYY-MM-DD (day is 0 then), are kept verbatim in extras.
+    """
+
+    __slots__ = ("day", "amount", "description", "category", "id", "extras")
+
+    def __init__(self, day, amount, description, category, expense_id=None, extras=None):
+        self.day = day
+        self.amount = amount
+        self.description = description
+        self.category = category
+        self.id = expense_id
+        self.extras = extras
+
+    @classmethod
+    def from_dict(cls, expense):
+        """Build a record from an expense dict."""
+        day = day_ordinal(expense["date"])
+        expense_id = expense.get("id")
+        extras = None
+        if len(expense) > (4 if expense_id is None else 5) or not day:
+            # An explicit "id": None stays in extras so it survives the round trip
+            extras = {key: value for key, value in expense.items()
+                      if key not in BASE_FIELDS and (key != "id" or expense_id is None)}
+            if not day:
+                extras["date"] = expense["date"]
+            extras = extras or None
+        return cls(day, expense["amount"], expense["description"], intern_category(expense["category"]),
+                   expense_id, extras)
+
+    @property
+    def date(self):
+        """The date as stored in the JSON format."""
+        return day_string(self.day) if self.day else self.extras["date"]
+
+    def to_dict(self):
+        """Return the expense as a dict in the JSON format."""
+        expense = {"date": self.date, "amount": self.amount, "description": self.description,
+                   "category": self.category}
+        if self.id is not None:
+            expense["id"] = self.id
+        if self.extras:
+            for key, value in self.extras.items():
+                if key != "date":
+                    expense[key] = value
+        return expense
+
+    def __getitem__(self, key):
+        if key == "date":
+            return self.date
+        if key == "amount":
+            return self.amount
+        if key == "description":
+            return self.description
+        if key == "category":
+            return self.category
+        if key == "id" and self.id is not None:
+            return self.id
+        if self.extras is not None and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "date":
+            self.day = day_ordinal(value)
+            if self.day:
+                if self.extras is not None:
+                    self.extras.pop("date", None)
+            else:
+                if self.extras is None:
+                    self.extras = {}
+                self.extras["date"] = value
+        elif key == "amount":
+            self.amount = value
+        elif key == "description":
+            self.description = value
+        elif key == "category":
+            self.category = intern_category(value)
+        elif key == "id":
+            self.id = value
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[key] = value
+
+    def __delitem__(self, key):
+        if key == "id" and self.id is not None:
+            self.id = None
+        elif key not in BASE_FIELDS and self.extras is not None and key in self.extras:
+            del self.extras[key]
+        elif key in BASE_FIELDS:
+            raise TypeError(f"an expense always has a {key}")
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        yield from BASE_FIELDS
+        if self.id is not None:
+            yield "id"
+        if self.extras:
+            for key in self.extras:
+                if key != "date":
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Expense({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return restore_expense, (self.day, self.amount, self.description, self.category, self.id, self.extras)
+
+
+def json_default(value):
+    """json.dumps hook that writes Expense records in the JSON format."""
+    if isinstance(value, Expense):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_records(expenses):
+    """Convert a list of expense dicts to Expense records."""
+    records = []
+    append = records.append
+    for expense in expenses:
+        # Plain four-field expenses on a day and in a category seen before skip from_dict's checks
+        if type(expense) is dict and len(expense) == 4:
+            day = day_ordinals.get(expense["date"])
+            category = category_table.get(expense["category"])
+            if day is not None and category is not None:
+                append(Expense(day, expense["amount"], expense["description"], category))
+                continue
+        append(expense if isinstance(expense, Expense) else Expense.from_dict(expense))
+    return records
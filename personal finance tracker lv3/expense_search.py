@@ -0,0 +1,200 @@
+import bisect
+import re
+
+import expense_currency
+
+# Inverted index over expense descriptions for prefix and multi-term search
+
+# Letters and digits, split the same way as SQLite FTS5's default unicode61 tokenizer
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+SEARCH_LIMIT = 100
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def expense_key(expense):
+    """Return the fields of an expense the index keeps: date, amount, description, category and currency."""
+    return (expense["date"], expense["amount"], expense["description"], expense["category"],
+            expense_currency.currency_field(expense))
+
+
+def matches_filters(key, category, start, end):
+    """Check an expense key against the optional category and date range filters."""
+    if category is not None and key[3].lower() != category:
+        return False
+    if start is not None and key[0] < start:
+        return False
+    if end is not None and key[0] > end:
+        return False
+    return True
+
+
+class SearchIndex:
+    """Inverted index from description tokens to the ids of the expenses that contain them.
+
+    Expenses are indexed by id, the way the ledger addresses them, so a hit
+    can be edited or deleted and edits and deletes are applied without
+    knowing list positions. Each token's postings are split by month so date
+    filters skip whole months, and tokens are kept sorted, which turns a
+    prefix query into a bisect range.
+    """
+
+    def __init__(self):
+        # token -> {"YYYY-MM": set of expense ids}
+        self.postings = {}
+        # token -> number of expenses containing it
+        self.sizes = {}
+        self.tokens = []
+        # expense id -> expense_key() of the expense
+        self.keys = {}
+        # "YYYY-MM" -> set of the ids of the expenses in that month
+        self.months = {}
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        """Build an index over an iterable of expenses that have ids."""
+        index = cls()
+        for expense in expenses:
+            index.add(expense)
+        # Sorting once is far cheaper than inserting each new token in order
+        index.tokens = sorted(index.postings)
+        return index
+
+    def add(self, expense):
+        """Record an expense under its month and description tokens, returning the tokens seen for the first time."""
+        expense_id = expense["id"]
+        key = self.keys[expense_id] = expense_key(expense)
+        month = key[0][:7]
+        self.months.setdefault(month, set()).add(expense_id)
+        new_tokens = []
+        for token in set(tokenize(key[2])):
+            months = self.postings.get(token)
+            if months is None:
+                months = self.postings[token] = {}
+                self.sizes[token] = 0
+                new_tokens.append(token)
+            months.setdefault(month, set()).add(expense_id)
+            self.sizes[token] += 1
+        return new_tokens
+
+    def update(self, expense, sign):
+        """Add (sign=1) or remove (sign=-1) an expense from the index."""
+        if sign > 0:
+            if expense["id"] in self.keys:
+                self.update(expense, -1)
+            for token in self.add(expense):
+                bisect.insort(self.tokens, token)
+            return
+
+        expense_id = expense["id"]
+        key = self.keys.pop(expense_id, None)
+        if key is None:
+            return
+        month = key[0][:7]
+        self.months[month].discard(expense_id)
+        if not self.months[month]:
+            del self.months[month]
+        for token in set(tokenize(key[2])):
+            months = self.postings[token]
+            months[month].discard(expense_id)
+            if not months[month]:
+                del months[month]
+            self.sizes[token] -= 1
+            if not months:
+                del self.postings[token]
+                del self.sizes[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def prefix_tokens(self, prefix):
+        """Return the indexed tokens that start with prefix."""
+        first = bisect.bisect_left(self.tokens, prefix)
+        last = bisect.bisect_left(self.tokens, prefix + "\U0010ffff")
+        return self.tokens[first:last]
+
+    def month_ids(self, tokens, month):
+        """Return the ids filed under month for any of tokens."""
+        if len(tokens) == 1:
+            return self.postings[tokens[0]].get(month, set())
+        return set().union(*(self.postings[token].get(month, ()) for token in tokens))
+
+    def newest_first(self, ids):
+        """Return ids sorted newest expense first."""
+        keys = self.keys
+        return sorted(ids, key=lambda expense_id: keys[expense_id][0], reverse=True)
+
+    def search(self, query, category=None, start=None, end=None, limit=SEARCH_LIMIT):
+        """Return up to limit expenses matching every query term as a word prefix, newest first.
+
+        category matches case-insensitively and start/end are inclusive
+        YYYY-MM-DD bounds; any of them may be None. Expenses come back as
+        dicts with their id. Months are walked newest first, skipping those
+        outside the date range, until limit expenses are found. With query
+        terms the rarest one supplies the candidates of each month; terms
+        matching only a few tokens are intersected with them as sets and
+        broader prefixes are checked per candidate, so the cost follows the
+        smallest posting lists rather than the size of the ledger.
+        """
+        terms = tokenize(query)
+        if category is not None:
+            category = category.lower()
+        first_month = start[:7] if start is not None else None
+        last_month = end[:7] if end is not None else None
+        months = [month for month in sorted(self.months, reverse=True)
+                  if (first_month is None or month >= first_month) and (last_month is None or month <= last_month)]
+
+        if terms:
+            term_tokens = [self.prefix_tokens(term) for term in terms]
+            sizes = [sum(self.sizes[token] for token in tokens) for tokens in term_tokens]
+            rarest = sizes.index(min(sizes))
+            others = [(term, tokens) for position, (term, tokens) in enumerate(zip(terms, term_tokens))
+                      if position != rarest]
+            narrow = [tokens for term, tokens in others if len(tokens) <= 16]
+            broad = [term for term, tokens in others if len(tokens) > 16]
+            # Newest month first and newest day first within it, so the limit keeps the latest matches
+            candidates = (expense_id for month in months
+                          for expense_id in self.newest_first(self.intersect_month(term_tokens[rarest], narrow,
+                                                                                   month)))
+        else:
+            broad = []
+            candidates = (expense_id for month in months for expense_id in self.newest_first(self.months[month]))
+
+        results = []
+        for expense_id in candidates:
+            key = self.keys[expense_id]
+            if not matches_filters(key, category, start, end):
+                continue
+            if broad:
+                words = tokenize(key[2])
+                if not all(any(word.startswith(term) for word in words) for term in broad):
+                    continue
+            expense = {"id": expense_id, "date": key[0], "amount": key[1], "description": key[2],
+                       "category": key[3]}
+            if key[4] is not None:
+                expense["currency"] = key[4]
+            results.append(expense)
+            if len(results) >= limit:
+                break
+        return results
+
+    def intersect_month(self, tokens, narrow, month):
+        """Yield the ids of month containing one of tokens and a token from every list in narrow."""
+        narrow_ids = None
+        seen = set() if len(tokens) > 1 else None
+        for token in tokens:
+            ids = self.postings[token].get(month)
+            if not ids:
+                continue
+            if narrow:
+                if narrow_ids is None:
+                    narrow_ids = [self.month_ids(other_tokens, month) for other_tokens in narrow]
+                for other_ids in narrow_ids:
+                    ids = ids & other_ids
+            for expense_id in ids:
+                if seen is not None:
+                    if expense_id in seen:
+                        continue
+                    seen.add(expense_id)
+                yield expense_id
@@ -0,0 +1,625 @@
+# Local HTTP/JSON service over the tracker, started with: python expense_tracker_advanced.py serve
+#
+# A small HTTP/1.1 server on asyncio streams (standard library only) with keep-alive connections:
+#   GET  /summary                     total, count, average and per-category totals
+#   GET  /expenses                    a page of expenses: ?category=&from=&to=&offset=&limit=
+#   POST /expenses                    add one expense (a JSON object) or a batch (a JSON array of them)
+#                                     in one of the tracker's categories, with an optional "currency" that
+#                                     has rates in expense_currency.RATE_FILE
+#   GET  /export                      download an export: ?format=csv|jsonl|xlsx|db (csv.gz etc.) plus the filters
+# Every storage call runs on a worker thread from a StoragePool, so the event loop only moves bytes and
+# hundreds of clients can be connected at once. ExpenseClient is a matching client for scripts and load tests.
+import asyncio
+import itertools
+import json
+import math
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+
+import expense_currency
+import expense_dates
+import expense_export
+import expense_metrics
+import expense_record
+import expense_storage
+
+HOST = "127.0.0.1"
+PORT = 8765
+# Read connections (and reader threads) in the storage pool
+POOL_SIZE = 4
+# Pending connections the listening socket queues before refusing new ones
+BACKLOG = 1024
+# Largest request head and body accepted, in bytes
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1 << 20
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 30.0
+LIST_LIMIT = 100
+MAX_LIST_LIMIT = 1000
+MAX_ADD_BATCH = 1000
+# Export downloads are sent in chunks of this many bytes
+SEND_CHUNK_SIZE = 1 << 16
+# With a ledger shared between processes (expense_storage.CONCURRENT), how often to pick up their changes
+REFRESH_INTERVAL = 2.0
+EXPORT_HEADERS = ["Date", "Description", "Amount", "Currency", f"Amount ({expense_currency.BASE_CURRENCY})",
+                  "Category"]
+EXPORT_COLUMNS = ["date", "description", "amount", "currency", "base_amount", "category"]
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson",
+                 "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                 "sqlite": "application/vnd.sqlite3"}
+
+
+class HttpError(Exception):
+    """A request that is answered with an error status and a JSON {"error": message} body."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Request:
+    """One parsed HTTP request."""
+
+    def __init__(self, method, path, query, headers, body, keep_alive):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+class Response:
+    """A reply: a body in memory, or an export file that is streamed and then removed with its directory."""
+
+    def __init__(self, status, body=b"", content_type="application/json", headers=None, file=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.file = file
+
+
+def json_bytes(value):
+    """Encode a response body, writing Expense records as plain objects."""
+    return json.dumps(value, default=expense_record.json_default).encode()
+
+
+def json_response(status, value, headers=None):
+    """Return a Response with value as its JSON body."""
+    return Response(status, json_bytes(value), headers=headers)
+
+
+async def read_request(reader):
+    """Read one request from a connection, returning None if the client closed it between requests."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if error.partial.strip():
+            raise HttpError(400, "Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "Request head too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise HttpError(400, "Malformed request line")
+    method, target, version = parts
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, separator, value = line.partition(":")
+            if not separator:
+                raise HttpError(400, "Malformed header")
+            headers[name.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        raise HttpError(501, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    url = urllib.parse.urlsplit(target)
+    query = dict(urllib.parse.parse_qsl(url.query))
+    return Request(method, url.path, query, headers, body, keep_alive)
+
+
+async def send_response(writer, response, keep_alive):
+    """Write a response, streaming an export file in chunks so a slow client never holds it all in memory."""
+    length = os.path.getsize(response.file) if response.file is not None else len(response.body)
+    head = [f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {length}",
+            "Connection: keep-alive" if keep_alive else "Connection: close"]
+    head.extend(f"{name}: {value}" for name, value in response.headers.items())
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    if response.file is None:
+        writer.write(response.body)
+        await writer.drain()
+        return
+    try:
+        with open(response.file, 'rb') as file:
+            while True:
+                chunk = file.read(SEND_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+    finally:
+        shutil.rmtree(os.path.dirname(response.file), ignore_errors=True)
+
+
+def query_date(request, name):
+    """Return an optional YYYY-MM-DD query parameter."""
+    value = request.query.get(name) or None
+    if value is not None and not expense_dates.is_iso_date(value):
+        raise HttpError(400, f"{name} must be a date in YYYY-MM-DD format")
+    return value
+
+
+def query_int(request, name, default, highest):
+    """Return an optional integer query parameter between 0 and highest."""
+    value = request.query.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a whole number")
+    if not 0 <= number <= highest:
+        raise HttpError(400, f"{name} must be between 0 and {highest}")
+    return number
+
+
+def parse_expense(data, categories):
+    """Validate one expense from a request body and return it as a new expense dict.
+
+    The category is matched case-insensitively against categories and stored in lowercase, as the CLI does.
+    """
+    if not isinstance(data, dict):
+        raise HttpError(400, "Each expense must be a JSON object")
+    amount = data.get("amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        raise HttpError(400, "amount must be a number")
+    for field in ("description", "category"):
+        if not isinstance(data.get(field), str) or not data[field].strip():
+            raise HttpError(400, f"{field} must be a non-empty string")
+    category = data["category"].strip().lower()
+    if category not in categories:
+        raise HttpError(400, f"unknown category {category!r}; expected one of {', '.join(sorted(categories))}")
+    date = data.get("date") or datetime.now().strftime("%Y-%m-%d")
+    if not expense_dates.is_iso_date(date):
+        raise HttpError(400, "date must be in YYYY-MM-DD format")
+    if data.get("currency") is not None and not isinstance(data["currency"], str):
+        raise HttpError(400, "currency must be a currency code")
+    try:
+        currency = expense_currency.parse_currency(data.get("currency"))
+    except ValueError as error:
+        raise HttpError(400, str(error))
+    expense = {"date": date, "amount": float(amount), "description": data["description"], "category": category}
+    if currency is not None:
+        expense["currency"] = currency
+    return expense
+
+
+def summary_body(expense_data):
+    """Encode the summary in the shape of `expense_tracker_advanced.py summary`."""
+    total, count, categories = expense_storage.summarize(expense_data)
+    body = {"total": total, "count": count, "average": total / count if count > 0 else 0.0,
+            "currency": expense_currency.BASE_CURRENCY, "categories": categories}
+    warning = expense_currency.missing_rates_warning()
+    if warning is not None:
+        body["warning"] = warning
+    return json_bytes(body)
+
+
+def ledger_categories(expense_data):
+    """Return the categories the ledger's expenses are in, from the per-category totals."""
+    return expense_storage.summarize(expense_data)[2].keys()
+
+
+def add_expenses(expense_data, expenses):
+    """Store new expenses and return them as stored, ids included."""
+    if len(expenses) == 1:
+        return [expense_storage.store_add(expense_data, expenses[0])]
+    return expense_storage.store_add_many(expense_data, expenses)
+
+
+def open_read_connection():
+    """Open a read-only connection to the SQLite store for the pool."""
+    import sqlite3
+    path = urllib.parse.quote(os.path.abspath(expense_storage.STORE_DB_FILE))
+    # Each connection is used by one reader thread at a time, but not always the same one
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def sqlite_page(connection, category, start, end, offset, limit):
+    """Return a page of expenses straight from the SQLite store."""
+    sql = expense_storage.SEARCH_ALL_SQL
+    parameters = []
+    if category is not None:
+        sql += " AND lower(e.category) = ?"
+        parameters.append(category.lower())
+    if start is not None:
+        sql += " AND e.date >= ?"
+        parameters.append(start)
+    if end is not None:
+        sql += " AND e.date <= ?"
+        parameters.append(end)
+    sql += " ORDER BY e.id LIMIT ? OFFSET ?"
+    parameters.extend((limit, offset))
+    return [expense_storage.sqlite_expense(row) for row in connection.execute(sql, parameters)]
+
+
+def page_body(expenses, offset, limit):
+    """Encode a page of expenses."""
+    return json_bytes({"expenses": expenses, "offset": offset, "limit": limit})
+
+
+def ledger_page(expense_data, offset, limit):
+    """Return a page of the whole in-memory ledger by position, without copying the rest of it."""
+    return [expense_data[position] for position in range(offset, min(offset + limit, len(expense_data)))]
+
+
+def ledger_snapshot(expense_data):
+    """Return a list of the live expenses for reader threads to filter or export."""
+    return list(expense_storage.row_store(expense_data))
+
+
+def read_page(connection, snapshot, category, start, end, offset, limit):
+    """Encode a filtered page of expenses from the SQLite store, or from a snapshot of the in-memory ledger."""
+    if connection is not None:
+        expenses = sqlite_page(connection, category, start, end, offset, limit)
+    else:
+        expenses = list(itertools.islice(expense_export.filter_expenses(snapshot, category, start, end),
+                                         offset, offset + limit))
+    return page_body(expenses, offset, limit)
+
+
+def export_file(connection, snapshot, extension, category, start, end):
+    """Export to a file in a new temporary directory and return (path, rows written)."""
+    if connection is not None:
+        expenses = (expense_storage.sqlite_expense(row) for row in connection.execute(expense_storage.SELECT_ALL_SQL))
+    else:
+        expenses = snapshot
+    directory = tempfile.mkdtemp(prefix="expense-export-")
+    path = os.path.join(directory, "expenses." + extension)
+    try:
+        count = expense_export.export_expenses(expenses, path, EXPORT_HEADERS, EXPORT_COLUMNS, category, start, end)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return path, count
+
+
+class StoragePool:
+    """Storage access for request handlers, kept off the event loop.
+
+    expense_storage holds one ledger (and in SQLite mode one connection) per
+    process and is not thread-safe, so every call into it runs in turn on a
+    single storage thread. Filtered listing and exporting instead borrow one
+    of size read connections and run on a reader thread: with the SQLite
+    store each is its own read-only connection, so those queries run side by
+    side under WAL; with the JSON ledger they read a snapshot of it. Requests
+    that find every connection taken wait for one in the event loop.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="expense-storage")
+        self.readers = ThreadPoolExecutor(max_workers=size, thread_name_prefix="expense-reader")
+        self.connections = None
+
+    async def open(self):
+        """Create the read connections; call once the ledger has been loaded."""
+        self.connections = asyncio.Queue()
+        for _ in range(self.size):
+            connection = None
+            if expense_storage.STORAGE_MODE == "sqlite":
+                connection = await self.call(open_read_connection)
+            self.connections.put_nowait(connection)
+
+    async def call(self, function, *args):
+        """Run function(*args) on the storage thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.storage, function, *args)
+
+    async def read(self, function, *args):
+        """Run function(connection, *args) on a reader thread with a connection borrowed from the pool."""
+        loop = asyncio.get_running_loop()
+        if self.connections.empty():
+            expense_metrics.increment("http.pool_waits")
+        connection = await self.connections.get()
+        future = self.readers.submit(function, connection, *args)
+        # Returned when the work is done, not when the request is, so a client that disconnects
+        # never frees a connection another thread is still using
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.connections.put_nowait, connection))
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """Close the read connections and stop the threads."""
+        self.readers.shutdown()
+        while self.connections is not None and not self.connections.empty():
+            connection = self.connections.get_nowait()
+            if connection is not None:
+                connection.close()
+        self.storage.shutdown()
+
+
+class ExpenseService:
+    """The request handlers and the state they share: the ledger, the storage pool and the response caches."""
+
+    def __init__(self, pool_size=POOL_SIZE, categories=()):
+        self.pool = StoragePool(pool_size)
+        self.expense_data = None
+        # Categories POST /expenses accepts: the tracker's own and, once loaded, those already in the ledger
+        self.categories = {category.lower() for category in categories}
+        # Changes made through this service; with expense_storage.merged_changes, the version cached results are for
+        self.writes = 0
+        # {name: (version, task)}; requests that miss the cache together share one task
+        self.cache = {}
+        self.refresh_task = None
+        self.routes = {
+            "/summary": {"GET": self.get_summary},
+            "/expenses": {"GET": self.list_expenses, "POST": self.add_expenses},
+            "/export": {"GET": self.export},
+        }
+
+    async def start(self):
+        """Load the ledger and open the pool."""
+        self.expense_data = await self.pool.call(expense_storage.load_expenses)
+        self.categories.update(await self.pool.call(ledger_categories, self.expense_data))
+        await self.pool.open()
+        if expense_storage.CONCURRENT:
+            self.refresh_task = asyncio.create_task(self.refresh_periodically())
+
+    async def close(self):
+        """Flush the ledger and release the pool."""
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+        if self.expense_data is not None:
+            await self.pool.call(expense_storage.close_storage, self.expense_data)
+        self.pool.close()
+
+    async def refresh_periodically(self):
+        """Pick up changes other processes make to a shared ledger."""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await self.pool.call(expense_storage.refresh_expenses, self.expense_data)
+            except TimeoutError:
+                # Another process is holding the lock; try again next time
+                pass
+
+    def version(self):
+        """Changes since startup, from this service and (in CONCURRENT mode) from other processes."""
+        return self.writes, expense_storage.merged_changes
+
+    async def cached(self, name, function, *args):
+        """Return function(*args) run on the storage thread, reusing the result until the ledger changes."""
+        version = self.version()
+        entry = self.cache.get(name)
+        if entry is None or entry[0] != version:
+            expense_metrics.increment(f"http.cache_misses.{name}")
+            entry = self.cache[name] = (version, asyncio.ensure_future(self.pool.call(function, *args)))
+        try:
+            # Shielded so one client going away does not cancel the result others are waiting for
+            return await asyncio.shield(entry[1])
+        except Exception:
+            if self.cache.get(name) is entry:
+                del self.cache[name]
+            raise
+
+    async def snapshot(self):
+        """A list of the live expenses at the current version, for reader threads to work on."""
+        if expense_storage.STORAGE_MODE == "sqlite":
+            return None
+        return await self.cached("snapshot", ledger_snapshot, self.expense_data)
+
+    async def get_summary(self, request):
+        body = await self.cached("summary", summary_body, self.expense_data)
+        return Response(200, body)
+
+    async def list_expenses(self, request):
+        category = request.query.get("category") or None
+        start = query_date(request, "from")
+        end = query_date(request, "to")
+        offset = query_int(request, "offset", 0, sys.maxsize)
+        limit = query_int(request, "limit", LIST_LIMIT, MAX_LIST_LIMIT)
+        if expense_storage.STORAGE_MODE != "sqlite" and category is None and start is None and end is None:
+            # A page of the whole ledger is read from it by position; only filtered pages need a snapshot
+            expenses = await self.pool.call(ledger_page, self.expense_data, offset, limit)
+            return Response(200, page_body(expenses, offset, limit))
+        snapshot = await self.snapshot()
+        body = await self.pool.read(read_page, snapshot, category, start, end, offset, limit)
+        return Response(200, body)
+
+    async def add_expenses(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            raise HttpError(400, "The body must be JSON")
+        if isinstance(data, list):
+            if not data or len(data) > MAX_ADD_BATCH:
+                raise HttpError(400, f"Add between 1 and {MAX_ADD_BATCH} expenses at a time")
+            expenses = [parse_expense(item, self.categories) for item in data]
+        else:
+            expenses = [parse_expense(data, self.categories)]
+        try:
+            stored = await self.pool.call(add_expenses, self.expense_data, expenses)
+        finally:
+            # Counted even if the write failed part way, since the ledger may have changed
+            self.writes += 1
+        if isinstance(data, list):
+            return json_response(201, {"expenses": stored})
+        return json_response(201, {"expense": stored[0]})
+
+    async def export(self, request):
+        extension = request.query.get("format") or "csv"
+        try:
+            file_format, compression = expense_export.output_format("expenses." + extension)
+        except ValueError as error:
+            raise HttpError(400, str(error))
+        category = request.query.get("category") or None
+        start = query_date(request, "from")
+        end = query_date(request, "to")
+        snapshot = await self.snapshot()
+        path, count = await self.pool.read(export_file, snapshot, extension, category, start, end)
+        content_type = "application/octet-stream" if compression else CONTENT_TYPES[file_format]
+        return Response(200, content_type=content_type, file=path, headers={
+            "Content-Disposition": f'attachment; filename="{os.path.basename(path)}"',
+            "X-Exported-Rows": count})
+
+    async def dispatch(self, request):
+        """Route a request to its handler and turn failures into error responses."""
+        methods = self.routes.get(request.path)
+        if methods is None:
+            return json_response(404, {"error": f"No such endpoint: {request.path}"})
+        handler = methods.get(request.method)
+        if handler is None:
+            return json_response(405, {"error": f"{request.method} is not allowed on {request.path}"},
+                                 {"Allow": ", ".join(methods)})
+        try:
+            with expense_metrics.timed(f"http.{request.method} {request.path}"):
+                return await handler(request)
+        except HttpError as error:
+            return json_response(error.status, {"error": str(error)}, error.headers)
+        except TimeoutError:
+            # The lock on a shared ledger stayed busy (expense_storage.CONCURRENT)
+            return json_response(503, {"error": "The ledger is busy, try again"}, {"Retry-After": 1})
+        except Exception as error:
+            print(f"{request.method} {request.path} failed: {error!r}", file=sys.stderr)
+            return json_response(500, {"error": "Internal server error"})
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it or asks to."""
+        expense_metrics.increment("http.connections")
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HttpError as error:
+                    await send_response(writer, json_response(error.status, {"error": str(error)}), False)
+                    break
+                if request is None:
+                    break
+                response = await self.dispatch(request)
+                await send_response(writer, response, request.keep_alive)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def run_server(host=HOST, port=PORT, pool_size=POOL_SIZE, categories=()):
+    """Serve the ledger until interrupted (Ctrl+C or SIGTERM), then flush it and close the storage.
+
+    categories are the ones new expenses may be added in, besides those already in the ledger.
+    """
+    service = ExpenseService(pool_size, categories)
+    await service.start()
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, AttributeError):
+        # No signal handlers on Windows event loops; Ctrl+C still stops the server
+        pass
+    try:
+        server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                            backlog=BACKLOG)
+        async with server:
+            # Port 0 picks a free port; the address actually bound is printed for scripts to read
+            bound_host, bound_port = server.sockets[0].getsockname()[:2]
+            print(f"Serving {len(service.expense_data)} expenses on http://{bound_host}:{bound_port}/", flush=True)
+            await stopped.wait()
+    finally:
+        await service.close()
+
+
+def serve(host=HOST, port=PORT, pool_size=POOL_SIZE, categories=()):
+    """Run the service in the foreground."""
+    try:
+        asyncio.run(run_server(host, port, pool_size, categories))
+    except KeyboardInterrupt:
+        pass
+
+
+class ExpenseClient:
+    """Keep-alive client for the service; request() sends one request and returns (status, body bytes).
+
+    Used by the load test in benchmarks/benchmark_trackers.py, and handy from
+    scripts: asyncio.run(ExpenseClient().request("GET", "/summary")).
+    """
+
+    def __init__(self, host=HOST, port=PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        if self.reader is not None and self.reader.at_eof():
+            # The server has closed the idle connection; send on a new one
+            await self.close()
+        reused = self.writer is not None
+        try:
+            return await self.exchange(head.encode() + body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            # Only a GET is sent again: the server may have applied a POST before the connection dropped,
+            # and sending it twice would add the expenses twice
+            if not reused or method != "GET":
+                raise
+            return await self.exchange(head.encode() + body)
+
+    async def exchange(self, data):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.writer.write(data)
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ")[1])
+        headers = {}
+        for line in head[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.reader = None
+            self.writer = None
@@ -0,0 +1,1119 @@
+import codecs
+import contextlib
+import itertools
+import json
+import os
+import pickle
+import re
+import expense_budgets
+import expense_currency
+import expense_dates
+import expense_ledger
+import expense_lock
+import expense_metrics
+import expense_partitions
+import expense_record
+import expense_search
+
+# Shared persistence helpers for expense_tracker_advanced.py and Personal_finance_tracker.py
+
+# "journal" appends each change to JOURNAL_FILE, "json" rewrites DATA_FILE on every change,
+# "sqlite" keeps STORE_DB_FILE as the system of record, "monthly" keeps one shard per month in PARTITION_DIR
+# (see expense_partitions) and reads each one only when its expenses are needed
+STORAGE_MODE = "journal"
+DATA_FILE = "expenses.json"
+JOURNAL_FILE = "expenses.journal.jsonl"
+JOURNAL_COMPACT_THRESHOLD = 1000
+STORE_DB_FILE = "ledger.db"
+PARTITION_DIR = "expenses.months"
+# Running totals kept next to the data; VERIFY_SUMMARY re-checks them against a full recompute
+SUMMARY_FILE = "expenses.summary.json"
+VERIFY_SUMMARY = False
+# Hold expenses in a NumPy-backed ExpenseTable instead of a list of dicts (needs numpy)
+COLUMNAR = False
+# Hold each expense as a compact expense_record.Expense instead of a dict
+RECORDS = False
+# Parsed expenses pickled next to DATA_FILE so a warm start skips JSON parsing
+SNAPSHOT_CACHE = True
+SNAPSHOT_CACHE_FILE = "expenses.cache.pickle"
+SNAPSHOT_CACHE_VERSION = 1
+# Bytes read at a time when streaming DATA_FILE instead of loading it whole
+STREAM_CHUNK_SIZE = 1 << 20
+# Whitespace and the commas between array elements, skipped by the streaming reader
+STREAM_SEPARATOR = re.compile(r"[\s,]*")
+# Characters that may follow a complete array element
+STREAM_ELEMENT_END = " \t\r\n,]"
+# Hold snapshot rewrites back until flush_pending(): every change is still appended to the journal and synced to
+# disk before it returns (in "json" mode too), and only folding the journal into DATA_FILE waits
+WRITE_BEHIND = False
+# Let several processes share the JSON ledger (EXPENSE_CONCURRENT=1): every write holds LOCK_FILE, first
+# catches up with what other processes wrote and is written through at once, ignoring WRITE_BEHIND
+CONCURRENT = os.environ.get("EXPENSE_CONCURRENT", "") not in ("", "0")
+LOCK_FILE = "expenses.lock"
+journal_length = 0
+# Bytes of the journal, and the DATA_FILE signature, the in-memory ledger reflects
+journal_position = 0
+loaded_data_signature = None
+# Changes by other processes merged into the ledger so far, so views can tell when to redraw
+merged_changes = 0
+# Journal records whose append failed, retried by the next write or flush_pending()
+pending_records = []
+# Whether the last load came from the snapshot cache, and the DATA_FILE signature the cache was built from
+snapshot_cache_hit = False
+cache_data_signature = None
+connection = None
+summary = None
+date_index = None
+search_index = None
+# Running budget totals, and the BUDGET_FILE signature of the rules they were built for
+budget_tracker = None
+budget_signature = None
+# Whether the SQLite store has a full-text index; set when the connection is opened
+fts_enabled = False
+# Ids of the expenses added, edited or deleted since take_changed_ids() last ran; None until it first runs and
+# after every (re)load, when the changes are not known
+changed_ids = None
+
+# Parameterised statements are compiled once and reused from sqlite3's statement cache
+CREATE_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS expenses (
+                        id INTEGER PRIMARY KEY,
+                        date TEXT NOT NULL,
+                        amount REAL NOT NULL,
+                        description TEXT NOT NULL,
+                        category TEXT NOT NULL,
+                        currency TEXT)'''
+CREATE_DATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)"
+CREATE_CATEGORY_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category)"
+# A NULL currency is expense_currency.BASE_CURRENCY; the partial index holds only the other rows
+CREATE_CURRENCY_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_expenses_currency ON expenses (currency) WHERE currency IS NOT NULL"
+SELECT_ALL_SQL = "SELECT id, date, amount, description, category, currency FROM expenses ORDER BY id"
+INSERT_SQL = "INSERT INTO expenses (date, amount, description, category, currency) VALUES (?, ?, ?, ?, ?)"
+UPDATE_SQL = "UPDATE expenses SET date = ?, amount = ?, description = ?, category = ?, currency = ? WHERE id = ?"
+DELETE_SQL = "DELETE FROM expenses WHERE id = ?"
+SUMMARY_SQL = "SELECT category, SUM(amount), COUNT(*) FROM expenses GROUP BY category"
+# Amounts booked in a currency, by category and day, for converting category_summary's totals to the base currency
+FOREIGN_TOTALS_SQL = '''SELECT category, currency, date, SUM(amount) FROM expenses
+                        WHERE currency IS NOT NULL GROUP BY category, currency, date'''
+
+# category_summary is maintained by triggers so a summary never scans the expenses table
+CREATE_SUMMARY_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS category_summary (
+                                category TEXT PRIMARY KEY,
+                                total REAL NOT NULL,
+                                count INTEGER NOT NULL)'''
+CREATE_SUMMARY_TRIGGERS_SQL = '''
+CREATE TRIGGER IF NOT EXISTS expenses_summary_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO category_summary (category, total, count) VALUES (NEW.category, NEW.amount, 1)
+        ON CONFLICT(category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_summary_delete AFTER DELETE ON expenses BEGIN
+    UPDATE category_summary SET total = total - OLD.amount, count = count - 1 WHERE category = OLD.category;
+    DELETE FROM category_summary WHERE category = OLD.category AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_summary_update AFTER UPDATE OF amount, category ON expenses BEGIN
+    UPDATE category_summary SET total = total - OLD.amount, count = count - 1 WHERE category = OLD.category;
+    DELETE FROM category_summary WHERE category = OLD.category AND count = 0;
+    INSERT INTO category_summary (category, total, count) VALUES (NEW.category, NEW.amount, 1)
+        ON CONFLICT(category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+'''
+SELECT_SUMMARY_SQL = "SELECT category, total, count FROM category_summary"
+
+# External-content FTS5 index over descriptions, kept in step with the expenses table by triggers
+CREATE_FTS_SQL = "CREATE VIRTUAL TABLE expenses_fts USING fts5(description, content='expenses', content_rowid='id')"
+CREATE_FTS_TRIGGERS_SQL = '''
+CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+    INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+'''
+SEARCH_FTS_SQL = '''SELECT e.id, e.date, e.amount, e.description, e.category, e.currency
+                    FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid
+                    WHERE expenses_fts MATCH ?'''
+SEARCH_ALL_SQL = "SELECT id, date, amount, description, category, currency FROM expenses e WHERE 1"
+
+
+def get_connection():
+    """Open the SQLite store on first use, creating tables and indexes."""
+    global connection
+    if connection is None:
+        # Imported here so the JSON storage modes never pay for loading sqlite3
+        import sqlite3
+        connection = sqlite3.connect(STORE_DB_FILE)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.execute(CREATE_TABLE_SQL)
+            # Stores created before expenses had a currency get the column added, NULL for every existing row
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(expenses)")]
+            if "currency" not in columns:
+                connection.execute("ALTER TABLE expenses ADD COLUMN currency TEXT")
+            connection.execute(CREATE_DATE_INDEX_SQL)
+            connection.execute(CREATE_CATEGORY_INDEX_SQL)
+            connection.execute(CREATE_CURRENCY_INDEX_SQL)
+            summary_exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'category_summary'").fetchone()
+            connection.execute(CREATE_SUMMARY_TABLE_SQL)
+            if summary_exists is None:
+                connection.execute("INSERT INTO category_summary " + SUMMARY_SQL)
+        connection.executescript(CREATE_SUMMARY_TRIGGERS_SQL)
+        create_fts_index()
+        migrate_json_to_sqlite()
+    return connection
+
+
+def create_fts_index():
+    """Create the FTS5 index and its triggers if this SQLite build has FTS5."""
+    global fts_enabled
+    import sqlite3
+
+    fts_exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'expenses_fts'").fetchone()
+    try:
+        with connection:
+            if fts_exists is None:
+                connection.execute(CREATE_FTS_SQL)
+                connection.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+        connection.executescript(CREATE_FTS_TRIGGERS_SQL)
+    except sqlite3.OperationalError:
+        # Built without FTS5: searches fall back to the in-memory index
+        fts_enabled = False
+        return
+    fts_enabled = True
+
+
+def migrate_json_to_sqlite():
+    """Copy an existing JSON ledger into an empty SQLite store once."""
+    if connection.execute("SELECT 1 FROM expenses LIMIT 1").fetchone() is not None:
+        return
+    if not os.path.exists(DATA_FILE) and not os.path.exists(JOURNAL_FILE):
+        return
+
+    expense_data = load_json_expenses()
+    with connection:
+        connection.executemany(INSERT_SQL, (expense_row(expense) for expense in expense_data))
+
+
+def expense_row(expense):
+    """Return the column values of an expense in table order."""
+    return (expense["date"], expense["amount"], expense["description"], expense["category"],
+            expense_currency.currency_field(expense))
+
+
+class EditConflict(Exception):
+    """An edit changed a field that another process has since changed to something else."""
+
+    def __init__(self, expense_id, field, current):
+        super().__init__(f"Expense {expense_id} was changed by someone else: {field} is now {current[field]!r}")
+        self.field = field
+        self.current = current
+
+
+def temp_path(path):
+    """Name of the temporary file path is written to before being renamed over it, unique to this process."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def storage_lock():
+    """Return the inter-process lock on LOCK_FILE in CONCURRENT mode, or a context that does nothing."""
+    if CONCURRENT and STORAGE_MODE != "sqlite":
+        return expense_lock.file_lock(LOCK_FILE)
+    return contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def shared_write(expense_data):
+    """Hold the storage lock with the ledger caught up on other processes' writes for the length of a change."""
+    with storage_lock():
+        refresh_expenses(expense_data)
+        yield
+
+
+def refresh_expenses(expense_data):
+    """Catch the ledger up with what other processes have written since it was loaded; return True if it changed.
+
+    Journal records appended by others are replayed on top of it. If DATA_FILE
+    was rewritten (another process compacted the journal) the ledger is
+    reloaded in place instead, as it is in monthly mode whenever the manifest
+    changed. Does nothing outside CONCURRENT mode.
+    """
+    global journal_position, journal_length, merged_changes
+    if not CONCURRENT or STORAGE_MODE == "sqlite":
+        return False
+    with storage_lock():
+        if STORAGE_MODE == "monthly":
+            if file_signature(manifest_path()) == loaded_data_signature:
+                return False
+            # Reloading only rereads the manifest; shards are read again as they are used
+            expense_data.adopt(load_expenses())
+            expense_metrics.increment("concurrent.reloads")
+            merged_changes += 1
+            return True
+        journal_size = expense_metrics.file_size(JOURNAL_FILE)
+        if file_signature(DATA_FILE) != loaded_data_signature or journal_size < journal_position:
+            expense_data.adopt(load_expenses())
+            expense_metrics.increment("concurrent.reloads")
+            merged_changes += 1
+            return True
+        if journal_size == journal_position:
+            return False
+        with expense_metrics.timed("concurrent.merge") as timer:
+            with open(JOURNAL_FILE, 'rb') as file:
+                file.seek(journal_position)
+                for line in file:
+                    if line.strip():
+                        old_expense, new_expense = apply_journal_record(expense_data, json.loads(line))
+                        if old_expense is not None:
+                            update_summary(old_expense, -1)
+                        if new_expense is not None:
+                            update_summary(new_expense, 1)
+                        update_indexes(old_expense, new_expense)
+                        journal_length += 1
+                        timer.rows += 1
+                journal_position = file.tell()
+        merged_changes += timer.rows
+    return True
+
+
+def merge_edit(original, current, edited):
+    """Three-way merge of an edit made to original onto the current version of the expense.
+
+    Fields the edit left as they were keep their current value, so a change
+    another process made to a different field survives; a field the edit
+    removed (such as a currency) is removed. Raises EditConflict if both
+    changed the same field to different values.
+    """
+    merged = dict(current)
+    for key, value in edited.items():
+        if key == "id" or original.get(key) == value:
+            continue
+        if current.get(key) not in (original.get(key), value):
+            raise EditConflict(current["id"], key, current)
+        merged[key] = value
+    for key in original:
+        if key not in edited and key != "id":
+            if key in current and current[key] != original[key]:
+                raise EditConflict(current["id"], key, current)
+            merged.pop(key, None)
+    return merged
+
+
+def sqlite_expense(row):
+    """Return an expense dict from a row of SELECT_ALL_SQL."""
+    expense = {"id": row[0], "date": row[1], "amount": row[2], "description": row[3], "category": row[4]}
+    if row[5] is not None:
+        expense["currency"] = row[5]
+    return expense
+
+
+def stored_expense(expense):
+    """Return an expense in the form the in-memory ledger holds it (a record when RECORDS is set)."""
+    if RECORDS and not isinstance(expense, expense_record.Expense):
+        return expense_record.Expense.from_dict(expense)
+    return expense
+
+
+def load_expenses():
+    """Load all expenses from the configured storage backend."""
+    global date_index, search_index, budget_tracker, changed_ids
+    date_index = None
+    search_index = None
+    budget_tracker = None
+    changed_ids = None
+    if STORAGE_MODE == "sqlite":
+        conn = get_connection()
+        with expense_metrics.timed("sqlite.load") as timer:
+            expense_data = [sqlite_expense(row) for row in conn.execute(SELECT_ALL_SQL)]
+            if RECORDS:
+                expense_data = expense_record.to_records(expense_data)
+            expense_data = expense_ledger.ExpenseLedger(expense_data)
+            timer.rows = len(expense_data)
+    elif STORAGE_MODE == "monthly":
+        with storage_lock():
+            # Shards are read on first use, so there is nothing to load or convert up front
+            return load_partitioned_expenses()
+    else:
+        with storage_lock():
+            expense_data = load_json_expenses()
+    if COLUMNAR:
+        try:
+            import expense_table
+        except ImportError:
+            expense_table = None
+        if expense_table is not None:
+            expense_data = expense_data.with_rows(expense_table.ExpenseTable.from_expenses(expense_data.live_rows()))
+    return expense_data
+
+
+def load_json_expenses():
+    """Load the expense snapshot into an ExpenseLedger and replay the journal on top of it.
+
+    The snapshot comes from the pickle cache when it was built from the
+    current DATA_FILE, in which case only journal records appended since
+    the cache was written are replayed.
+    """
+    global journal_length, journal_position, loaded_data_signature, snapshot_cache_hit
+    loaded_data_signature = file_signature(DATA_FILE)
+    cached = load_snapshot_cache()
+    snapshot_cache_hit = cached is not None
+    if snapshot_cache_hit:
+        expense_data, journal_length, journal_offset = cached
+    else:
+        expense_data = []
+        if os.path.exists(DATA_FILE):
+            with expense_metrics.timed("json.parse") as timer:
+                with open(DATA_FILE, 'r') as file:
+                    expense_data = json.load(file)
+                if RECORDS:
+                    expense_data = expense_record.to_records(expense_data)
+                timer.rows = len(expense_data)
+                timer.bytes_read = expense_metrics.file_size(DATA_FILE)
+        journal_length = 0
+        journal_offset = 0
+
+    expense_data = expense_ledger.ExpenseLedger(expense_data)
+    if os.path.exists(JOURNAL_FILE):
+        with expense_metrics.timed("journal.replay") as timer:
+            with open(JOURNAL_FILE, 'rb') as file:
+                file.seek(journal_offset)
+                for line in file:
+                    if line.strip():
+                        apply_journal_record(expense_data, json.loads(line))
+                        journal_length += 1
+                        timer.rows += 1
+                timer.bytes_read = file.tell() - journal_offset
+                journal_offset = file.tell()
+    journal_position = journal_offset
+    load_summary(expense_data)
+    if not snapshot_cache_hit and SNAPSHOT_CACHE and STORAGE_MODE in ("journal", "json"):
+        save_snapshot_cache(expense_data)
+    return expense_data
+
+
+def load_partitioned_expenses():
+    """Open PARTITION_DIR as an expense_partitions.PartitionedLedger, splitting the JSON ledger into it on first use."""
+    global loaded_data_signature, summary
+    if not os.path.isdir(PARTITION_DIR) and (os.path.exists(DATA_FILE) or os.path.exists(JOURNAL_FILE)):
+        expense_metrics.increment("partition.migrations")
+        expense_partitions.create(PARTITION_DIR, load_json_expenses())
+    expense_data = expense_partitions.load_ledger(PARTITION_DIR, RECORDS)
+    loaded_data_signature = file_signature(manifest_path())
+    # Rebuilt from the manifest on first use
+    summary = None
+    return expense_data
+
+
+def manifest_path():
+    """Path of the manifest of PARTITION_DIR."""
+    return os.path.join(PARTITION_DIR, expense_partitions.MANIFEST_FILE)
+
+
+def load_snapshot_cache():
+    """Return (expenses, journal length, journal offset) from the snapshot cache, or None if it is stale."""
+    global cache_data_signature
+    if not SNAPSHOT_CACHE or not os.path.exists(SNAPSHOT_CACHE_FILE):
+        return None
+    try:
+        with expense_metrics.timed("cache.read") as timer, open(SNAPSHOT_CACHE_FILE, 'rb') as file:
+            header = pickle.load(file)
+            if header.get("version") != SNAPSHOT_CACHE_VERSION or header.get("data") != file_signature(DATA_FILE):
+                return None
+            if header.get("records", False) != RECORDS:
+                return None
+            # The journal only grows between compactions; a shorter one means it was replaced
+            journal_size = os.path.getsize(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else 0
+            if journal_size < header["journal_offset"]:
+                return None
+            expense_data = pickle.load(file)
+            timer.rows = len(expense_data)
+            timer.bytes_read = file.tell()
+    except Exception:
+        # A truncated or unreadable cache is only a miss
+        return None
+    cache_data_signature = header["data"]
+    return expense_data, header["journal_length"], header["journal_offset"]
+
+
+def save_snapshot_cache(expense_data):
+    """Pickle the expenses together with the DATA_FILE signature and journal position they reflect."""
+    global cache_data_signature
+    header = {
+        "version": SNAPSHOT_CACHE_VERSION,
+        "data": file_signature(DATA_FILE),
+        "journal_offset": journal_position,
+        "journal_length": journal_length,
+        "records": RECORDS,
+    }
+    temp_file = temp_path(SNAPSHOT_CACHE_FILE)
+    with expense_metrics.timed("cache.write") as timer:
+        with open(temp_file, 'wb') as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(list(expense_data), file, protocol=pickle.HIGHEST_PROTOCOL)
+            timer.rows = len(expense_data)
+            timer.bytes_written = file.tell()
+        os.replace(temp_file, SNAPSHOT_CACHE_FILE)
+    cache_data_signature = header["data"]
+
+
+def save_expenses(expense_data):
+    """Write the full expense snapshot to file."""
+    temp_file = temp_path(DATA_FILE)
+    with expense_metrics.timed("json.write") as timer:
+        with open(temp_file, 'w') as file:
+            # json.dumps uses the C encoder; json.dump to a file falls back to the pure Python one
+            text = json.dumps(list(expense_data), default=expense_record.json_default)
+            file.write(text)
+        os.replace(temp_file, DATA_FILE)
+        timer.rows = len(expense_data)
+        timer.bytes_written = len(text)
+
+
+def apply_journal_record(expense_data, record):
+    """Apply a single journal record to an expense ledger, returning (old expense, new expense)."""
+    if record["op"] == "add":
+        expense = stored_expense(record["expense"])
+        expense_data.append(expense)
+        return None, expense
+    # Journals written before expenses had ids address them by list position
+    expense_id = record["id"] if "id" in record else expense_data[record["index"]]["id"]
+    if record["op"] == "edit":
+        expense = stored_expense(record["expense"])
+        return expense_data.replace(expense_id, expense), expense
+    return expense_data.remove(expense_id), None
+
+
+# The canonical copy: Expense_Recorder.py (lv1) and enhanced_expense_tracker.py (lv2) are single files and
+# carry identical copies of iter_json_array, so a change here is made there too
+def iter_json_array(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the elements of the JSON array stored in path (or an open binary file) one at a time.
+
+    The file is decoded chunk by chunk and each element is parsed with
+    JSONDecoder.raw_decode as soon as it is complete, so memory use is
+    bounded by the chunk size and the largest element, not the file size.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    at_end = False
+    with open(path, 'rb') if isinstance(path, str) else path as file:
+        while True:
+            position = STREAM_SEPARATOR.match(buffer, position).end()
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path} does not hold a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Usually an element cut off by the end of the chunk; only an error once the file is exhausted
+                    if at_end:
+                        raise
+                else:
+                    # A number cut off by the end of the chunk ("12" or "12.") parses short, so an element only
+                    # counts once what follows it can follow an element
+                    if at_end or (end < len(buffer) and buffer[end] in STREAM_ELEMENT_END):
+                        position = end
+                        yield value
+                        continue
+            if at_end:
+                raise ValueError(f"{path} ends before its JSON array is closed")
+            chunk = file.read(chunk_size)
+            at_end = not chunk
+            buffer = buffer[position:] + text_decoder.decode(chunk, final=at_end)
+            position = 0
+
+
+def iter_journal_records(file, size):
+    """Yield the records in the first size bytes of an open journal file, oldest first."""
+    file.seek(0)
+    read = 0
+    for line in file:
+        read += len(line)
+        if read > size:
+            return
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_expenses():
+    """Yield every expense in ledger order without holding the whole ledger in memory.
+
+    In the JSON modes DATA_FILE is streamed and the journal read twice: once
+    to collect its edits and deleted ids, then again as its added expenses
+    stream past, so memory is bounded by the chunk size plus the edited
+    expenses. Journals written before expenses had ids, which address them
+    by position, are the exception and are replayed over the whole ledger.
+    In sqlite mode the rows come straight from a cursor and in monthly mode
+    one shard is held at a time. Changes whose journal append failed and is
+    waiting to be retried are not included.
+    """
+    if STORAGE_MODE == "sqlite":
+        for row in get_connection().execute(SELECT_ALL_SQL):
+            yield sqlite_expense(row)
+        return
+    if STORAGE_MODE == "monthly":
+        with storage_lock():
+            expense_data = load_partitioned_expenses()
+        yield from expense_data.stream()
+        return
+
+    with contextlib.ExitStack() as files:
+        # Both files are opened under the lock and the journal is read only up to its size at that moment, so
+        # together they give the ledger as of one instant even if another process appends or compacts meanwhile
+        with storage_lock():
+            data_file = files.enter_context(open(DATA_FILE, 'rb')) if os.path.exists(DATA_FILE) else None
+            journal_file = files.enter_context(open(JOURNAL_FILE, 'rb')) if os.path.exists(JOURNAL_FILE) else None
+            journal_size = os.fstat(journal_file.fileno()).st_size if journal_file is not None else 0
+        base = iter_json_array(data_file) if data_file is not None else iter(())
+        if journal_file is None:
+            yield from base
+            return
+
+        edits = {}
+        deleted = set()
+        for record in iter_journal_records(journal_file, journal_size):
+            if "index" in record:
+                # A positional record needs the whole ledger to find the expense it means
+                expense_data = expense_ledger.ExpenseLedger(list(base))
+                for record in iter_journal_records(journal_file, journal_size):
+                    apply_journal_record(expense_data, record)
+                yield from expense_data
+                return
+            if record["op"] == "edit":
+                edits[record["id"]] = record["expense"]
+            elif record["op"] == "delete":
+                deleted.add(record["id"])
+        added = (record["expense"] for record in iter_journal_records(journal_file, journal_size)
+                 if record["op"] == "add")
+        if not edits and not deleted:
+            yield from base
+            yield from added
+            return
+
+        # Only the edited expenses and deleted ids are held while the snapshot streams past; expenses without
+        # an id are numbered the way ExpenseLedger numbers them
+        next_id = 1
+        for expense in itertools.chain(base, added):
+            if not expense_ledger.has_usable_id(expense):
+                expense["id"] = next_id
+            next_id = max(next_id, expense["id"] + 1)
+            if expense["id"] not in deleted:
+                yield edits.get(expense["id"], expense)
+
+
+def stream_summary():
+    """Return the summary of the stored ledger without loading it.
+
+    The persisted summary is used when it matches the files on disk and
+    VERIFY_SUMMARY is off; otherwise the ledger is streamed through
+    compute_summary(). In monthly mode the manifest holds the totals.
+    """
+    if STORAGE_MODE == "sqlite":
+        result = {"total": 0.0, "count": 0, "categories": {}}
+        for category, total, count in get_connection().execute(SELECT_SUMMARY_SQL):
+            result["total"] += total
+            result["count"] += count
+            result["categories"][category] = [total, count]
+        return convert_sqlite_summary(get_connection(), result)
+    if STORAGE_MODE == "monthly" and not VERIFY_SUMMARY:
+        with storage_lock():
+            return load_partitioned_expenses().summary()
+    if not VERIFY_SUMMARY and os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            return stored["summary"]
+    signature = storage_signature()
+    with expense_metrics.timed("summary.stream") as timer:
+        result = compute_summary(iter_expenses())
+        timer.rows = result["count"]
+    # Persisted so the next summary of the same files is a single small read, unless another
+    # process wrote while the ledger was being streamed
+    with storage_lock():
+        if storage_signature() == signature:
+            write_summary_file(result)
+    return result
+
+
+def store_add(expense_data, expense):
+    """Append an expense, persist it and return it as stored (id included)."""
+    expense = stored_expense(expense)
+    with shared_write(expense_data):
+        if STORAGE_MODE == "sqlite":
+            expense["id"] = sqlite_write(INSERT_SQL, expense_row(expense)).lastrowid
+        else:
+            update_summary(expense, 1)
+        expense_data.append(expense)
+        update_indexes(None, expense)
+        persist_change(expense_data, {"op": "add", "expense": expense})
+    return expense
+
+
+def store_add_many(expense_data, expenses):
+    """Append a batch of expenses, persist them with a single commit or write and return them as stored."""
+    expenses = [stored_expense(expense) for expense in expenses]
+    with shared_write(expense_data):
+        if STORAGE_MODE == "sqlite":
+            conn = get_connection()
+            with expense_metrics.timed("sqlite.write_many") as timer, conn:
+                for expense in expenses:
+                    expense["id"] = conn.execute(INSERT_SQL, expense_row(expense)).lastrowid
+                timer.rows = len(expenses)
+        for expense in expenses:
+            if STORAGE_MODE != "sqlite":
+                update_summary(expense, 1)
+            expense_data.append(expense)
+            update_indexes(None, expense)
+        persist_changes(expense_data, [{"op": "add", "expense": expense} for expense in expenses])
+    return expenses
+
+
+def store_edit(expense_data, expense_id, expense, original=None):
+    """Replace the expense with this id, persist the change and return the old one, raising KeyError if there is none.
+
+    original is the expense as it was when the edit started. If given, the
+    edit is merged with changes other processes made since (see merge_edit),
+    raising EditConflict when they cannot be combined.
+    """
+    with shared_write(expense_data):
+        old_expense = expense_data.get(expense_id)
+        if old_expense is None:
+            raise KeyError(expense_id)
+        if original is not None:
+            expense = merge_edit(original, old_expense, expense)
+        expense = stored_expense(expense)
+        expense["id"] = expense_id
+        if STORAGE_MODE == "sqlite":
+            sqlite_write(UPDATE_SQL, expense_row(expense) + (expense_id,))
+        else:
+            update_summary(old_expense, -1)
+            update_summary(expense, 1)
+        update_indexes(old_expense, expense)
+        expense_data.replace(expense_id, expense)
+        persist_change(expense_data, {"op": "edit", "id": expense_id, "expense": expense})
+    return old_expense
+
+
+def store_delete(expense_data, expense_id):
+    """Remove the expense with this id and persist the change, raising KeyError if there is none."""
+    with shared_write(expense_data):
+        expense = expense_data.remove(expense_id)
+        if STORAGE_MODE == "sqlite":
+            sqlite_write(DELETE_SQL, (expense_id,))
+        else:
+            update_summary(expense, -1)
+        update_indexes(expense, None)
+        persist_change(expense_data, {"op": "delete", "id": expense_id})
+    return expense
+
+
+def update_indexes(old_expense, new_expense):
+    """Keep the in-memory indexes in step with a single add, edit or delete of an expense that has its id."""
+    for index in (date_index, search_index, budget_tracker):
+        if index is not None:
+            if old_expense is not None:
+                index.update(old_expense, -1)
+            if new_expense is not None:
+                index.update(new_expense, 1)
+    if changed_ids is not None:
+        changed_ids.add((old_expense if new_expense is None else new_expense)["id"])
+
+
+def take_changed_ids():
+    """Return the ids of the expenses changed since the last call, or None if they are not known, and start over.
+
+    The first call, and the first after the ledger was (re)loaded, returns
+    None: the caller has to treat every expense as changed.
+    """
+    global changed_ids
+    ids, changed_ids = changed_ids, set()
+    return ids
+
+
+def sqlite_write(sql, parameters):
+    """Run one write statement and commit it."""
+    conn = get_connection()
+    expense_metrics.increment("sqlite.writes")
+    with conn:
+        cursor = conn.execute(sql, parameters)
+    return cursor
+
+
+def persist_change(expense_data, record):
+    """Persist a change either as a journal record or as a full save."""
+    persist_changes(expense_data, [record])
+
+
+def persist_changes(expense_data, records):
+    """Persist a batch of changes with one journal write or one full save.
+
+    In write-behind mode the JSON modes append the records to the journal and
+    sync it, leaving the snapshot rewrite to flush_pending(). If that append
+    fails the records are kept in pending_records, which pending_count()
+    reports, and the next write or flush retries them.
+    """
+    global pending_records
+    if STORAGE_MODE == "sqlite":
+        return
+    if WRITE_BEHIND and not CONCURRENT and STORAGE_MODE in ("journal", "json"):
+        pending_records.extend(records)
+        try:
+            append_journal(pending_records, sync=True)
+        except OSError:
+            return
+        pending_records = []
+        return
+    write_changes(expense_data, records)
+
+
+def append_journal(records, sync=False):
+    """Append change records to the journal, syncing it to disk if sync is set."""
+    global journal_length, journal_position
+    with expense_metrics.timed("journal.append") as timer:
+        text = "".join(json.dumps(record, default=expense_record.json_default) + "\n" for record in records)
+        with open(JOURNAL_FILE, 'a') as file:
+            file.write(text)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        journal_position = expense_metrics.file_size(JOURNAL_FILE)
+        timer.rows = len(records)
+        timer.bytes_written = len(text)
+    journal_length += len(records)
+
+
+def journal_full(expense_data):
+    """Return True once the journal is long enough to fold back into the snapshot."""
+    # Compacting only once the journal is a fair fraction of the ledger keeps bulk imports amortized O(1)
+    return journal_length >= max(JOURNAL_COMPACT_THRESHOLD, len(expense_data) // 4)
+
+
+def write_changes(expense_data, records):
+    """Write change records to the journal or the monthly shards, or save the whole snapshot in json mode."""
+    global journal_length, journal_position, loaded_data_signature
+    if STORAGE_MODE == "monthly":
+        expense_data.save(records)
+        loaded_data_signature = file_signature(manifest_path())
+        return
+    if STORAGE_MODE != "journal":
+        compact_expenses(expense_data)
+        return
+
+    append_journal(records)
+    if journal_full(expense_data):
+        compact_expenses(expense_data)
+
+
+def pending_count():
+    """Number of changes that are not on disk yet because their journal append failed."""
+    return len(pending_records)
+
+
+def deferred_count():
+    """Number of changes in the journal whose snapshot rewrite write-behind is holding back in "json" mode."""
+    if WRITE_BEHIND and not CONCURRENT and STORAGE_MODE == "json":
+        return journal_length
+    return 0
+
+
+def flush_pending(expense_data):
+    """Retry journal appends that failed, then fold the journal into the snapshot if write-behind held that back.
+
+    If a write fails the error is raised and the changes it covered stay
+    where they were (pending or in the journal), so a later flush retries.
+    """
+    global pending_records
+    if pending_records:
+        append_journal(pending_records, sync=True)
+        pending_records = []
+    if WRITE_BEHIND and not CONCURRENT and journal_length > 0 and \
+            (STORAGE_MODE == "json" or (STORAGE_MODE == "journal" and journal_full(expense_data))):
+        expense_metrics.increment("write_behind.flushes")
+        expense_metrics.increment("write_behind.changes", journal_length)
+        compact_expenses(expense_data)
+
+
+def compact_expenses(expense_data):
+    """Fold the journal back into the snapshot file."""
+    global journal_length, journal_position, loaded_data_signature
+    expense_metrics.increment("journal.compactions")
+    save_expenses(expense_data)
+    if os.path.exists(JOURNAL_FILE):
+        os.remove(JOURNAL_FILE)
+    journal_length = 0
+    journal_position = 0
+    loaded_data_signature = file_signature(DATA_FILE)
+    save_summary()
+
+
+def row_store(expense_data):
+    """Return the compacted list or ExpenseTable behind a ledger, so an ExpenseTable can answer queries itself."""
+    if isinstance(expense_data, expense_ledger.ExpenseLedger):
+        return expense_data.live_rows()
+    return expense_data
+
+
+def compute_summary(expense_data):
+    """Recompute the summary with a full scan of the expenses, in the base currency."""
+    expense_data = row_store(expense_data)
+    if hasattr(expense_data, "summary"):
+        return expense_data.summary()
+    result = {"total": 0.0, "count": 0, "categories": {}}
+    for expense, amount in expense_currency.converted(expense_data):
+        result["total"] += amount
+        result["count"] += 1
+        category_total = result["categories"].setdefault(expense["category"], [0.0, 0])
+        category_total[0] += amount
+        category_total[1] += 1
+    return result
+
+
+def update_summary(expense, sign):
+    """Add (sign=1) or subtract (sign=-1) a single expense from the running summary."""
+    if summary is None:
+        return
+    amount = expense_currency.base_amount(expense)
+    summary["total"] += sign * amount
+    summary["count"] += sign
+    category_total = summary["categories"].setdefault(expense["category"], [0.0, 0])
+    category_total[0] += sign * amount
+    category_total[1] += sign
+    if category_total[1] == 0:
+        del summary["categories"][expense["category"]]
+
+
+def file_signature(path):
+    """Return [size, mtime_ns] of a file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def storage_signature():
+    """Identify the current on-disk state of the snapshot and journal, and the rates summaries are converted with."""
+    return [file_signature(DATA_FILE), file_signature(JOURNAL_FILE), expense_currency.rates_signature()]
+
+
+def load_summary(expense_data):
+    """Use the persisted summary if it matches the files on disk, otherwise rebuild it."""
+    global summary
+    if os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as file:
+            stored = json.load(file)
+        if stored.get("signature") == storage_signature():
+            summary = stored["summary"]
+            return
+    summary = compute_summary(expense_data)
+
+
+def save_summary():
+    """Persist the running summary together with the signature of the data it describes."""
+    write_summary_file(summary)
+
+
+def write_summary_file(result):
+    """Replace SUMMARY_FILE with a summary of the files as they are now."""
+    temp_file = temp_path(SUMMARY_FILE)
+    with open(temp_file, 'w') as file:
+        json.dump({"signature": storage_signature(), "summary": result}, file)
+    os.replace(temp_file, SUMMARY_FILE)
+
+
+def summaries_match(expected, actual):
+    """Compare two summaries, allowing for floating point drift in the running totals."""
+    if expected["count"] != actual["count"] or expected["categories"].keys() != actual["categories"].keys():
+        return False
+    pairs = [(expected["total"], actual["total"])]
+    for category, (total, count) in expected["categories"].items():
+        if actual["categories"][category][1] != count:
+            return False
+        pairs.append((total, actual["categories"][category][0]))
+    return all(abs(a - b) <= 1e-6 * max(1.0, abs(a)) for a, b in pairs)
+
+
+def summarize(expense_data):
+    """Return the total, count and per-category totals of all expenses."""
+    global summary
+    if STORAGE_MODE == "sqlite":
+        conn = get_connection()
+        current = {"total": 0.0, "count": 0, "categories": {}}
+        for category, total, count in conn.execute(SELECT_SUMMARY_SQL):
+            current["total"] += total
+            current["count"] += count
+            current["categories"][category] = [total, count]
+        if VERIFY_SUMMARY:
+            expected = {"total": 0.0, "count": 0, "categories": {}}
+            for category, total, count in conn.execute(SUMMARY_SQL):
+                expected["total"] += total
+                expected["count"] += count
+                expected["categories"][category] = [total, count]
+            if not summaries_match(expected, current):
+                print("Summary verification failed, rebuilding category_summary.")
+                with conn:
+                    conn.execute("DELETE FROM category_summary")
+                    conn.execute("INSERT INTO category_summary " + SUMMARY_SQL)
+                current = expected
+        current = convert_sqlite_summary(conn, current)
+    else:
+        if summary is None:
+            summary = compute_summary(expense_data)
+        if VERIFY_SUMMARY:
+            expected = compute_summary(expense_data)
+            if not summaries_match(expected, summary):
+                print("Summary verification failed, rebuilding it from the expenses.")
+                summary = expected
+        current = summary
+
+    category_totals = {category: total for category, (total, count) in current["categories"].items()}
+    return current["total"], current["count"], category_totals
+
+
+def convert_sqlite_summary(conn, result):
+    """Convert a summary of the raw amounts in the SQLite store to the base currency, in place, and return it.
+
+    category_summary adds up amounts as booked, so the rows in another
+    currency are totalled per (category, currency, day) and each total is
+    corrected with one rate lookup.
+    """
+    for category, currency, day, total in conn.execute(FOREIGN_TOTALS_SQL):
+        correction = total * (expense_currency.get_rate_table().rate(currency, day) - 1)
+        result["total"] += correction
+        result["categories"][category][0] += correction
+    return result
+
+
+def get_date_index(expense_data):
+    """Return the date index, building it on first use."""
+    global date_index
+    if date_index is None:
+        date_index = expense_dates.DateIndex.from_expenses(expense_data)
+    return date_index
+
+
+def get_budget_tracker(expense_data):
+    """Return the budget tracker, building it on first use and again whenever BUDGET_FILE changes."""
+    global budget_tracker, budget_signature
+    signature = file_signature(expense_budgets.BUDGET_FILE)
+    if budget_tracker is None or signature != budget_signature:
+        budget_tracker = expense_budgets.BudgetTracker.from_expenses(expense_budgets.load_rules(), expense_data)
+        budget_signature = signature
+    return budget_tracker
+
+
+def check_budgets(expense_data, old_expense, new_expense):
+    """Return alert messages for the budgets that an add (old_expense None) or edit just took past a threshold.
+
+    Call it after the change is stored: the tracker is kept up to date by
+    update_indexes(), so this only looks up the totals the change went into.
+    """
+    try:
+        return get_budget_tracker(expense_data).alerts(old_expense, new_expense)
+    except ValueError as error:
+        # A broken BUDGET_FILE should not stop expenses from being recorded
+        return [f"Budgets were not checked: {error}"]
+
+
+def range_total(expense_data, start, end):
+    """Total spent from start to end inclusive (YYYY-MM-DD strings).
+
+    In monthly mode whole months come from the manifest and only the shards
+    at either edge of the range are read; otherwise the date index answers.
+    """
+    if STORAGE_MODE == "monthly":
+        return expense_data.summary(start, end)["total"] if start <= end else 0.0
+    return get_date_index(expense_data).range_total(start, end)
+
+
+def get_search_index(expense_data):
+    """Return the description search index, building it on first use."""
+    global search_index
+    if search_index is None:
+        search_index = expense_search.SearchIndex.from_expenses(expense_data)
+    return search_index
+
+
+def search_expenses(expense_data, query, category=None, start=None, end=None, limit=expense_search.SEARCH_LIMIT):
+    """Return up to limit expenses whose descriptions contain every query term as a word prefix, newest first.
+
+    In sqlite mode the FTS5 index answers the query; otherwise the in-memory
+    inverted index does. category, start and end are optional filters.
+    """
+    if STORAGE_MODE == "sqlite":
+        conn = get_connection()
+        if fts_enabled:
+            terms = expense_search.tokenize(query)
+            if terms:
+                sql = SEARCH_FTS_SQL
+                parameters = [" ".join(f'"{term}"*' for term in terms)]
+            else:
+                sql = SEARCH_ALL_SQL
+                parameters = []
+            if category is not None:
+                sql += " AND lower(e.category) = ?"
+                parameters.append(category.lower())
+            if start is not None:
+                sql += " AND e.date >= ?"
+                parameters.append(start)
+            if end is not None:
+                sql += " AND e.date <= ?"
+                parameters.append(end)
+            sql += " ORDER BY e.date DESC LIMIT ?"
+            parameters.append(limit)
+            return [sqlite_expense(row) for row in conn.execute(sql, parameters)]
+    return get_search_index(expense_data).search(query, category, start, end, limit)
+
+
+def totals_by_month(expense_data):
+    """Return {"YYYY-MM": total} for all expenses, in the base currency."""
+    expense_data = row_store(expense_data)
+    if hasattr(expense_data, "totals_by_month"):
+        return expense_data.totals_by_month()
+    totals = {}
+    for expense, amount in expense_currency.converted(expense_data):
+        month = expense["date"][:7]
+        totals[month] = totals.get(month, 0) + amount
+    return totals
+
+
+def totals_by_month_and_category(expense_data):
+    """Return {("YYYY-MM", category): total} for all expenses, in the base currency."""
+    expense_data = row_store(expense_data)
+    if hasattr(expense_data, "totals_by_month_and_category"):
+        return expense_data.totals_by_month_and_category()
+    totals = {}
+    for expense, amount in expense_currency.converted(expense_data):
+        key = (expense["date"][:7], expense["category"])
+        totals[key] = totals.get(key, 0) + amount
+    return totals
+
+
+def close_storage(expense_data):
+    """Flush pending changes and release the storage backend."""
+    global connection
+    flush_pending(expense_data)
+    with shared_write(expense_data):
+        # A shared journal is left to the size threshold, since a compaction makes every other process reload
+        if STORAGE_MODE == "journal" and journal_length > 0 and not CONCURRENT:
+            compact_expenses(expense_data)
+        elif STORAGE_MODE in ("journal", "json") and summary is not None:
+            save_summary()
+        # Rebuild the cache once per session rather than on every compaction
+        if SNAPSHOT_CACHE and STORAGE_MODE in ("journal", "json") and \
+                cache_data_signature != file_signature(DATA_FILE):
+            save_snapshot_cache(expense_data)
+    if connection is not None:
+        connection.close()
+        connection = None
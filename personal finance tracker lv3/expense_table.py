@@ -0,0 +1,268 @@
+from datetime import date
+
+import numpy as np
+
+import expense_currency
+
+# Columnar in-memory expense table used when expense_storage.COLUMNAR is enabled
+
+BASE_FIELDS = ("date", "amount", "description", "category")
+# Fields held in columns rather than in a row's extras
+COLUMN_FIELDS = BASE_FIELDS + ("currency",)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ExpenseTable:
+    """List-like expense table storing amounts, dates and categories as NumPy columns.
+
+    Rows are still read and written as dicts, so code written against a list
+    of expense dicts keeps working, while summaries and group-by queries run
+    as vectorized operations over the columns.
+    """
+
+    def __init__(self, capacity=1024):
+        self.length = 0
+        self.amounts = np.zeros(capacity, dtype=np.float64)
+        self.dates = np.zeros(capacity, dtype=np.int32)
+        self.category_codes = np.zeros(capacity, dtype=np.int16)
+        # Code 0 is a row without a currency field, in expense_currency.BASE_CURRENCY
+        self.currency_codes = np.zeros(capacity, dtype=np.int16)
+        self.descriptions = []
+        # Per-row dict of fields that do not fit the columns (ids, unparseable dates), or None
+        self.extras = []
+        self.categories = []
+        self.category_index = {}
+        self.currencies = [None]
+        self.currency_index = {None: 0}
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        """Build a table from a list of expense dicts, converting whole columns at once."""
+        count = len(expenses)
+        table = cls(max(count, 1024))
+        if count == 0:
+            return table
+        date_strings = [expense["date"] for expense in expenses]
+        try:
+            days = np.array(date_strings, dtype="datetime64[D]")
+        except ValueError:
+            # At least one date is not ISO formatted, fall back to row-by-row parsing
+            for expense in expenses:
+                table.append(expense)
+            return table
+
+        table.amounts[:count] = np.fromiter((expense["amount"] for expense in expenses), np.float64, count)
+        table.dates[:count] = days.astype(np.int64) + EPOCH_ORDINAL
+        table.category_codes[:count] = [table.category_code(expense["category"]) for expense in expenses]
+        table.currency_codes[:count] = [table.currency_code(expense.get("currency")) for expense in expenses]
+        table.descriptions = [expense["description"] for expense in expenses]
+        table.extras = [{key: value for key, value in expense.items() if key not in COLUMN_FIELDS} or None
+                        for expense in expenses]
+        table.length = count
+        # NumPy accepts shorter forms such as "2024-03"; keep those strings verbatim
+        for index in np.flatnonzero(days.astype(str) != np.array(date_strings)):
+            table.write_row(int(index), expenses[index])
+        return table
+
+    def category_code(self, category):
+        """Return the code of a category, registering it on first use."""
+        code = self.category_index.get(category)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(category)
+            self.category_index[category] = code
+        return code
+
+    def currency_code(self, currency):
+        """Return the code of a currency (None for none), registering it on first use."""
+        code = self.currency_index.get(currency)
+        if code is None:
+            code = len(self.currencies)
+            self.currencies.append(currency)
+            self.currency_index[currency] = code
+        return code
+
+    def grow(self):
+        """Double the capacity of the numeric columns."""
+        capacity = len(self.amounts) * 2
+        for name in ("amounts", "dates", "category_codes", "currency_codes"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.length] = column[:self.length]
+            setattr(self, name, grown)
+
+    def write_row(self, index, expense):
+        """Store an expense dict in row index."""
+        extras = {key: value for key, value in expense.items() if key not in COLUMN_FIELDS}
+        try:
+            parsed = date.fromisoformat(expense["date"])
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.isoformat() == expense["date"]:
+            self.dates[index] = parsed.toordinal()
+        else:
+            self.dates[index] = 0
+            extras["date"] = expense["date"]
+        self.amounts[index] = expense["amount"]
+        self.category_codes[index] = self.category_code(expense["category"])
+        self.currency_codes[index] = self.currency_code(expense.get("currency"))
+        self.descriptions[index] = expense["description"]
+        self.extras[index] = extras or None
+
+    def append(self, expense):
+        if self.length == len(self.amounts):
+            self.grow()
+        self.descriptions.append(None)
+        self.extras.append(None)
+        self.length += 1
+        self.write_row(self.length - 1, expense)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("expense index out of range")
+        expense = {
+            "date": date.fromordinal(int(self.dates[index])).isoformat() if self.dates[index] else "",
+            "amount": float(self.amounts[index]),
+            "description": self.descriptions[index],
+            "category": self.categories[self.category_codes[index]],
+        }
+        if self.currency_codes[index]:
+            expense["currency"] = self.currencies[self.currency_codes[index]]
+        if self.extras[index]:
+            expense.update(self.extras[index])
+        return expense
+
+    def __setitem__(self, index, expense):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("expense index out of range")
+        self.write_row(index, expense)
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+    def pop(self, index=-1):
+        if index < 0:
+            index += self.length
+        expense = self[index]
+        for column in (self.amounts, self.dates, self.category_codes, self.currency_codes):
+            column[index:self.length - 1] = column[index + 1:self.length]
+        del self.descriptions[index]
+        del self.extras[index]
+        self.length -= 1
+        return expense
+
+    def to_list(self):
+        """Return the table as a list of expense dicts."""
+        return list(self)
+
+    def base_amounts(self):
+        """Return the amounts column in expense_currency.BASE_CURRENCY.
+
+        Rows in another currency are grouped by (currency, day) and each
+        group is converted with a single rate lookup.
+        """
+        amounts = self.amounts[:self.length]
+        codes = self.currency_codes[:self.length]
+        foreign = np.flatnonzero(codes)
+        if len(foreign) == 0:
+            return amounts
+        converted = amounts.copy()
+        table = expense_currency.get_rate_table()
+        dated = foreign[self.dates[foreign] != 0]
+        # One key per (currency, day) pair, so each rate is looked up once for all the rows that share it
+        keys = codes[dated].astype(np.int64) << 32 | self.dates[dated]
+        _, first_rows, groups = np.unique(keys, return_index=True, return_inverse=True)
+        rates = np.array([table.rate(self.currencies[codes[row]], date.fromordinal(int(self.dates[row])).isoformat())
+                          for row in dated[first_rows]])
+        if len(dated):
+            converted[dated] *= rates[groups]
+        # Dates that are not YYYY-MM-DD are kept as strings in extras
+        for row in foreign[self.dates[foreign] == 0]:
+            converted[row] *= table.rate(self.currencies[codes[row]], self.extras[row]["date"])
+        return converted
+
+    def summary(self):
+        """Return the total, count and per-category [total, count] in the summary format, in the base currency."""
+        codes = self.category_codes[:self.length]
+        amounts = self.base_amounts()
+        totals = np.bincount(codes, weights=amounts, minlength=len(self.categories))
+        counts = np.bincount(codes, minlength=len(self.categories))
+        return {
+            "total": float(amounts.sum()),
+            "count": self.length,
+            "categories": {self.categories[code]: [float(totals[code]), int(counts[code])]
+                           for code in np.flatnonzero(counts)},
+        }
+
+    def month_keys(self):
+        """Return the month of every row as months since 1970-01, -1 for rows without a date."""
+        dates = self.dates[:self.length]
+        months = (dates - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        months[dates == 0] = -1
+        return months
+
+    @staticmethod
+    def month_label(month):
+        """Format a month key as YYYY-MM."""
+        return str(np.datetime64(int(month), "M"))
+
+    def undated_months(self):
+        """Yield (row, month) for the rows whose date is not YYYY-MM-DD.
+
+        Their month is the first seven characters of the date as entered,
+        the same key the list-based reports use, so the columnar mode groups
+        them the same way.
+        """
+        for row in np.flatnonzero(self.dates[:self.length] == 0):
+            yield row, self.extras[row]["date"][:7]
+
+    def totals_by_category(self):
+        """Return {category: total} using a vectorized group-by."""
+        return {category: total for category, (total, count) in self.summary()["categories"].items()}
+
+    def month_offsets(self):
+        """Return the first month key and each row's offset from it, with -1 mapped to offset 0."""
+        months = self.month_keys()
+        first = months[months >= 0].min() - 1 if (months >= 0).any() else -1
+        offsets = np.where(months >= 0, months - first, 0)
+        return first, offsets
+
+    def totals_by_month(self):
+        """Return {"YYYY-MM": total} using a vectorized group-by."""
+        first, offsets = self.month_offsets()
+        amounts = self.base_amounts()
+        totals = np.bincount(offsets, weights=amounts)
+        counts = np.bincount(offsets)
+        # Offset 0 holds only the undated rows, which are grouped by their raw month below
+        result = {self.month_label(first + offset): float(totals[offset])
+                  for offset in np.flatnonzero(counts[1:]) + 1}
+        for row, month in self.undated_months():
+            result[month] = result.get(month, 0.0) + float(amounts[row])
+        return result
+
+    def totals_by_month_and_category(self):
+        """Return {("YYYY-MM", category): total} using a vectorized group-by."""
+        width = max(len(self.categories), 1)
+        first, offsets = self.month_offsets()
+        amounts = self.base_amounts()
+        codes = self.category_codes[:self.length]
+        cells = offsets * width + codes
+        totals = np.bincount(cells, weights=amounts)
+        counts = np.bincount(cells)
+        result = {(self.month_label(first + cell // width), self.categories[cell % width]): float(totals[cell])
+                  for cell in np.flatnonzero(counts[width:]) + width}
+        for row, month in self.undated_months():
+            key = (month, self.categories[codes[row]])
+            result[key] = result.get(key, 0.0) + float(amounts[row])
+        return result
@@ -1,49 +1,66 @@
+import argparse
 import json
 import os
-from datetime import datetime
-import openpyxl
+import sys
+from datetime import datetime, timedelta
+import expense_currency
+import expense_dates
+import expense_export
+import expense_import
+import expense_metrics
+import expense_search
+import expense_storage
 
 # Global variable for storing expense data
 expense_data = []
 categories = {"food", "transportation", "utilities", "entertainment"}
 
-# File to store expense data persistently
-DATA_FILE = "expenses.json"
-EXCEL_FILE = "expenses.xlsx"
+# Default export file; its extension picks the format
+EXPORT_FILE = "expenses.xlsx"
+EXPORT_HEADERS = ["Date", "Description", "Amount", "Currency", f"Amount ({expense_currency.BASE_CURRENCY})",
+                  "Category"]
+EXPORT_COLUMNS = ["date", "description", "amount", "currency", "base_amount", "category"]
 
 
 def load_expenses():
     """Load expense data from file if it exists."""
     global expense_data, categories
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as file:
-            expense_data = json.load(file)
-            for expense in expense_data:
-                categories.add(expense["category"])
+    expense_data = expense_storage.load_expenses()
+    # The per-category totals already name every category in use, without reading each expense
+    categories.update(expense_storage.summarize(expense_data)[2])
 
 
 def save_expenses():
     """Save expense data to file."""
-    with open(DATA_FILE, 'w') as file:
-        json.dump(expense_data, file)
-
-
-def export_to_excel():
-    """Export expenses to an Excel spreadsheet."""
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    sheet.append(["Date", "Description", "Amount", "Category"])
-
-    for expense in expense_data:
-        sheet.append([expense["date"], expense["description"], expense["amount"], expense["category"]])
-
-    workbook.save(EXCEL_FILE)
-    print("Expenses exported to Excel successfully!")
+    expense_storage.save_expenses(expense_data)
+
+
+def export_expenses():
+    """Export expenses to CSV, JSON Lines, Excel or SQLite, optionally filtered by category and date range."""
+    path = input(f"Enter the file to export to (.csv, .jsonl, .xlsx or .db; add .gz, .bz2 or .xz to compress "
+                 f"CSV and JSON Lines) [Leave blank for {EXPORT_FILE}]: ").strip() or EXPORT_FILE
+    category = input("Enter a category [Leave blank for all]: ").strip() or None
+    start = input("Enter the start date (YYYY-MM-DD) [Leave blank for no limit]: ").strip() or None
+    end = input("Enter the end date (YYYY-MM-DD) [Leave blank for no limit]: ").strip() or None
+    for value in (start, end):
+        if value is not None and not expense_dates.is_iso_date(value):
+            print("Invalid date!")
+            return
+
+    try:
+        exported = expense_export.export_expenses(expense_data, path, EXPORT_HEADERS, EXPORT_COLUMNS,
+                                                  category, start, end)
+    except (OSError, ValueError) as error:
+        print(f"Export failed: {error}")
+        return
+    print(f"Exported {exported} expenses to {path}.")
+    print_missing_rates()
 
 
 def add_expense():
     """Add a new expense entry."""
     amount = float(input("Enter the amount spent: "))
+    currency = input_currency(f"Enter the currency [Leave blank for {expense_currency.BASE_CURRENCY}]: ")
     description = input("Enter a brief description: ")
     category = input("Enter the category of the expense: ").lower()
 
@@ -61,10 +78,22 @@ def add_expense():
         "description": description,
         "category": category
     }
-    expense_data.append(expense)
+    if currency is not None:
+        expense["currency"] = currency
+    expense = expense_storage.store_add(expense_data, expense)
     categories.add(category)
-    save_expenses()
     print("Expense added successfully!")
+    print_budget_alerts(None, expense)
+
+
+def input_currency(prompt):
+    """Ask for a currency until one with known rates is entered; return None for the base currency."""
+    while True:
+        try:
+            return expense_currency.parse_currency(input(prompt))
+        except ValueError as error:
+            print(f"Invalid currency: {error}. Available currencies:",
+                  ", ".join(expense_currency.get_rate_table().currencies()))
 
 
 def edit_expense():
@@ -72,17 +101,19 @@ def edit_expense():
     print("Edit Expense:")
     display_expenses()
 
-    index = int(input("Enter the index of the expense to edit: "))
-    if index < 1 or index > len(expense_data):
-        print("Invalid index!")
+    expense_id = int(input("Enter the ID of the expense to edit: "))
+    if expense_id not in expense_data:
+        print("Invalid ID!")
         return
 
-    expense = expense_data[index - 1]
+    original = dict(expense_data.get(expense_id))
+    expense = dict(original)
     print("\nEditing Expense:")
     print("1. Date:", expense["date"])
     print("2. Amount:", expense["amount"])
     print("3. Description:", expense["description"])
     print("4. Category:", expense["category"])
+    print("5. Currency:", expense_currency.currency_of(expense))
 
     choice = input("Enter the number of the field to edit: ")
     if choice == '1':
@@ -97,11 +128,31 @@ def edit_expense():
             print("Invalid category. Available categories:", categories)
             new_category = input("Enter new category: ").lower()
         expense["category"] = new_category
+    elif choice == '5':
+        currency = input_currency(f"Enter new currency [Leave blank for {expense_currency.BASE_CURRENCY}]: ")
+        if currency is None:
+            expense.pop("currency", None)
+        else:
+            expense["currency"] = currency
     else:
         print("Invalid choice!")
 
-    save_expenses()
+    try:
+        old_expense = expense_storage.store_edit(expense_data, expense_id, expense, original)
+    except KeyError:
+        print("The expense was deleted in the meantime.")
+        return
+    except expense_storage.EditConflict as conflict:
+        print(f"{conflict}. Edit it again to change it.")
+        return
     print("Expense edited successfully!")
+    print_budget_alerts(old_expense, expense_data.get(expense_id))
+
+
+def print_budget_alerts(old_expense, new_expense):
+    """Print the budget warnings an add or edit set off."""
+    for message in expense_storage.check_budgets(expense_data, old_expense, new_expense):
+        print(message)
 
 
 def delete_expense():
@@ -109,40 +160,135 @@ def delete_expense():
     print("Delete Expense:")
     display_expenses()
 
-    index = int(input("Enter the index of the expense to delete: "))
-    if index < 1 or index > len(expense_data):
-        print("Invalid index!")
+    expense_id = int(input("Enter the ID of the expense to delete: "))
+    if expense_id not in expense_data:
+        print("Invalid ID!")
         return
 
-    del expense_data[index - 1]
-    save_expenses()
+    try:
+        expense_storage.store_delete(expense_data, expense_id)
+    except KeyError:
+        print("The expense was already deleted.")
+        return
     print("Expense deleted successfully!")
 
 
 def display_expenses():
     """Display all recorded expenses."""
     print("\nRecorded Expenses:")
-    for i, expense in enumerate(expense_data, 1):
-        print(f"{i}. Date: {expense['date']}, Amount: {expense['amount']}, Description: {expense['description']}, Category: {expense['category']}")
+    for expense in expense_data:
+        print(f"{expense['id']}. Date: {expense['date']}, Amount: {expense['amount']} {expense_currency.currency_of(expense)}, Description: {expense['description']}, Category: {expense['category']}")
 
 
 def view_summary():
     """View summary of expenses."""
-    total_spent = 0
-    category_totals = {}
-
-    for expense in expense_data:
-        total_spent += expense["amount"]
-        category = expense["category"]
-        category_totals[category] = category_totals.get(category, 0) + expense["amount"]
+    total_spent, count, category_totals = expense_storage.summarize(expense_data)
 
-    print("\nExpense Summary:")
+    print(f"\nExpense Summary (in {expense_currency.BASE_CURRENCY}):")
     print(f"Total Amount Spent: ${total_spent:.2f}")
 
     print("\nCategory Breakdown:")
     for category, amount in category_totals.items():
         print(f"{category.capitalize()}: ${amount:.2f}")
 
+    if count > 0:
+        print(f"\nAverage Spending per Expense: ${total_spent / count:.2f}")
+
+    try:
+        budgets = expense_storage.get_budget_tracker(expense_data).status(datetime.now().date())
+    except ValueError as error:
+        print(f"\nBudgets were not checked: {error}")
+        budgets = []
+    if budgets:
+        print("\nBudgets:")
+        for rule, period, spent in budgets:
+            name = rule["category"].capitalize() if rule["category"] is not None else "All spending"
+            print(f"{name} ({period}): ${spent:.2f} of ${rule['limit']:.2f}")
+    print_missing_rates()
+
+
+def print_missing_rates():
+    """Warn about expenses left out of the converted totals because their currency has no rates."""
+    warning = expense_currency.missing_rates_warning()
+    if warning is not None:
+        print(f"\nWarning: {warning}")
+
+
+def view_monthly_report():
+    """View spending per month and per month and category."""
+    month_totals = expense_storage.totals_by_month(expense_data)
+    category_breakdown = {}
+    for (month, category), amount in expense_storage.totals_by_month_and_category(expense_data).items():
+        category_breakdown.setdefault(month, []).append((category, amount))
+
+    print("\nMonthly Report:")
+    for month in sorted(month_totals):
+        print(f"{month}: ${month_totals[month]:.2f}")
+        for category, amount in sorted(category_breakdown.get(month, [])):
+            print(f"    {category.capitalize()}: ${amount:.2f}")
+    print_missing_rates()
+
+
+def view_spending_between_dates():
+    """View the amount spent between two dates."""
+    today = datetime.now().date()
+    start = input("Enter the start date (YYYY-MM-DD) [Leave blank for 90 days ago]: ")
+    if start == "":
+        start = (today - timedelta(days=89)).isoformat()
+    end = input("Enter the end date (YYYY-MM-DD) [Leave blank for today]: ")
+    if end == "":
+        end = today.isoformat()
+    if not expense_dates.is_iso_date(start) or not expense_dates.is_iso_date(end):
+        print("Invalid date!")
+        return
+
+    month_start = today.replace(day=1).isoformat()
+    last_90_start = (today - timedelta(days=89)).isoformat()
+    print(f"\nSpent from {start} to {end}: ${expense_storage.range_total(expense_data, start, end):.2f}")
+    print(f"Month to Date: ${expense_storage.range_total(expense_data, month_start, today.isoformat()):.2f}")
+    print(f"Last 90 Days: ${expense_storage.range_total(expense_data, last_90_start, today.isoformat()):.2f}")
+    print_missing_rates()
+
+
+def import_expenses():
+    """Import expenses in bulk from a CSV, JSON Lines or xlsx file."""
+    path = input("Enter the path of the file to import (.csv, .jsonl or .xlsx): ")
+    if not os.path.exists(path):
+        print("File not found!")
+        return
+    try:
+        imported, rejected, seconds, rejected_file = expense_import.import_expenses(path, expense_data, categories)
+    except ValueError as error:
+        print(error)
+        return
+
+    rate = imported / seconds if seconds > 0 else imported
+    print(f"Imported {imported} expenses in {seconds:.2f}s ({rate:.0f} rows/sec).")
+    if rejected:
+        print(f"Rejected {rejected} rows, see {rejected_file}")
+
+
+def search_expenses():
+    """Search expense descriptions, optionally filtered by category and date range."""
+    query = input("Enter words to search for (prefixes match, e.g. 'mil groc'): ")
+    category = input("Enter a category [Leave blank for any]: ").strip() or None
+    start = input("Enter the start date (YYYY-MM-DD) [Leave blank for no limit]: ").strip() or None
+    end = input("Enter the end date (YYYY-MM-DD) [Leave blank for no limit]: ").strip() or None
+    for value in (start, end):
+        if value is not None and not expense_dates.is_iso_date(value):
+            print("Invalid date!")
+            return
+
+    results = expense_storage.search_expenses(expense_data, query, category, start, end)
+    if not results:
+        print("No matching expenses.")
+        return
+    print("\nMatching Expenses:")
+    for expense in results:
+        print(f"Date: {expense['date']}, Amount: {expense['amount']}, Description: {expense['description']}, Category: {expense['category']}")
+    if len(results) == expense_search.SEARCH_LIMIT:
+        print(f"Showing the first {len(results)} matches, refine the search to see others.")
+
 
 def main_menu():
     """Display main menu options."""
@@ -151,28 +297,113 @@ def main_menu():
     print("2. Edit Expense")
     print("3. Delete Expense")
     print("4. View Summary")
-    print("5. Export to Excel")
-    print("6. Exit")
+    print("5. Export Expenses")
+    print("6. Monthly Report")
+    print("7. Spending Between Dates")
+    print("8. Import Expenses")
+    print("9. Search Expenses")
+    print("10. Exit")
+
+
+# Menu choices other than exit; each runs through expense_metrics so it can be timed or profiled by name
+MENU_ACTIONS = {
+    '1': add_expense,
+    '2': edit_expense,
+    '3': delete_expense,
+    '4': view_summary,
+    '5': export_expenses,
+    '6': view_monthly_report,
+    '7': view_spending_between_dates,
+    '8': import_expenses,
+    '9': search_expenses,
+}
+
+
+def build_parser():
+    """Build the parser for the non-interactive subcommands."""
+    parser = argparse.ArgumentParser(description="Expense Tracker. Run without arguments for the interactive menu.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("summary", help="print the summary as JSON")
+
+    export_parser = subparsers.add_parser("export", help="export expenses; the file extension picks the format")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--category")
+    export_parser.add_argument("--from", dest="start", help="YYYY-MM-DD")
+    export_parser.add_argument("--to", dest="end", help="YYYY-MM-DD")
+
+    serve_parser = subparsers.add_parser("serve", help="serve the ledger over HTTP/JSON until interrupted")
+    serve_parser.add_argument("--host", help="address to listen on (default 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, help="port to listen on (default 8765, 0 picks a free one)")
+    serve_parser.add_argument("--pool", type=int, help="read connections in the storage pool (default 4)")
+    return parser
+
+
+def run_command(args):
+    """Run a single non-interactive command and return the process exit code.
+
+    summary and export stream the ledger rather than load it, so they run
+    in bounded memory however large expenses.json grows.
+    """
+    parser = build_parser()
+    options = parser.parse_args(args)
+
+    if options.command == "summary":
+        summary = expense_storage.stream_summary()
+        print(json.dumps({
+            "total": summary["total"],
+            "count": summary["count"],
+            "average": summary["total"] / summary["count"] if summary["count"] > 0 else 0.0,
+            "currency": expense_currency.BASE_CURRENCY,
+            "categories": {category: total for category, (total, count) in summary["categories"].items()}
+        }))
+    elif options.command == "export":
+        for value in (options.start, options.end):
+            if value is not None and not expense_dates.is_iso_date(value):
+                parser.error("dates must be in YYYY-MM-DD format")
+        try:
+            exported = expense_export.export_expenses(expense_storage.iter_expenses(), options.file, EXPORT_HEADERS,
+                                                      EXPORT_COLUMNS, options.category, options.start, options.end)
+        except (OSError, ValueError) as error:
+            print(f"Export failed: {error}", file=sys.stderr)
+            return 1
+        print(json.dumps({"exported": exported, "file": options.file}))
+    elif options.command == "serve":
+        if options.pool is not None and options.pool < 1:
+            parser.error("--pool must be at least 1")
+        # Imported here so the menu and the other commands never pay for loading asyncio
+        import expense_server
+        expense_server.serve(options.host or expense_server.HOST,
+                             expense_server.PORT if options.port is None else options.port,
+                             options.pool or expense_server.POOL_SIZE, categories)
+
+    if options.command in ("summary", "export"):
+        # Kept off stdout, which holds the JSON result
+        warning = expense_currency.missing_rates_warning()
+        if warning is not None:
+            print(f"Warning: {warning}", file=sys.stderr)
+    return 0
 
 
 def main():
-    load_expenses()
+    args = expense_metrics.configure(sys.argv[1:])
+    if args:
+        # Subcommands are measured and profiled under their own name, e.g. --profile summary
+        sys.exit(expense_metrics.run_command(args[0], run_command, args))
+
+    expense_metrics.run_command("load_expenses", load_expenses)
 
     while True:
         main_menu()
         choice = input("Enter your choice: ")
 
-        if choice == '1':
-            add_expense()
-        elif choice == '2':
-            edit_expense()
-        elif choice == '3':
-            delete_expense()
-        elif choice == '4':
-            view_summary()
-        elif choice == '5':
-            export_to_excel()
-        elif choice == '6':
+        if choice in MENU_ACTIONS:
+            # Other processes may have written to a shared ledger while the menu was waiting for input
+            expense_storage.refresh_expenses(expense_data)
+            action = MENU_ACTIONS[choice]
+            expense_metrics.run_command(action.__name__, action)
+        elif choice == '10':
+            expense_storage.close_storage(expense_data)
             print("Exiting...")
             break
         else:
@@ -188,31 +419,97 @@ if __name__ == "__main__":
 # 
 # Inputting Expenses:
 # 
-# When you run the application, you'll see a menu with options like adding, editing, deleting expenses, viewing summary, exporting to Excel, and exiting.
+# When you run the application, you'll see a menu with options like adding, editing, deleting expenses, viewing summary, exporting, and exiting.
 # To add a new expense, select option 1. You'll be prompted to enter the amount spent, description, and category of the expense.
 # If the category you want to enter is not in the predefined list, it will display the available categories and prompt you to enter a valid one.
 # You can also optionally specify the date of the expense in the format YYYY-MM-DD, or leave it blank to use the current date.
 # Editing Expenses:
 # 
 # To edit an existing expense, select option 2 from the main menu.
-# You'll be shown a list of recorded expenses along with their index numbers.
-# Enter the index number of the expense you want to edit, then follow the prompts to edit the desired fields such as date, amount, description, or category.
+# You'll be shown a list of recorded expenses along with their IDs.
+# Enter the ID of the expense you want to edit, then follow the prompts to edit the desired fields such as date, amount, description, or category.
 # Deleting Expenses:
 # 
 # To delete an existing expense, select option 3 from the main menu.
-# Similar to editing, you'll be shown a list of recorded expenses with index numbers.
-# Enter the index number of the expense you want to delete, and it will be removed from the expense list.
+# Similar to editing, you'll be shown a list of recorded expenses with their IDs.
+# Enter the ID of the expense you want to delete, and it will be removed from the expense list.
+# An expense keeps its ID when others are added or deleted, so the same number always refers to the same expense.
 # Viewing Summary:
 # 
 # Select option 4 from the main menu to view a summary of your expenses.
 # The summary will display the total amount spent and a breakdown by categories.
-# Exporting Expenses to Excel:
+# Exporting Expenses:
+# 
+# To export your recorded expenses, select option 5 from the main menu and enter a file name, or leave it blank for expenses.xlsx.
+# The extension picks the format: .csv (or .txt), .jsonl, .xlsx or .db for a SQLite database; add .gz, .bz2 or .xz to a CSV or JSON Lines name to compress it, e.g. expenses.csv.gz.
+# Optionally limit the export to one category and a date range. Rows are streamed to the file, and it only replaces an earlier export once it is complete.
+# Monthly Report:
+# 
+# Select option 6 to see the amount spent in each month, broken down by category.
+# Spending Between Dates:
 # 
-# To export your recorded expenses to an Excel spreadsheet, select option 5 from the main menu.
-# This will create an Excel file named expenses.xlsx in the same directory as the script, containing all your recorded expenses in a tabular format.
+# Select option 7 and enter a start and end date to see the amount spent in that window, along with month-to-date and last-90-days totals.
+# Importing Expenses:
+# 
+# Select option 8 and enter the path of a .csv, .jsonl or .xlsx file with date, amount, description and category columns.
+# Rows are validated against the known categories and added in batches; rejected rows are written to <file>.rejected.csv.
+# Searching Expenses:
+# 
+# Select option 9 and enter one or more words; each one matches the start of a word in the description, so "mil groc" finds "milk and groceries".
+# Optionally narrow the search to a category and a date range. Up to 100 matches are shown, newest first.
 # Exiting the Application:
 # 
-# To exit the application, select option 6 from the main menu.
+# To exit the application, select option 10 from the main menu.
+# Command Line Usage:
+# 
+# Two commands run without the menu and stream expenses.json instead of loading it, so they work on ledgers larger than memory:
+#   python expense_tracker_advanced.py summary                          (prints the summary as JSON)
+#   python expense_tracker_advanced.py export expenses.csv.gz [--category food] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+# HTTP Service:
+# 
+# python expense_tracker_advanced.py serve [--host 127.0.0.1] [--port 8765] [--pool 4] serves the ledger as JSON until Ctrl+C:
+#   curl localhost:8765/summary
+#   curl "localhost:8765/expenses?category=food&from=2024-01-01&offset=0&limit=100"
+#   curl -X POST localhost:8765/expenses -d '{"amount": 12.5, "description": "Lunch", "category": "food"}'   (or a JSON array of expenses)
+#   curl -o expenses.csv.gz "localhost:8765/export?format=csv.gz&to=2024-12-31"
+# Any category is accepted and the date defaults to today. Summaries are cached until the next change, and listing
+# and exporting share a pool of --pool read connections, so many clients can be served at once.
+# Sharing the Ledger:
+# 
+# Set EXPENSE_CONCURRENT=1 when several people run the tracker (or the GUI) on the same expenses.json.
+# Every change is then written at once while holding a lock on expenses.lock, after first picking up what the others wrote,
+# so no change is lost. Editing merges with changes others made to other fields of the same expense; if someone changed
+# the same field, the edit is refused and shows the new value so you can edit again.
+# Budgets:
+# 
+# Put budget rules in budgets.json next to the ledger, for example
+#   {"budgets": [{"category": "food", "period": "month", "limit": 400}, {"period": "week", "limit": 250, "warn_at": 0.9}]}
+# period is day, week, month or year, and a rule without a category covers all spending. Adding or editing an expense
+# prints a warning when it takes a budget past warn_at (80% by default) of its limit, and another for every expense that
+# adds to a budget that is already over. View Summary lists how much of each budget the current period has used.
+# The file is read again whenever it changes.
+# Currencies:
+# 
+# Expenses are in USD (expense_currency.BASE_CURRENCY) unless another currency is entered when adding or editing one.
+# Other currencies need daily rates in rates.csv next to the ledger, one row per day and currency:
+#   date,currency,rate
+#   2024-05-02,EUR,1.0712
+# where rate is how many USD one unit of the currency was worth that day; a day without a rate uses the latest earlier
+# one. Summaries, monthly reports, spending between dates and budgets are converted to USD, and exports have both the
+# amount as entered with its currency and the amount in USD. Imports may have a currency column. If rates.csv has no
+# rates at all for a currency some expenses are in, those expenses are left out of the USD totals and a warning names
+# the currency.
+# Monthly Storage:
+# 
+# Set STORAGE_MODE = "monthly" in expense_storage.py to keep each month in its own file under expenses.months/, with a
+# small manifest.json of per-month totals. The first start splits expenses.json into it. Adding an expense only appends to
+# its month's file, and the summary, monthly report and spending between dates are worked out from the manifest, reading
+# only the months at the edges of the date range.
+# Measuring Performance:
+# 
+# Start the tracker with --metrics (or set EXPENSE_METRICS=1) to record how long loading, saving, journal replay, exports and each menu action take.
+# Latency histograms, row and byte counts are merged into expenses.metrics.json on exit (EXPENSE_METRICS_FILE picks another file).
+# --profile <action> (or EXPENSE_PROFILE=<action>) writes a cProfile capture of that menu action, e.g. --profile view_summary writes expenses.view_summary.prof.
 # Data Structures and Algorithms:
 # 
 # Data Structures:
@@ -222,5 +519,5 @@ if __name__ == "__main__":
 # Add Expense: The add_expense() function allows users to add new expenses. It prompts the user to input the amount spent, description, category, and date. It then creates a dictionary representing the new expense and appends it to the expense_data list.
 # Edit Expense: The edit_expense() function allows users to edit existing expenses. It displays a list of recorded expenses, prompts the user to select an expense to edit, and then allows the user to modify the selected expense's fields.
 # Delete Expense: The delete_expense() function allows users to delete existing expenses. It displays a list of recorded expenses, prompts the user to select an expense to delete, and then removes the selected expense from the expense_data list.
-# Export to Excel: The export_to_excel() function exports the recorded expenses to an Excel spreadsheet using the openpyxl library. It creates a new workbook, adds a worksheet, and populates it with the expense data.
+# Export Expenses: The export_expenses() function hands the expenses to expense_export.export_expenses(), which filters them and streams the rows to a CSV, JSON Lines, Excel (openpyxl) or SQLite sink chosen by the file extension.
 # By following these instructions and understanding the underlying data structures and algorithms used in the application, users can efficiently manage their expenses with the Expense Tracker application.
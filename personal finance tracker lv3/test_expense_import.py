@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import expense_import
+import expense_storage
+
+HEADER = "date,amount,description,category\n"
+
+
+class RejectedRowsTest(unittest.TestCase):
+    """Rejected rows go to <file>.rejected.csv, which only ever describes the latest import."""
+
+    def setUp(self):
+        self.previous_directory = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        self.previous_mode = expense_storage.STORAGE_MODE
+        expense_storage.STORAGE_MODE = "journal"
+        self.expense_data = expense_storage.load_expenses()
+
+    def tearDown(self):
+        expense_storage.STORAGE_MODE = self.previous_mode
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+    def import_text(self, text):
+        with open("rows.csv", 'w') as file:
+            file.write(HEADER + text)
+        return expense_import.import_expenses("rows.csv", self.expense_data, {"Food"})
+
+    def test_rejected_rows_are_written_out(self):
+        imported, rejected, seconds, rejected_file = self.import_text("2024-01-01,5,tea,food\n"
+                                                                       "2024-01-02,five,cake,food\n"
+                                                                       "2024-01-03,2,rent,housing\n")
+        self.assertEqual((imported, rejected), (1, 2))
+        with open(rejected_file) as file:
+            self.assertEqual(len(file.readlines()), 3)
+
+    def test_clean_import_removes_an_earlier_rejected_file(self):
+        self.import_text("2024-01-02,five,cake,food\n")
+        self.assertTrue(os.path.exists("rows.csv.rejected.csv"))
+        imported, rejected, seconds, rejected_file = self.import_text("2024-01-01,5,tea,food\n")
+        self.assertEqual((imported, rejected, rejected_file), (1, 0, None))
+        self.assertFalse(os.path.exists("rows.csv.rejected.csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
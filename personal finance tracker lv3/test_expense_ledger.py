@@ -0,0 +1,77 @@
+import unittest
+
+import expense_ledger
+
+
+def new_expenses(count):
+    return [{"date": "2024-02-05", "amount": float(number), "description": f"item {number}", "category": "food"}
+            for number in range(count)]
+
+
+class ExpenseLedgerTest(unittest.TestCase):
+    """Expenses keep their ids through removals and compaction, and positions skip tombstones."""
+
+    def setUp(self):
+        self.previous_min_tombstones = expense_ledger.COMPACT_MIN_TOMBSTONES
+        expense_ledger.COMPACT_MIN_TOMBSTONES = 4
+
+    def tearDown(self):
+        expense_ledger.COMPACT_MIN_TOMBSTONES = self.previous_min_tombstones
+
+    def assert_consistent(self, ledger, ids):
+        self.assertEqual([expense["id"] for expense in ledger], ids)
+        self.assertEqual(len(ledger), len(ids))
+        for position, expense_id in enumerate(ids):
+            self.assertEqual(ledger[position]["id"], expense_id)
+            self.assertEqual(ledger.position_of(expense_id), position)
+            self.assertEqual(ledger.get(expense_id)["id"], expense_id)
+
+    def test_expenses_without_ids_are_numbered_after_the_highest(self):
+        expenses = new_expenses(3)
+        expenses[1]["id"] = 7
+        ledger = expense_ledger.ExpenseLedger(expenses)
+        self.assertEqual([expense["id"] for expense in ledger], [1, 7, 8])
+        ledger.append(new_expenses(1)[0])
+        self.assertEqual(ledger[-1]["id"], 9)
+
+    def test_duplicate_ids_are_renumbered(self):
+        expenses = new_expenses(2)
+        expenses[0]["id"] = expenses[1]["id"] = 5
+        ledger = expense_ledger.ExpenseLedger(expenses)
+        self.assertEqual([expense["id"] for expense in ledger], [5, 6])
+
+    def test_removals_leave_tombstones_until_compaction(self):
+        ledger = expense_ledger.ExpenseLedger(new_expenses(10))
+        for expense_id in (2, 5, 9):
+            ledger.remove(expense_id)
+        self.assertEqual(len(ledger.dead), 3)
+        self.assert_consistent(ledger, [1, 3, 4, 6, 7, 8, 10])
+        self.assertIsNone(ledger.get(5))
+        self.assertIsNone(ledger.position_of(5))
+
+        # A fifth tombstone is more than COMPACT_MIN_TOMBSTONES and a quarter of the live rows
+        ledger.remove(1)
+        ledger.remove(10)
+        self.assertEqual(ledger.dead, [])
+        self.assertEqual(len(ledger.rows), 5)
+        self.assert_consistent(ledger, [3, 4, 6, 7, 8])
+
+    def test_replace_keeps_id_and_position(self):
+        ledger = expense_ledger.ExpenseLedger(new_expenses(4))
+        ledger.remove(1)
+        old_expense = ledger.replace(3, {"date": "2024-03-01", "amount": 1.0, "description": "new",
+                                         "category": "food"})
+        self.assertEqual(old_expense["description"], "item 2")
+        self.assertEqual(ledger.get(3)["description"], "new")
+        self.assert_consistent(ledger, [2, 3, 4])
+
+    def test_removed_ids_are_not_handed_out_again(self):
+        ledger = expense_ledger.ExpenseLedger(new_expenses(3))
+        ledger.remove(3)
+        ledger.compact()
+        ledger.append(new_expenses(1)[0])
+        self.assertEqual(ledger[-1]["id"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
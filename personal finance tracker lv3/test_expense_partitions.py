@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+
+import expense_ledger
+import expense_partitions
+
+EXPENSES = [
+    {"date": "2024-02-05", "amount": 10.0, "description": "groceries", "category": "food"},
+    {"date": "2024-02-06", "amount": 2.5, "description": "bus", "category": "transport"},
+    {"date": "2024-03-01", "amount": 7.0, "description": "lunch", "category": "food"},
+]
+
+
+class PartitionRecoveryTest(unittest.TestCase):
+    """A shard that no longer matches its manifest entry is recounted from what it holds."""
+
+    def setUp(self):
+        self.previous_directory = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        self.partition_dir = "expenses.months"
+        expense_partitions.create(self.partition_dir,
+                                  expense_ledger.ExpenseLedger([dict(expense) for expense in EXPENSES]))
+
+    def tearDown(self):
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+    def shard_path(self, month):
+        return expense_partitions.shard_path(self.partition_dir, month)
+
+    def test_intact_partitions_are_not_recounted(self):
+        ledger = expense_partitions.load_ledger(self.partition_dir)
+        self.assertEqual(ledger.shards, {})
+        self.assertEqual(len(ledger), 3)
+
+    def test_interrupted_append_is_recounted_and_rewritten(self):
+        # An append that reached the shard but not the manifest, then a write cut short part way through a line
+        extra = {"date": "2024-02-07", "amount": 4.0, "description": "coffee", "category": "food", "id": 4}
+        with open(self.shard_path("2024-02"), 'a') as file:
+            file.write(json.dumps(extra) + "\n" + '{"date": "2024-02-08", "amo')
+
+        ledger = expense_partitions.load_ledger(self.partition_dir)
+        self.assertEqual(len(ledger), 4)
+        self.assertEqual(ledger.partitions["2024-02"]["count"], 3)
+        self.assertAlmostEqual(ledger.partitions["2024-02"]["total"], 16.5)
+        self.assertEqual(ledger.partitions["2024-02"]["categories"]["food"], [14.0, 2])
+        self.assertEqual(ledger.next_id, 5)
+        self.assertEqual(ledger.get(4)["description"], "coffee")
+        self.assertIn("2024-02", ledger.dirty)
+
+        ledger.save([])
+        with open(self.shard_path("2024-02")) as file:
+            self.assertEqual([json.loads(line)["id"] for line in file], [1, 2, 4])
+        reloaded = expense_partitions.load_ledger(self.partition_dir)
+        self.assertFalse(reloaded.verify())
+        self.assertEqual(reloaded.partitions["2024-02"]["bytes"], os.path.getsize(self.shard_path("2024-02")))
+        self.assertEqual(len(reloaded), 4)
+
+    def test_missing_shard_drops_its_partition(self):
+        os.remove(self.shard_path("2024-03"))
+        ledger = expense_partitions.load_ledger(self.partition_dir)
+        self.assertEqual(ledger.months, ["2024-02"])
+        self.assertEqual(len(ledger), 2)
+        self.assertEqual(ledger.summary()["total"], 12.5)
+
+    def test_shard_without_manifest_entry_is_added(self):
+        with open(self.shard_path("2024-04"), 'w') as file:
+            file.write(json.dumps({"date": "2024-04-01", "amount": 3.0, "description": "book",
+                                   "category": "other", "id": 9}) + "\n")
+        ledger = expense_partitions.load_ledger(self.partition_dir)
+        self.assertEqual(ledger.months, ["2024-02", "2024-03", "2024-04"])
+        self.assertEqual(ledger.totals_by_month()["2024-04"], 3.0)
+        self.assertEqual(ledger.next_id, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import expense_storage
+
+EXPENSES = [
+    {"date": "2024-02-05", "amount": 10.0, "description": "groceries", "category": "food"},
+    {"date": "2024-02-06", "amount": 2.5, "description": "bus", "category": "transport"},
+    {"date": "2024-03-01", "amount": 7.0, "description": "lunch", "category": "food"},
+]
+
+
+def plain(expenses):
+    """Return expenses as a list of plain dicts, for comparing ledgers."""
+    return [dict(expense) for expense in expenses]
+
+
+class StorageTestCase(unittest.TestCase):
+    """Runs each test in an empty directory with the default journal storage."""
+
+    def setUp(self):
+        self.previous_directory = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        self.previous_mode = expense_storage.STORAGE_MODE
+        expense_storage.STORAGE_MODE = "journal"
+
+    def tearDown(self):
+        expense_storage.STORAGE_MODE = self.previous_mode
+        os.chdir(self.previous_directory)
+        self.directory.cleanup()
+
+
+class MergeEditTest(unittest.TestCase):
+    """An edit is merged onto changes another process made since it started, unless both changed a field."""
+
+    original = {"id": 1, "date": "2024-02-05", "amount": 10.0, "description": "groceries", "category": "food",
+                "currency": "EUR"}
+
+    def test_changes_to_different_fields_are_combined(self):
+        current = dict(self.original, description="weekly groceries")
+        edited = dict(self.original, amount=12.0)
+        merged = expense_storage.merge_edit(self.original, current, edited)
+        self.assertEqual(merged["amount"], 12.0)
+        self.assertEqual(merged["description"], "weekly groceries")
+
+    def test_removed_field_is_removed(self):
+        edited = {key: value for key, value in self.original.items() if key != "currency"}
+        merged = expense_storage.merge_edit(self.original, dict(self.original), edited)
+        self.assertNotIn("currency", merged)
+
+    def test_same_change_on_both_sides_is_not_a_conflict(self):
+        current = dict(self.original, amount=12.0)
+        merged = expense_storage.merge_edit(self.original, current, dict(self.original, amount=12.0))
+        self.assertEqual(merged["amount"], 12.0)
+
+    def test_different_changes_to_one_field_conflict(self):
+        current = dict(self.original, amount=11.0)
+        with self.assertRaises(expense_storage.EditConflict) as raised:
+            expense_storage.merge_edit(self.original, current, dict(self.original, amount=12.0))
+        self.assertEqual(raised.exception.field, "amount")
+
+
+class JournalReplayTest(StorageTestCase):
+    """Edits and deletes in the journal are replayed onto the snapshot by expense id."""
+
+    def test_id_records_replay_after_compaction(self):
+        expense_data = expense_storage.load_expenses()
+        expense_storage.store_add_many(expense_data, [dict(expense) for expense in EXPENSES])
+        expense_storage.compact_expenses(expense_data)
+        expense_storage.store_edit(expense_data, 2, dict(EXPENSES[1], amount=3.0))
+        expense_storage.store_delete(expense_data, 1)
+        added = expense_storage.store_add(expense_data, {"date": "2024-03-02", "amount": 1.0,
+                                                         "description": "coffee", "category": "food"})
+        expense_storage.store_edit(expense_data, added["id"], dict(added, description="tea"))
+
+        with open(expense_storage.JOURNAL_FILE) as file:
+            records = [json.loads(line) for line in file]
+        self.assertTrue(all("index" not in record for record in records))
+
+        loaded = expense_storage.load_expenses()
+        self.assertEqual([expense["id"] for expense in loaded], [2, 3, 4])
+        self.assertEqual(loaded.get(2)["amount"], 3.0)
+        self.assertEqual(loaded.get(4)["description"], "tea")
+        self.assertEqual(plain(loaded), plain(expense_data))
+        self.assertEqual(plain(expense_storage.iter_expenses()), plain(expense_data))
+
+    def test_positional_records_from_older_journals_still_replay(self):
+        with open(expense_storage.DATA_FILE, 'w') as file:
+            json.dump(EXPENSES, file)
+        with open(expense_storage.JOURNAL_FILE, 'w') as file:
+            file.write(json.dumps({"op": "edit", "index": 2, "expense": dict(EXPENSES[2], amount=8.0)}) + "\n")
+            file.write(json.dumps({"op": "delete", "index": 0}) + "\n")
+
+        loaded = expense_storage.load_expenses()
+        self.assertEqual([expense["description"] for expense in loaded], ["bus", "lunch"])
+        self.assertEqual(loaded[1]["amount"], 8.0)
+        self.assertEqual(plain(expense_storage.iter_expenses()), plain(loaded))
+
+
+class ChangedIdsTest(StorageTestCase):
+    """take_changed_ids() reports the expenses changed since it last ran, which the GUI's SQLite export writes."""
+
+    def test_changes_are_collected_between_calls(self):
+        expense_data = expense_storage.load_expenses()
+        self.assertIsNone(expense_storage.take_changed_ids())
+        expense_storage.store_add_many(expense_data, [dict(expense) for expense in EXPENSES])
+        expense_storage.store_edit(expense_data, 1, dict(EXPENSES[0], amount=11.0))
+        self.assertEqual(expense_storage.take_changed_ids(), {1, 2, 3})
+        expense_storage.store_delete(expense_data, 2)
+        self.assertEqual(expense_storage.take_changed_ids(), {2})
+        self.assertEqual(expense_storage.take_changed_ids(), set())
+
+    def test_reload_forgets_the_changes(self):
+        expense_data = expense_storage.load_expenses()
+        expense_storage.take_changed_ids()
+        expense_storage.store_add(expense_data, dict(EXPENSES[0]))
+        expense_storage.load_expenses()
+        self.assertIsNone(expense_storage.take_changed_ids())
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    """The streaming reader returns what json.loads does whatever the chunk size."""
+
+    def assert_streams(self, text):
+        data = text.encode("utf-8")
+        for chunk_size in range(1, len(data) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(expense_storage.iter_json_array(io.BytesIO(data), chunk_size)),
+                                 json.loads(text))
+
+    def test_elements_straddling_chunks(self):
+        self.assert_streams(json.dumps(EXPENSES, indent=1))
+
+    def test_multibyte_utf8(self):
+        self.assert_streams(json.dumps([{"description": "café ☕ 🍕", "category": "ёда"}, {"description": "€"}],
+                                       ensure_ascii=False))
+
+    def test_numbers_ending_at_a_chunk_boundary(self):
+        self.assert_streams("[1, 22, 333, 4444.5, -6e2]")
+
+    def test_empty_array(self):
+        self.assert_streams(" [ ] ")
+
+    def test_invalid_input(self):
+        for text in ('{"a": 1}', '[1, 2', '[1, }]'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                list(expense_storage.iter_json_array(io.BytesIO(text.encode("utf-8")), 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
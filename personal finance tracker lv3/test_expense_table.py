@@ -0,0 +1,46 @@
+import unittest
+
+import expense_storage
+
+try:
+    import expense_table
+except ImportError:
+    expense_table = None
+
+EXPENSES = [
+    {"date": "2024-02-05", "amount": 10.0, "description": "groceries", "category": "food"},
+    {"date": "2024/02/05", "amount": 2.5, "description": "bus", "category": "transport"},
+    {"date": "", "amount": 4.0, "description": "snack", "category": "food"},
+    {"date": "2024-03", "amount": 1.0, "description": "parking", "category": "transport"},
+    {"date": "2024-03-01", "amount": 7.0, "description": "lunch", "category": "food"},
+    {"date": "", "amount": 3.0, "description": "ticket", "category": "transport"},
+]
+
+
+@unittest.skipIf(expense_table is None, "NumPy is not installed")
+class ColumnarReportsTest(unittest.TestCase):
+    """The columnar table must report the same totals as the list of expense dicts."""
+
+    def assert_same_totals(self, expected, actual):
+        self.assertEqual(set(expected), set(actual))
+        for key in expected:
+            self.assertAlmostEqual(expected[key], actual[key])
+
+    def test_totals_by_month_match_list(self):
+        table = expense_table.ExpenseTable.from_expenses(EXPENSES)
+        self.assert_same_totals(expense_storage.totals_by_month(EXPENSES), table.totals_by_month())
+
+    def test_totals_by_month_and_category_match_list(self):
+        table = expense_table.ExpenseTable.from_expenses(EXPENSES)
+        self.assert_same_totals(expense_storage.totals_by_month_and_category(EXPENSES),
+                                table.totals_by_month_and_category())
+
+    def test_appended_rows_match_list(self):
+        table = expense_table.ExpenseTable()
+        for expense in EXPENSES:
+            table.append(expense)
+        self.assert_same_totals(expense_storage.totals_by_month(EXPENSES), table.totals_by_month())
+
+
+if __name__ == "__main__":
+    unittest.main()